@@ -8,6 +8,11 @@ if __name__ == '__main__':
     parser.add_argument('--root-folder', default=None)
     parser.add_argument('--nthreads', default=None, type=int)
     parser.add_argument('--no-killer', action='store_true')
+    parser.add_argument('--engine', choices=('threads', 'asyncio'), default='threads')
+    parser.add_argument('--backend', choices=('html', 'webservice'), default=None)
+    parser.add_argument('--resume', action='store_true')
+    parser.add_argument('--watch', action='store_true')
+    parser.add_argument('--watch-interval', default=None, type=float, metavar='SECONDS')
     parser.add_argument('-d', '--debug', action='store_true')
 
     opt = parser.parse_args()
@@ -17,4 +22,8 @@ if __name__ == '__main__':
         chrome_path = 'C:/Program Files (x86)/Google/Chrome/Application/chrome.exe %s'
         webbrowser.get(chrome_path).open_new('localhost')
 
-    vcd.start(root_folder=opt.root_folder, nthreads=opt.nthreads, no_killer=opt.no_killer)
+    if opt.watch_interval:
+        vcd.Options.set_watch_interval(opt.watch_interval)
+
+    vcd.start(root_folder=opt.root_folder, nthreads=opt.nthreads, no_killer=opt.no_killer,
+              engine=opt.engine, resume=opt.resume, watch=opt.watch, backend=opt.backend)
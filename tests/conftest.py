@@ -1,7 +1,11 @@
 import logging
 import os
+import re
 import shutil
-from threading import current_thread
+import socket
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, current_thread
 
 import pytest
 
@@ -9,9 +13,13 @@ import pytest
 def pytest_configure():
     os.environ['TESTING'] = '1'
 
-    from vcd import Options, Credentials
+    from vcd import Options
+    from vcd.credentials import Credentials
+    from vcd.session import SessionStore
     Options.set_root_folder('temp_tests')
+    Options.set_backoff_factor(0)
     Credentials.path = 'test.' + Credentials.path
+    SessionStore.path = os.path.join('temp_tests', 'session.json')
 
     fmt = "[%(asctime)s] %(levelname)s - %(threadName)s.%(module)s:%(lineno)s - %(message)s"
     handler = logging.FileHandler(filename='testing.log', encoding='utf-8')
@@ -22,11 +30,42 @@ def pytest_configure():
     logging.getLogger('urllib3').setLevel(logging.ERROR)
 
 
+@pytest.fixture(scope='session')
+def result_path(tmp_path_factory):
+    return str(tmp_path_factory.mktemp('results') / 'new-files.txt')
+
+
+@pytest.fixture(autouse=True)
+def results_file(result_path, monkeypatch):
+    """The new files found by the tests are not written in the root folder of the repo."""
+    from vcd.results import Results
+    monkeypatch.setattr(Results, 'result_path', result_path)
+
+
+@pytest.fixture(scope='session')
+def downloads_record_path(tmp_path_factory):
+    return str(tmp_path_factory.mktemp('downloads') / 'downloads.log')
+
+
+@pytest.fixture(autouse=True)
+def downloads_record(downloads_record_path, monkeypatch):
+    """The downloads of the tests are not recorded in the root folder of the repo."""
+    from vcd.links import DownloadsRecorder
+    monkeypatch.setattr(DownloadsRecorder, '_downloads_record_path', downloads_record_path)
+
+
+@pytest.fixture(autouse=True)
+def clear_frontier():
+    from vcd.frontier import PAGES, VISITED
+    VISITED.clear()
+    PAGES.clear()
+
+
 @pytest.fixture(scope='session', autouse=True)
 def teardown_everything():
     yield
 
-    from vcd import Credentials
+    from vcd.credentials import Credentials
 
     if os.path.isdir('temp_tests'):
         shutil.rmtree('temp_tests')
@@ -42,3 +81,199 @@ def teardown_everything():
     assert not os.path.isdir('temp_tests')
     assert not os.path.isfile('testing.log')
     assert not os.path.isfile(Credentials.path)
+
+
+MOODLE_PAGES = {
+    '/course/view.php?id=1': ('text/html', {}, """
+        <div class="activityinstance"><a href="{base}/mod/resource/view.php?id=2">
+            <span>Tema 1<span class="accesshide"> Archivo</span></span></a></div>
+        <div class="activityinstance"><a href="{base}/mod/resource/view.php?id=3">
+            <span>Tema 2</span></a></div>
+        <div class="activityinstance"><a href="{base}/mod/folder/view.php?id=4">
+            <span>Practicas</span></a></div>
+        <div class="activityinstance"><a href="{base}/mod/assign/view.php?id=5">
+            <span>Entrega 1</span></a></div>
+        <div class="activityinstance"><a href="{base}/mod/forum/view.php?id=6">
+            <span>Foro</span></a></div>
+        <div class="activityinstance"><a href="{base}/mod/resource/view.php?id=12">
+            <span>Tema 3</span></a></div>"""),
+    '/mod/resource/view.php?id=2': ('application/pdf', {
+        'Content-Disposition': 'inline; filename="tema1.pdf"', 'ETag': '"tema1"'}, 'tema 1'),
+    '/mod/resource/view.php?id=3': ('text/html', {}, """
+        <div role="main"><h2>Tema 2</h2><div class="resourceworkaround">
+            <a href="{base}/pluginfile.php/3/tema2.zip">tema2.zip</a></div></div>"""),
+    '/pluginfile.php/3/tema2.zip': ('application/zip', {}, 'tema 2'),
+    '/mod/resource/view.php?id=12': ('', {
+        'Status': '300', 'Location': '{base}/pluginfile.php/12/tema3.pdf'}, ''),
+    '/pluginfile.php/12/tema3.pdf': ('application/pdf', {}, 'tema 3'),
+    '/mod/folder/view.php?id=4': ('text/html', {}, """
+        <span class="fp-filename-icon"><a href="{base}/pluginfile.php/4/p1.txt">
+            <span class="fp-filename">p1.txt</span></a></span>
+        <span class="fp-filename-icon"><a href="{base}/pluginfile.php/4/p2.txt">
+            <span class="fp-filename">p2.txt</span></a></span>"""),
+    '/pluginfile.php/4/p1.txt': ('text/plain', {}, 'practica 1'),
+    '/pluginfile.php/4/p2.txt': ('text/plain', {}, 'practica 2'),
+    '/mod/assign/view.php?id=5': ('text/html', {}, """
+        <a target="_blank" href="{base}/pluginfile.php/5/enunciado.pdf">enunciado.pdf</a>"""),
+    '/pluginfile.php/5/enunciado.pdf': ('application/pdf', {}, 'enunciado'),
+    '/mod/forum/view.php?id=6': ('text/html', {}, """
+        <td class="topic starter"><a href="{base}/mod/forum/discuss.php?d=7">Dudas</a></td>"""),
+    '/mod/forum/discuss.php?d=7': ('text/html', {}, """
+        <div class="attachments"><a href="{base}/pluginfile.php/7/dudas.pdf">dudas.pdf</a></div>
+        <div class="attachedimages"><img src="{base}/pluginfile.php/7/grafico.png"></div>
+        <div class="attachedimages"><img src="{base}/pluginfile.php/7/grafico.png#p2"></div>
+        """),
+    '/pluginfile.php/7/dudas.pdf': ('application/pdf', {}, 'dudas'),
+    '/pluginfile.php/7/grafico.png': ('image/png', {}, 'grafico'),
+    '/pluginfile.php/8/informe': ('', {}, '%PDF-1.4 informe'),
+    '/mod/forum/view.php?id=9': ('text/html', {}, """
+        <table class="forumheaderlist"><tr class="discussion r0">
+            <td class="topic starter"><a href="{base}/mod/forum/discuss.php?d=10">Horario</a></td>
+            <td class="replies"><a href="{base}/mod/forum/discuss.php?d=10">2</a></td>
+            <td class="lastpost"><a href="#">Profesor</a><br><a href="#">lun, 5 oct</a></td>
+        </tr></table>
+        <div class="paging"><a href="{base}/mod/forum/view.php?id=9&page=1">2</a></div>"""),
+    '/mod/forum/view.php?id=9&page=1': ('text/html', {}, """
+        <table class="forumheaderlist"><tr class="discussion r0">
+            <td class="topic starter"><a href="{base}/mod/forum/discuss.php?d=11">Examen</a></td>
+            <td class="replies"><a href="{base}/mod/forum/discuss.php?d=11">0</a></td>
+            <td class="lastpost"><a href="#">Profesor</a><br><a href="#">mar, 6 oct</a></td>
+        </tr></table>
+        <div class="paging"><a href="{base}/mod/forum/view.php?id=9&page=0">1</a></div>"""),
+    '/mod/forum/discuss.php?d=10': ('text/html', {}, """
+        <div class="attachments"><a href="{base}/pluginfile.php/10/horario.pdf">horario.pdf</a>
+        </div>"""),
+    '/mod/forum/discuss.php?d=11': ('text/html', {}, """
+        <div class="attachments"><a href="{base}/pluginfile.php/11/examen.pdf">examen.pdf</a>
+        </div>"""),
+    '/pluginfile.php/10/horario.pdf': ('application/pdf', {}, 'horario'),
+    '/pluginfile.php/11/examen.pdf': ('application/pdf', {}, 'examen'),
+    '/pluginfile.php/8/video.mp4': ('video/mp4', {}, 'video'),
+}
+
+
+@pytest.fixture
+def http_server():
+    """Returns a context manager that serves a request handler in a local server.
+
+    When the context exits, the connections kept alive by the clients are closed, so no thread
+    of the server survives the test.
+    """
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = False
+
+        def process_request(self, request, client_address):
+            self.connections.append(request)
+            super().process_request(request, client_address)
+
+    @contextmanager
+    def serve(handler):
+        server = Server(('127.0.0.1', 0), handler)
+        server.connections = []
+        thread = Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        try:
+            yield f'http://127.0.0.1:{server.server_port}'
+        finally:
+            server.shutdown()
+            for connection in server.connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            server.server_close()
+            thread.join()
+
+    return serve
+
+
+@pytest.fixture
+def moodle_server(http_server):
+    """Local server that replays a small Moodle course (`MOODLE_PAGES`).
+
+    The first segment of the path is a free prefix kept in the links of the pages, so every test
+    can crawl the course with its own urls (the alias database is keyed by url). Pages with an
+    ETag support range requests, and the 'Status' header sets the status code of the others.
+    Yields the base url of the server and the list of paths requested (followed by the range,
+    if any).
+    """
+
+    requested = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            _, prefix, path = self.path.split('/', 2)
+            range_header = self.headers.get('Range', '')
+            requested.append(f'/{path} [{range_header}]' if range_header else '/' + path)
+
+            try:
+                content_type, headers, body = MOODLE_PAGES['/' + path]
+            except KeyError:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            base = f'http://{self.headers["Host"]}/{prefix}'
+            body = body.replace('{base}', base).encode()
+            headers = {key: value.replace('{base}', base) for key, value in headers.items()}
+            status = int(headers.pop('Status', 200))
+            etag = headers.get('ETag')
+
+            if etag and range_header.startswith('bytes=') and \
+                    self.headers.get('If-Range', etag) == etag:
+                start, end = range_header[6:].split('-')
+                start, end = int(start), int(end or len(body) - 1)
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{len(body)}')
+                body = body[start:end + 1]
+            else:
+                self.send_response(status)
+
+            if etag:
+                self.send_header('Accept-Ranges', 'bytes')
+
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    with http_server(Handler) as base:
+        yield base, requested
+
+
+@pytest.fixture
+def moodle_scenario(moodle_server, request):
+    """Same as `moodle_server`, but the base url has a prefix named after the test, so the urls
+    of the test are not shared with other tests."""
+    base, requested = moodle_server
+    yield base + '/' + re.sub(r'\W', '-', request.node.name), requested
+
+
+@pytest.fixture
+def crawl():
+    """Processes the tasks of a queue with the threads engine until the queue is empty.
+
+    Returns a function that takes the queue and the number of threads.
+    """
+    from vcd._threading import start_workers
+
+    def p(queue, nthreads=4):
+        workers = start_workers(queue, nthreads=nthreads, no_killer=True)
+        queue.join()
+
+        for _ in workers:
+            queue.put(None)
+        for worker in workers:
+            worker.join()
+
+    return p
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+from queue import Queue
+
+from vcd import Subject, Downloader, Options
+from vcd._asyncio import AsyncDownloader, AsyncEngine, AsyncWorkQueue
+from vcd.filecache import REAL_FILE_CACHE
+from vcd.frontier import PAGES, VISITED
+from vcd.links import Forum
+from vcd.stores import FORUM_MARKERS
+
+
+def get_tree(subject):
+    # Links join the root folder to the subject folder, which already contains it.
+    folder = os.path.join(Options.ROOT_FOLDER, subject.folder)
+    tree = {}
+    for dirpath, _, filenames in os.walk(folder):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path, 'rb') as file_handler:
+                tree[os.path.relpath(path, folder)] = file_handler.read()
+    return tree
+
+
+def crawl_asyncio(url, forum_url=None):
+    async def main():
+        downloader = AsyncDownloader(limit=4)
+        await downloader.start()
+
+        queue = AsyncWorkQueue()
+        subject = Subject('Asyncio engine', url, downloader, queue)
+
+        if forum_url is None:
+            queue.put(subject)
+        else:
+            queue.put(Forum('Foro', forum_url, subject, downloader, queue))
+
+        try:
+            await AsyncEngine(downloader, queue, ntasks=4).run()
+        finally:
+            await downloader.close()
+
+        return subject
+
+    return asyncio.run(main())
+
+
+class TestAsyncDownloader:
+    def test_get(self, moodle_server):
+        base, _ = moodle_server
+
+        async def main():
+            downloader = AsyncDownloader()
+            await downloader.start()
+
+            try:
+                response = await downloader.get(base + '/x/pluginfile.php/4/p1.txt')
+                await downloader.read(response)
+            finally:
+                await downloader.close()
+
+            return response
+
+        response = asyncio.run(main())
+        assert response.status_code == 200
+        assert response.headers['content-type'] == 'text/plain'
+        assert response.content == b'practica 1'
+
+
+def test_same_tree_as_threads(moodle_server, crawl, caplog):
+    base, requested = moodle_server
+
+    queue = Queue()
+    threads_subject = Subject('Threads engine', base + '/threads/course/view.php?id=1',
+                              Downloader(), queue)
+    queue.put(threads_subject)
+    crawl(queue)
+    threads_requests = sorted(requested)
+    requested.clear()
+
+    caplog.clear()
+    asyncio_subject = crawl_asyncio(base + '/asyncio/course/view.php?id=1')
+    assert 'Error processing' not in caplog.text
+
+    threads_tree = get_tree(threads_subject)
+    assert len(threads_tree) == 8
+    assert threads_tree['Tema_3.pdf'] == b'tema 3'
+    assert threads_requests.count('/pluginfile.php/7/grafico.png') == 1
+    assert get_tree(asyncio_subject) == threads_tree
+    assert sorted(requested) == threads_requests
+
+
+def test_segments(moodle_server):
+    base, requested = moodle_server
+    Options.set_segments(2)
+    Options.set_segment_threshold(4)
+
+    try:
+        subject = crawl_asyncio(base + '/segments/course/view.php?id=1')
+    finally:
+        Options.set_segments(4)
+        Options.set_segment_threshold(32 * 1024 * 1024)
+
+    assert get_tree(subject)['Tema_1.pdf'] == b'tema 1'
+    assert '/mod/resource/view.php?id=2 [bytes=0-2]' in requested
+    assert '/mod/resource/view.php?id=2 [bytes=3-5]' in requested
+
+
+def test_resume(moodle_scenario):
+    base, requested = moodle_scenario
+    subject = crawl_asyncio(base + '/course/view.php?id=1')
+
+    # The transfer of the resource was interrupted after 4 bytes.
+    filepath = os.path.join(Options.ROOT_FOLDER, subject.folder, 'Tema_1.pdf')
+    os.remove(filepath)
+    REAL_FILE_CACHE.cache.pop(filepath)
+
+    with open(filepath + '.part', 'wb') as file_handler:
+        file_handler.write(b'XXXX')
+    with open(filepath + '.part.json', 'wt') as file_handler:
+        json.dump({'url': base + '/mod/resource/view.php?id=2', 'etag': '"tema1"'},
+                  file_handler)
+
+    requested.clear()
+    VISITED.clear()
+    PAGES.clear()
+    subject = crawl_asyncio(base + '/course/view.php?id=1')
+
+    assert get_tree(subject)['Tema_1.pdf'] == b'XXXX 1'
+    assert requested.count('/mod/resource/view.php?id=2 [bytes=4-]') == 1
+    assert '/mod/resource/view.php?id=2' not in requested
+
+
+def test_unchanged_discussions(moodle_scenario):
+    base, requested = moodle_scenario
+    FORUM_MARKERS.data = {}
+
+    try:
+        for _ in range(2):
+            requested.clear()
+            VISITED.clear()
+            PAGES.clear()
+            crawl_asyncio(base + '/course/view.php?id=1', base + '/mod/forum/view.php?id=9')
+    finally:
+        FORUM_MARKERS.data = {}
+
+    # The markers did not change and the attachments were saved.
+    assert sorted(requested) == ['/mod/forum/view.php?id=9', '/mod/forum/view.php?id=9&page=1']
@@ -1,8 +1,15 @@
+import logging
+import socket
+import threading
 import time
+from http.server import BaseHTTPRequestHandler
 
 import pytest
 
-from vcd._requests import Downloader, HEADERS, DownloaderError
+from vcd import Options, reset_synchronization
+from vcd._requests import BandwidthLimiter, Downloader, HEADERS, DownloaderError, \
+    RequestLimiter, RetryBudget, RetryPolicy, TokenBucket
+from vcd.cancellation import CANCELLATION, CancelledError, TaskTimeoutError
 
 
 def test_headers(d):
@@ -132,6 +139,315 @@ def test_silenced(caplog):
     assert len(caplog.text) == 0
 
 
+class TestPool:
+    def test_pool_size(self):
+        d = Downloader(pool_size=50, pool_block=True)
+        assert d.adapter._pool_maxsize == 50
+        assert d.adapter._pool_block is True
+
+    def test_pool_stats(self, local_server):
+        d = Downloader(pool_size=2)
+
+        for _ in range(5):
+            assert d.get(local_server).content == b'ok'
+
+        assert d.pool_stats.to_json() == {'created': 1, 'reused': 4, 'discarded': 0}
+
+    def test_pool_stats_discarded(self, local_server):
+        d = Downloader(pool_size=1)
+
+        first = d.get(local_server, stream=True)
+        second = d.get(local_server, stream=True)
+        first.close()
+        second.close()
+
+        assert d.pool_stats.created == 2
+        assert d.pool_stats.discarded == 1
+
+
+class TestRetryPolicy:
+    def test_parse_retry_after(self):
+        assert RetryPolicy.parse_retry_after(None) is None
+        assert RetryPolicy.parse_retry_after('') is None
+        assert RetryPolicy.parse_retry_after('120') == 120
+        assert RetryPolicy.parse_retry_after('-5') == 0
+        assert RetryPolicy.parse_retry_after('invalid') is None
+        assert RetryPolicy.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+
+    def test_get_backoff(self):
+        policy = RetryPolicy(backoff_factor=0.5, backoff_max=3, jitter=False)
+        assert policy.get_backoff(1) == 0.5
+        assert policy.get_backoff(2) == 1
+        assert policy.get_backoff(3) == 2
+        assert policy.get_backoff(4) == 3
+        assert policy.get_backoff(20) == 3
+
+        policy = RetryPolicy(backoff_factor=0.5, backoff_max=3, jitter=True)
+        for i in range(1, 10):
+            assert 0 <= policy.get_backoff(i) <= 3
+
+    def test_budget(self):
+        budget = RetryBudget(2)
+        assert budget.consume() is True
+        assert budget.consume() is True
+        assert budget.consume() is False
+
+        budget.reset(None)
+        for _ in range(1000):
+            assert budget.consume() is True
+
+    def test_status_retries(self, local_server):
+        policy = RetryPolicy(status_retries=2, backoff_factor=0, budget=RetryBudget())
+        d = Downloader(retry_policy=policy)
+
+        assert d.get(local_server + 'fail/1').status_code == 200
+        assert d.get(local_server + 'fail/2').status_code == 200
+        assert d.get(local_server + 'fail/3').status_code == 503
+
+    @pytest.mark.parametrize('method', ['get', 'post'])
+    def test_connection_retries(self, method, caplog):
+        caplog.set_level(logging.WARNING, logger='vcd._requests')
+
+        # Nothing listens in the port of a closed socket, so every attempt fails.
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            url = f'http://127.0.0.1:{sock.getsockname()[1]}/'
+
+        d = Downloader(retry_policy=RetryPolicy(3, backoff_factor=0, budget=RetryBudget()))
+        with pytest.raises(DownloaderError):
+            getattr(d, method)(url, timeout=1)
+
+        assert caplog.text.count(f'Connection error in {method.upper()}') == 3
+
+    def test_retry_after_too_long(self, local_server):
+        policy = RetryPolicy(status_retries=2, backoff_max=10, budget=RetryBudget())
+        d = Downloader(retry_policy=policy)
+
+        t0 = time.time()
+        assert d.get(local_server + 'fail/1?retry-after=3600').status_code == 503
+        assert time.time() - t0 < 1
+
+    def test_budget_exhausted(self, local_server):
+        policy = RetryPolicy(status_retries=5, backoff_factor=0, budget=RetryBudget(1))
+        d = Downloader(retry_policy=policy)
+
+        assert d.get(local_server + 'fail/2').status_code == 503
+
+    def test_budget_reset_between_synchronizations(self, local_server, monkeypatch):
+        monkeypatch.setattr(Options, 'RETRY_BUDGET', 1)
+        d = Downloader(retry_policy=RetryPolicy(status_retries=5, backoff_factor=0))
+
+        # Each synchronization has its own budget.
+        for name in ('first', 'second'):
+            reset_synchronization()
+            assert d.get(local_server + f'fail/{name}/1').status_code == 200
+
+        assert d.get(local_server + 'fail/third/1').status_code == 503
+        monkeypatch.undo()
+        reset_synchronization()
+
+
+class TestLimiter:
+    def test_token_bucket(self):
+        bucket = TokenBucket(10, capacity=2)
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+        assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+    def test_max_per_host(self):
+        limiter = RequestLimiter(max_per_host=2, rate=0)
+        lock = threading.Lock()
+        in_flight = {'http://a': 0, 'http://b': 0}
+        max_in_flight = {'http://a': 0, 'http://b': 0}
+
+        def request(url):
+            with limiter.limit(url + '/path'):
+                with lock:
+                    in_flight[url] += 1
+                    max_in_flight[url] = max(max_in_flight[url], in_flight[url])
+                time.sleep(0.05)
+                with lock:
+                    in_flight[url] -= 1
+
+        threads = [threading.Thread(target=request, args=(url,))
+                   for url in ('http://a', 'http://b') * 4]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert max_in_flight == {'http://a': 2, 'http://b': 2}
+        assert limiter.stats.requests == 8
+        assert limiter.stats.waits == 4
+
+    def test_rate_limit(self, local_server):
+        d = Downloader(limiter=RequestLimiter(rate=20, burst=1))
+
+        t0 = time.time()
+        for _ in range(5):
+            d.get(local_server)
+
+        assert time.time() - t0 >= 0.19
+        assert d.limiter_stats.requests == 5
+        assert d.limiter_stats.waits == 4
+
+    def test_no_limits(self, local_server):
+        d = Downloader(limiter=RequestLimiter(max_per_host=0, rate=0))
+        d.get(local_server)
+
+        assert d.limiter_stats.to_json() == {'requests': 1, 'waits': 0, 'wait_time': 0,
+                                             'max_wait': 0}
+
+
+class TestBandwidthLimiter:
+    def test_default(self):
+        bandwidth = Downloader().bandwidth
+        assert (bandwidth.rate, bandwidth.worker_rate) == (0, 0)
+
+        t0 = time.monotonic()
+        bandwidth.consume(10 ** 9)
+        assert time.monotonic() - t0 < 0.1
+
+    def test_global(self):
+        bandwidth = BandwidthLimiter(rate=100_000, worker_rate=0)
+        bandwidth.consume(100_000, key=1)
+
+        t0 = time.monotonic()
+        bandwidth.consume(30_000, key=2)
+        assert 0.2 < time.monotonic() - t0 < 0.6
+
+    def test_worker(self):
+        bandwidth = BandwidthLimiter(rate=0, worker_rate=100_000)
+        bandwidth.consume(100_000, key=1)
+
+        t0 = time.monotonic()
+        bandwidth.consume(100_000, key=2)
+        assert time.monotonic() - t0 < 0.1
+
+        bandwidth.consume(30_000, key=1)
+        assert 0.2 < time.monotonic() - t0 < 0.6
+
+    def test_set_limits(self):
+        bandwidth = BandwidthLimiter(rate=1000, worker_rate=1000)
+        bandwidth.consume(1000)
+        bandwidth.set_limits(0, 0)
+
+        t0 = time.monotonic()
+        bandwidth.consume(10 ** 6)
+        assert time.monotonic() - t0 < 0.1
+
+    def test_to_json(self):
+        bandwidth = BandwidthLimiter(rate=0, worker_rate=0)
+        bandwidth.consume(5000)
+        bandwidth.consume(5000)
+
+        stats = bandwidth.to_json()
+        assert stats['transferred'] == 10000
+        assert stats['actual'] == 10000 / BandwidthLimiter.WINDOW
+        assert (stats['rate'], stats['worker_rate']) == (0, 0)
+
+
+class TestCancellation:
+    def test_abort(self, local_server):
+        d = Downloader()
+        CANCELLATION.register(d.abort)
+        threading.Timer(0.2, CANCELLATION.cancel).start()
+
+        t0 = time.time()
+        try:
+            with pytest.raises(CancelledError):
+                d.get(local_server + 'slow')
+        finally:
+            SLOW_RELEASE.set()
+            CANCELLATION.reset()
+
+        assert time.time() - t0 < 1
+
+    def test_abort_thread(self, local_server):
+        d = Downloader()
+        errors = []
+        SLOW_RELEASE.clear()
+
+        def get():
+            try:
+                d.get(local_server + 'slow')
+            except Exception as ex:
+                errors.append(ex)
+
+        thread = threading.Thread(target=get)
+        thread.start()
+
+        try:
+            time.sleep(0.2)
+            d.abort(threading.get_ident())
+            thread.join(0.2)
+            assert thread.is_alive()
+
+            CANCELLATION.interrupt(thread.ident)
+            d.abort(thread.ident)
+            thread.join(1)
+            assert not thread.is_alive()
+        finally:
+            SLOW_RELEASE.set()
+            CANCELLATION.reset()
+
+        assert isinstance(errors[0], TaskTimeoutError)
+
+    def test_sleep(self):
+        policy = RetryPolicy(backoff_factor=30, jitter=False, budget=RetryBudget())
+        d = Downloader(retry_policy=policy)
+        threading.Timer(0.2, CANCELLATION.cancel).start()
+
+        t0 = time.time()
+        try:
+            with pytest.raises(CancelledError):
+                d.get('http://127.0.0.1:1/')
+        finally:
+            CANCELLATION.reset()
+
+        assert time.time() - t0 < 1
+
+
+SLOW_RELEASE = threading.Event()
+
+
+@pytest.fixture
+def local_server(http_server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        failures = {}
+
+        def do_GET(self):
+            if self.path == '/slow':
+                SLOW_RELEASE.wait(10)
+
+            # /fail/<n> answers with a 503 the first n times it is requested.
+            if self.path.startswith('/fail/'):
+                path, _, query = self.path.partition('?')
+                self.failures[path] = self.failures.get(path, 0) + 1
+
+                if self.failures[path] <= int(path.split('/')[-1]):
+                    self.send_response(503)
+                    if query.startswith('retry-after='):
+                        self.send_header('Retry-After', query.split('=')[-1])
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+            self.send_response(200)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'ok')
+
+        def log_message(self, *args):
+            pass
+
+    with http_server(Handler) as base:
+        yield base + '/'
+
+
 @pytest.fixture
 def d():
     return Downloader()
@@ -8,7 +8,10 @@ from typing import List
 import pytest
 
 from vcd import Subject, Downloader
-from vcd._threading import Worker, start_workers
+from vcd._threading import AdaptiveController, PriorityWorkQueue, ThroughputMonitor, Watchdog, \
+    Worker, WorkerPool, get_task_kind, shutdown, start_workers, wait_queue
+from vcd.cancellation import CANCELLATION
+from vcd.links import BaseLink, Folder, Forum, Resource
 
 
 class TestWorker:
@@ -50,6 +53,341 @@ def test_start_workers(close_threads):
     close_threads(workers)
 
 
+class TestPriorityWorkQueue:
+    @pytest.fixture
+    def items(self):
+        d = Downloader()
+        subject = Subject('priority', 'http://localhost/priority', d, None)
+
+        return {
+            'binary': Resource('binary', 'http://localhost/pluginfile.php/1/a.pdf', subject, d,
+                               None),
+            'wrapper': Resource('wrapper', 'http://localhost/mod/resource/view.php?id=1',
+                                subject, d, None),
+            'folder': Folder('folder', 'http://localhost/mod/folder/view.php?id=2', subject, d,
+                             None),
+            'forum': Forum('forum', 'http://localhost/mod/forum/view.php?id=3', subject, d,
+                           None),
+            'subject': subject
+        }
+
+    def test_order(self, items):
+        q = PriorityWorkQueue()
+        for name in ('binary', 'wrapper', 'folder', 'forum', 'subject'):
+            q.put(items[name])
+
+        assert q.qsize() == 5
+        assert q.queue == [items[name] for name in
+                           ('subject', 'folder', 'forum', 'wrapper', 'binary')]
+        assert [q.get() for _ in range(5)] == [
+            items[name] for name in ('subject', 'folder', 'forum', 'wrapper', 'binary')]
+
+        q.put(items['binary'])
+        q.put(None)
+        assert q.get() is None
+
+    def test_custom_priorities(self, items):
+        q = PriorityWorkQueue(priorities={'resource': 0, 'subject': 5})
+        q.put(items['subject'])
+        q.put(items['folder'])
+        q.put(items['binary'])
+
+        assert [q.get() for _ in range(3)] == [items['binary'], items['folder'],
+                                               items['subject']]
+
+    def test_fair_between_subjects(self):
+        d = Downloader()
+        big = Subject('big', 'http://localhost/big', d, None)
+        small = Subject('small', 'http://localhost/small', d, None)
+
+        def resource(subject, i):
+            return Resource(f'{subject.name}-{i}',
+                            f'http://localhost/pluginfile.php/{subject.name}/{i}.pdf', subject,
+                            d, None)
+
+        q = PriorityWorkQueue()
+        for i in range(4):
+            q.put(resource(big, i))
+        for i in range(2):
+            q.put(resource(small, i))
+        q.put(Folder('folder', 'http://localhost/mod/folder/view.php?id=9', big, d, None))
+
+        order = ['folder', 'big-0', 'small-0', 'big-1', 'small-1', 'big-2', 'big-3']
+        assert [item.name for item in q.queue] == order
+        assert [q.get().name for _ in range(7)] == order
+        assert q.qsize() == 0
+
+    def test_join(self, items):
+        q = PriorityWorkQueue()
+        q.put(items['binary'])
+        q.put(items['subject'])
+
+        def consume():
+            for _ in range(2):
+                q.get()
+                q.task_done()
+
+        thread = threading.Thread(target=consume)
+        thread.start()
+        q.join()
+        thread.join()
+
+        assert q.unfinished_tasks == 0
+
+
+class TestAdaptivePool:
+    def test_monitor(self):
+        monitor = ThroughputMonitor()
+        monitor.record(1, 100, False, 'resource')
+        monitor.record(3, 0, True, 'resource')
+        monitor.record(5, 0, False, 'discovery')
+
+        window = monitor.collect()
+        assert window['tasks'] == 3
+        assert window['bytes'] == 100
+        assert window['errors'] == 1
+        assert window['latency'] == 3
+        assert window['latencies'] == {'resource': 2, 'discovery': 5}
+
+        assert monitor.collect()['tasks'] == 0
+
+    def test_resize(self):
+        q = PriorityWorkQueue()
+        threadlist = start_workers(q, 2, no_killer=True)
+        pool = WorkerPool(q, threadlist)
+        assert pool.size == pool.target == 2
+
+        pool.resize(4)
+        assert pool.size == pool.target == 4
+        assert [worker.name for worker in pool.workers] == ['W-01', 'W-02', 'W-03', 'W-04']
+
+        workers = pool.workers
+        pool.resize(1)
+        q.join()
+        assert pool.target == 1
+        assert pool.size == 1
+
+        q.put(None)
+        for worker in workers:
+            worker.join(1)
+            assert not worker.is_alive()
+
+    def test_controller(self):
+        class FakePool:
+            target = 10
+
+        controller = AdaptiveController(FakePool(), min_workers=5, max_workers=20, step=2)
+
+        def window(nbytes, errors=0, latency=1.0):
+            return {'tasks': 10, 'bytes': nbytes, 'errors': errors, 'latency': latency,
+                    'latencies': {'resource': latency}, 'seconds': 1}
+
+        # Grows while the throughput improves.
+        FakePool.target = controller.get_target(window(100))
+        assert FakePool.target == 12
+        FakePool.target = controller.get_target(window(200))
+        assert FakePool.target == 14
+
+        # Changes direction when it gets worse.
+        FakePool.target = controller.get_target(window(150))
+        assert FakePool.target == 12
+
+        # Throttling: errors or latency.
+        FakePool.target = controller.get_target(window(150, errors=3))
+        assert FakePool.target == 9
+        FakePool.target = controller.get_target(window(150, latency=5))
+        assert FakePool.target == 6
+
+        # Limits.
+        assert controller.get_target(window(150, errors=5)) == 5
+        assert controller.get_target({'tasks': 0}) == 6
+
+    def test_controller_mixed_windows(self):
+        class FakePool:
+            target = 10
+
+        controller = AdaptiveController(FakePool(), min_workers=5, max_workers=20, step=1)
+
+        def window(nbytes, latencies):
+            return {'tasks': 10, 'bytes': nbytes, 'errors': 0,
+                    'latency': sum(latencies.values()) / len(latencies),
+                    'latencies': latencies, 'seconds': 1}
+
+        # Windows of files not modified, of real downloads and of both.
+        windows = [window(0, {'cached': 0.01}), window(10 ** 6, {'resource': 2.0}),
+                   window(10 ** 6, {'cached': 0.02, 'resource': 2.5})] * 4
+
+        for item in windows:
+            FakePool.target = controller.get_target(item)
+
+        assert FakePool.target > 10
+
+        # The baseline follows the latency, so a slower server is only throttled once.
+        targets = []
+        for _ in range(4):
+            FakePool.target = controller.get_target(window(10 ** 6, {'resource': 6.0}))
+            targets.append(FakePool.target)
+
+        assert targets[0] < targets[1] < targets[2] < targets[3]
+
+
+class TestCancellation:
+    @pytest.fixture(autouse=True)
+    def reset_cancellation(self):
+        yield
+        CANCELLATION.reset()
+
+    @pytest.fixture
+    def slow_links(self):
+        class SlowLink(BaseLink):
+            def download(self):
+                CANCELLATION.sleep(30)
+
+        d = Downloader()
+        subject = Subject('cancellation', 'http://localhost/cancellation', d, None)
+        return [SlowLink(f'slow-{i}', f'http://localhost/slow/{i}', subject, d, None)
+                for i in range(20)]
+
+    def test_controller_stops(self):
+        class FakePool:
+            target = size = 10
+            monitor = ThroughputMonitor()
+            resizes = 0
+
+            def resize(self, target):
+                self.resizes += 1
+
+        pool = FakePool()
+        controller = AdaptiveController(pool, min_workers=5, max_workers=20, interval=0.05)
+        controller.start()
+        time.sleep(0.3)
+        assert pool.resizes > 0
+
+        CANCELLATION.cancel()
+        controller.join(2)
+        assert not controller.is_alive()
+        assert controller.status == 'stopped'
+
+    def test_wait_queue(self):
+        q = PriorityWorkQueue()
+        assert wait_queue(q) is True
+
+        q.put('task')
+        threading.Timer(0.1, CANCELLATION.cancel).start()
+        assert wait_queue(q) is False
+
+    def test_shutdown(self, slow_links):
+        q = PriorityWorkQueue()
+        threads = start_workers(q, 5, no_killer=True)
+
+        for link in slow_links:
+            q.put(link)
+
+        time.sleep(0.1)
+        t0 = time.time()
+        assert shutdown(q, threads, timeout=5) == []
+
+        assert time.time() - t0 < 1
+        assert q.unfinished_tasks == 0
+        assert all(thread.status == 'killed' for thread in threads)
+
+    def test_deadline(self):
+        q = PriorityWorkQueue()
+        d = Downloader()
+        subject = Subject('deadline', 'http://localhost/deadline', d, None)
+        release = threading.Event()
+
+        class BlockedLink(BaseLink):
+            def download(self):
+                release.wait(5)
+
+        threads = start_workers(q, 1, no_killer=True)
+        q.put(BlockedLink('blocked', 'http://localhost/blocked', subject, d, None))
+        time.sleep(0.1)
+
+        t0 = time.time()
+        assert shutdown(q, threads, timeout=0.2) == threads
+        assert time.time() - t0 < 1
+
+        release.set()
+        threads[0].join(1)
+        assert not threads[0].is_alive()
+
+
+class TestWatchdog:
+    @pytest.fixture
+    def stuck_link(self):
+        class StuckLink(BaseLink):
+            attempts = 0
+            stuck_attempts = 1
+
+            def download(self):
+                StuckLink.attempts += 1
+                if StuckLink.attempts <= StuckLink.stuck_attempts:
+                    CANCELLATION.sleep(30)
+
+        d = Downloader()
+        subject = Subject('watchdog', 'http://localhost/watchdog', d, None)
+        return StuckLink('stuck', 'http://localhost/mod/folder/view.php?id=1', subject, d, None)
+
+    @staticmethod
+    def run_watchdog(link, max_requeues):
+        q = PriorityWorkQueue()
+        threads = start_workers(q, 2, no_killer=True)
+        watchdog = Watchdog(threads, deadlines={'discovery': 0.2}, max_requeues=max_requeues,
+                            interval=0.05)
+        watchdog.start()
+
+        q.put(link)
+        t0 = time.time()
+        q.join()
+
+        for thread in threads:
+            q.put(None)
+        for thread in threads:
+            thread.join()
+
+        assert time.time() - t0 < 3
+        return watchdog.stats
+
+    def test_task_kind(self, stuck_link):
+        assert get_task_kind(stuck_link) == 'discovery'
+        assert get_task_kind(stuck_link.subject) == 'subject'
+        assert get_task_kind(None) is None
+
+    def test_requeue(self, stuck_link):
+        stats = self.run_watchdog(stuck_link, max_requeues=2)
+
+        assert type(stuck_link).attempts == 2
+        assert stats.to_json() == {'interrupted': 1, 'requeued': 1, 'abandoned': []}
+
+    def test_finished_after_interrupt(self):
+        class SlowLink(BaseLink):
+            attempts = 0
+
+            def download(self):
+                # Does not check the interruption, like the segments of a download.
+                SlowLink.attempts += 1
+                time.sleep(0.5)
+
+        d = Downloader()
+        subject = Subject('watchdog', 'http://localhost/watchdog', d, None)
+        link = SlowLink('slow', 'http://localhost/mod/folder/view.php?id=2', subject, d, None)
+        stats = self.run_watchdog(link, max_requeues=2)
+
+        assert SlowLink.attempts == 1
+        assert stats.to_json() == {'interrupted': 1, 'requeued': 0, 'abandoned': []}
+        assert not CANCELLATION.is_interrupted()
+
+    def test_abandon(self, stuck_link):
+        type(stuck_link).stuck_attempts = 5
+        stats = self.run_watchdog(stuck_link, max_requeues=1)
+
+        assert type(stuck_link).attempts == 2
+        assert stats.to_json() == {'interrupted': 2, 'requeued': 1,
+                                   'abandoned': [stuck_link.url]}
+
+
 @pytest.fixture
 def close_threads():
     def real_close_threads(thread_list: List[Worker]):
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from vcd.cancellation import Cancellation, CancelledError, TaskTimeoutError
+
+
+class TestCancellation:
+    def test_cancel(self):
+        cancellation = Cancellation()
+        cancellation.check()
+        assert not cancellation.is_set()
+
+        cancellation.cancel('test')
+        assert cancellation.is_set()
+
+        with pytest.raises(CancelledError):
+            cancellation.check()
+
+    def test_callbacks(self):
+        cancellation = Cancellation()
+        calls = []
+
+        def failing():
+            raise RuntimeError
+
+        cancellation.register(failing)
+        cancellation.register(lambda: calls.append(1))
+
+        cancellation.cancel()
+        cancellation.cancel()
+        assert calls == [1]
+
+    def test_reset(self):
+        cancellation = Cancellation()
+        calls = []
+        cancellation.register(lambda: calls.append(1))
+        cancellation.cancel()
+
+        cancellation.reset()
+        assert not cancellation.is_set()
+
+        cancellation.cancel()
+        assert calls == [1]
+
+    def test_sleep(self):
+        cancellation = Cancellation()
+        cancellation.sleep(0.01)
+
+        threading.Timer(0.1, cancellation.cancel).start()
+        t0 = time.time()
+
+        with pytest.raises(CancelledError):
+            cancellation.sleep(10)
+
+        assert time.time() - t0 < 1
+
+    def test_interrupt(self):
+        cancellation = Cancellation()
+        errors = []
+
+        def task():
+            try:
+                cancellation.sleep(10)
+            except TaskTimeoutError as ex:
+                errors.append(ex)
+            errors.append(cancellation.clear_interrupt())
+            cancellation.check()
+
+        thread = threading.Thread(target=task)
+        thread.start()
+        cancellation.interrupt(thread.ident)
+        thread.join(2)
+
+        assert not thread.is_alive()
+        assert isinstance(errors[0], TaskTimeoutError)
+        assert errors[1] is True
+        assert not cancellation.is_set()
+        assert not cancellation.clear_interrupt()
@@ -0,0 +1,173 @@
+import os
+
+import pytest
+
+from vcd import Downloader, Options, Subject
+from vcd._threading import PriorityWorkQueue, get_queued
+from vcd.cancellation import CANCELLATION
+from vcd.checkpoint import Checkpoint, task_from_json, task_to_json
+from vcd.frontier import PAGES, VISITED, normalize_url
+from vcd.links import Folder, Forum
+
+
+class DummyCheckpoint(Checkpoint):
+    filename = 'dummy-checkpoint.json'
+
+
+@pytest.fixture
+def checkpoint():
+    checkpoint = DummyCheckpoint()
+    yield checkpoint
+    checkpoint.remove()
+
+
+@pytest.fixture
+def subject():
+    return Subject('checkpoint', 'http://localhost/course/view.php?id=1', Downloader(), None)
+
+
+class TestSerialization:
+    def test_subject(self, subject):
+        data = task_to_json(subject)
+        assert data == {'type': 'Subject', 'name': subject.name, 'url': subject.url}
+
+        task = task_from_json(data, subject.downloader, 'queue', {})
+        assert isinstance(task, Subject)
+        assert (task.name, task.url, task.queue) == (subject.name, subject.url, 'queue')
+
+    def test_links(self, subject):
+        forum = Forum('Foro', 'http://localhost/mod/forum/view.php?id=6', subject,
+                      subject.downloader, None)
+        forum.subfolders = ['foros', 'Foro']
+        folder = Folder('Practicas', 'http://localhost/mod/folder/view.php?id=4', subject,
+                        subject.downloader, None)
+
+        subjects = {}
+        tasks = [task_from_json(task_to_json(link), subject.downloader, None, subjects)
+                 for link in (forum, folder)]
+
+        assert isinstance(tasks[0], Forum)
+        assert isinstance(tasks[1], Folder)
+        assert tasks[0].subfolders == ['foros', 'Foro']
+        assert tasks[0].subject is tasks[1].subject
+        assert list(subjects) == [subject.url]
+
+    def test_not_a_task(self):
+        assert task_to_json(None) is None
+        assert task_to_json('retire') is None
+
+
+class TestCheckpoint:
+    def test_save_and_resume(self, checkpoint, subject):
+        folder = Folder('Practicas', 'http://localhost/mod/folder/view.php?id=4', subject,
+                        subject.downloader, None)
+
+        assert checkpoint.open(subject.downloader, None) == []
+        checkpoint.start_task(subject)
+        checkpoint.finish_task(subject, completed=True)
+        checkpoint.start_task(folder)
+        checkpoint.update([None])
+
+        other = DummyCheckpoint()
+        tasks = other.open(subject.downloader, 'queue', resume=True)
+        assert [type(task) for task in tasks] == [Folder]
+        assert tasks[0].queue == 'queue'
+        assert other.completed == {normalize_url(subject.url)}
+        assert other.is_completed(subject.url)
+
+    def test_running_task_subfolders(self, checkpoint, subject):
+        forum = Forum('Foro', 'http://localhost/mod/forum/view.php?id=6', subject,
+                      subject.downloader, None)
+
+        checkpoint.open(subject.downloader, None)
+        checkpoint.start_task(forum)
+
+        # The forum adds its folders while it is processed.
+        forum.append_subfolder('foros')
+        forum.append_subfolder('Foro')
+        checkpoint.update([])
+
+        tasks = DummyCheckpoint().open(subject.downloader, None, resume=True)
+        assert tasks[0].subfolders == []
+
+    def test_close(self, checkpoint, subject):
+        checkpoint.open(subject.downloader, None)
+        checkpoint.update([subject])
+        assert os.path.isfile(checkpoint.path)
+
+        checkpoint.close()
+        assert not os.path.isfile(checkpoint.path)
+
+        checkpoint.update([subject])
+        assert not os.path.isfile(checkpoint.path)
+
+    def test_cancelled_tasks_stay_pending(self, checkpoint, subject):
+        checkpoint.open(subject.downloader, None)
+        checkpoint.start_task(subject)
+        CANCELLATION.cancel()
+
+        try:
+            checkpoint.finish_task(subject, completed=False)
+            checkpoint.close([])
+        finally:
+            CANCELLATION.reset()
+
+        assert checkpoint.open(subject.downloader, None, resume=True)[0].url == subject.url
+
+    def test_no_resume(self, checkpoint, subject):
+        checkpoint.open(subject.downloader, None)
+        checkpoint.close([subject])
+
+        assert checkpoint.open(subject.downloader, None, resume=False) == []
+        assert not os.path.isfile(checkpoint.path)
+
+
+def test_resume_crawl(moodle_scenario, checkpoint, crawl):
+    base, requested = moodle_scenario
+    d = Downloader()
+    subject = Subject('Checkpoint', base + '/course/view.php?id=1', d, None)
+    folder = Folder('Practicas', base + '/mod/folder/view.php?id=4', subject, d, None)
+
+    checkpoint['pending'] = [task_to_json(folder)]
+    checkpoint['completed'] = [normalize_url(base + '/pluginfile.php/4/p1.txt')]
+    checkpoint.save()
+
+    queue = PriorityWorkQueue()
+    for task in checkpoint.open(d, queue, resume=True):
+        queue.put(task)
+    for url in checkpoint.completed:
+        VISITED.add(url)
+
+    crawl(queue, nthreads=2)
+
+    assert sorted(requested) == ['/mod/folder/view.php?id=4', '/pluginfile.php/4/p2.txt']
+    assert os.path.isfile(os.path.join(Options.ROOT_FOLDER, subject.folder, 'Practicas',
+                                       'p2.txt'))
+
+
+def test_resume_running_folder(moodle_scenario, checkpoint, crawl):
+    base, requested = moodle_scenario
+    d = Downloader()
+    queue = PriorityWorkQueue()
+    subject = Subject('Running', base + '/course/view.php?id=1', d, queue)
+    folder = Folder('Practicas', base + '/mod/folder/view.php?id=4', subject, d, queue)
+
+    # The folder was interrupted after adding its subfolder and finding its files.
+    checkpoint.open(d, queue)
+    checkpoint.start_task(folder)
+    folder.download()
+    checkpoint.close(get_queued(queue))
+
+    # The execution is resumed by a new process.
+    PAGES.clear()
+    queue = PriorityWorkQueue()
+    tasks = checkpoint.open(d, queue, resume=True)
+    assert [task.subfolders for task in tasks if isinstance(task, Folder)] == [[]]
+
+    for task in tasks:
+        queue.put(task)
+
+    crawl(queue, nthreads=2)
+
+    folder = os.path.join(Options.ROOT_FOLDER, subject.folder, 'Practicas')
+    assert sorted(os.listdir(folder)) == ['p1.txt', 'p2.txt']
@@ -0,0 +1,66 @@
+import pytest
+
+from vcd import Options
+from vcd.content_types import CONTENT_TYPES, PARSE, SAVE, SKIP, ContentTypeRegistry, \
+    parse_content_type, sniff_content_type
+
+
+@pytest.fixture
+def registry():
+    registry = ContentTypeRegistry()
+    registry.register('application/pdf', 'pdf', SAVE, 'pdf')
+    registry.register('Text/HTML', 'html', PARSE)
+    return registry
+
+
+def test_parse_content_type():
+    assert parse_content_type('text/html; charset=utf-8') == 'text/html'
+    assert parse_content_type(' Application/PDF ') == 'application/pdf'
+    assert parse_content_type('') is None
+    assert parse_content_type(None) is None
+
+
+def test_sniff_content_type():
+    assert sniff_content_type(b'%PDF-1.4\n...') == 'application/pdf'
+    assert sniff_content_type(b'\x89PNG\r\n\x1a\n....') == 'image/png'
+    assert sniff_content_type(b'\x00\x00\x00\x18ftypmp42') == 'video/mp4'
+    assert sniff_content_type(b'\n  <!DOCTYPE HTML><html>') == 'text/html'
+    assert sniff_content_type(b'hello') is None
+    assert sniff_content_type(b'') is None
+
+
+class TestRegistry:
+    def test_get(self, registry):
+        assert registry.get('application/pdf').resource_type == 'pdf'
+        assert registry.get('text/html').action == PARSE
+        assert registry.get('image/png') is None
+        assert registry.get(None) is None
+        assert 'application/pdf' in registry
+
+    def test_resolve(self, registry):
+        assert registry.resolve('application/pdf; name=a').resource_type == 'pdf'
+        assert registry.resolve(None, 'http://localhost/pluginfile.php/a.PDF').extension == 'pdf'
+        assert registry.resolve('application/x-unknown', 'a.bin', b'%PDF-1.4').action == SAVE
+        assert registry.resolve('application/x-unknown', 'a.bin', b'hello') is None
+        assert registry.resolve(None) is None
+
+    def test_options_take_precedence(self, registry):
+        Options.set_content_type('application/pdf', 'skip')
+        Options.set_content_type('application/x-matlab', 'matlab .m')
+
+        try:
+            assert registry.get('application/pdf').action == SKIP
+            assert registry.get('application/x-matlab').extension == 'm'
+        finally:
+            Options.CONTENT_TYPES.clear()
+
+        assert registry.get('application/pdf').action == SAVE
+
+
+def test_default_types():
+    assert CONTENT_TYPES.get('text/html').action == PARSE
+    assert CONTENT_TYPES.get('application/octet-stream').extension is None
+
+    for content_type in ('application/pdf', 'application/msword', 'application/zip',
+                         'text/plain', 'image/jpeg', 'video/mp4'):
+        assert CONTENT_TYPES.get(content_type).action == SAVE
@@ -1,14 +1,21 @@
+import io
+import json
 import os
 import random
 import shutil
+from _sha1 import sha1
 from queue import Queue
 
 import pytest
 from bs4 import BeautifulSoup as Soup
+from requests import Response
 
 from vcd import Subject, Downloader, Options
 from vcd.alias import Alias
-from vcd.links import BaseLink, Resource, Folder, Delivery
+from vcd.filecache import REAL_FILE_CACHE
+from vcd.frontier import PAGES, VISITED
+from vcd.links import BaseLink, Resource, Folder, Forum, Delivery, PartFile
+from vcd.stores import FORUM_MARKERS, VALIDATORS, WRAPPERS
 
 
 class TestBaseLink:
@@ -281,6 +288,286 @@ class TestBaseLink:
             assert os.path.isfile('temp_tests/RORY/SPQR/centurion.json')
 
 
+class TestStreamedSave:
+    @pytest.fixture(scope='class', autouse=True)
+    def controller(self):
+        Alias.destroy()
+        yield
+        Alias.destroy()
+
+    def test_save_in_chunks(self, _link, fake_response):
+        content = os.urandom(300 * 1024 + 7)
+        link = _link('STREAM', 'video')
+        link.response = fake_response(content, {'Content-Type': 'video/mp4'})
+        link.response.url = 'http://localhost/video.mp4'
+        link.response_name = 'video.mp4'
+        link.save_response_content()
+
+        assert os.path.basename(link.filepath) == 'video.mp4'
+        assert REAL_FILE_CACHE[link.filepath] == len(content)
+        assert link.content_hash == sha1(content).hexdigest()
+        assert os.listdir(os.path.dirname(link.filepath)) == ['video.mp4']
+
+        with open(link.filepath, 'rb') as file_handler:
+            assert file_handler.read() == content
+
+    def test_same_length_is_not_read(self, _link, fake_response):
+        link = _link('STREAM', 'cached')
+        link.response_name = 'cached.pdf'
+        link.response = fake_response(b'a' * 10, {'Content-Length': '10'})
+        link.autoset_filepath()
+        REAL_FILE_CACHE[link.filepath] = 10
+
+        link.save_response_content()
+
+        assert link.content_hash is None
+        assert not os.path.isfile(link.filepath)
+
+
+class TestResume:
+    @pytest.fixture(scope='class', autouse=True)
+    def controller(self):
+        Alias.destroy()
+        yield
+        Alias.destroy()
+
+    @pytest.fixture
+    def _partial(self, moodle_server, d, queue):
+        """Downloads the resource and leaves it as an interrupted transfer."""
+        base, requested = moodle_server
+
+        def p(part_content, etag):
+            url = base + '/resume/mod/resource/view.php?id=2'
+            subject = Subject('RESUME', str(random.randint(0, 10 ** 9)), d, queue)
+
+            resource = Resource('tema', url, subject, d, queue)
+            resource.download()
+            filepath = resource.filepath
+            os.remove(filepath)
+            REAL_FILE_CACHE.cache.pop(filepath)
+
+            with open(filepath + '.part', 'wb') as file_handler:
+                file_handler.write(part_content)
+            with open(filepath + '.part.json', 'wt') as file_handler:
+                json.dump({'url': url, 'etag': etag}, file_handler)
+
+            requested.clear()
+            return Resource('tema', url, subject, d, queue)
+
+        return p
+
+    def test_resume(self, _partial, moodle_server):
+        _, requested = moodle_server
+        resource = _partial(b'XXXX', '"tema1"')
+        resource.download()
+
+        # The range is requested directly, without a previous request of the full content.
+        assert requested == ['/mod/resource/view.php?id=2 [bytes=4-]']
+
+        # Only the missing bytes are downloaded.
+        with open(resource.filepath, 'rb') as file_handler:
+            assert file_handler.read() == b'XXXX 1'
+
+        assert resource.content_hash == sha1(b'XXXX 1').hexdigest()
+        assert os.listdir(os.path.dirname(resource.filepath)) == ['tema.pdf']
+
+    def test_etag_changed(self, _partial, moodle_server):
+        _, requested = moodle_server
+        resource = _partial(b'XXXX', '"old"')
+        resource.download()
+
+        # The server ignores the range of a changed file and sends the full content.
+        assert requested == ['/mod/resource/view.php?id=2 [bytes=4-]']
+
+        with open(resource.filepath, 'rb') as file_handler:
+            assert file_handler.read() == b'tema 1'
+
+        assert os.listdir(os.path.dirname(resource.filepath)) == ['tema.pdf']
+
+    def test_interrupted(self, tmp_path, fake_response):
+        filepath = str(tmp_path / 'file.pdf')
+        response = fake_response(b'', {'ETag': '"abc"', 'Accept-Ranges': 'bytes',
+                                       'Content-Length': '10'})
+
+        part = PartFile(filepath)
+        part.open('http://localhost/file.pdf', response)
+        part.write(b'abcd')
+        part.abort()
+
+        assert PartFile(filepath).get_resume_headers('http://localhost/file.pdf') == {
+            'Range': 'bytes=4-', 'If-Range': '"abc"'}
+        assert PartFile(filepath).get_resume_headers('http://localhost/other') is None
+
+        response.headers['ETag'] = 'W/"abc"'
+        part = PartFile(filepath)
+        part.open('http://localhost/file.pdf', response)
+        part.write(b'abcd')
+        part.abort()
+
+        assert PartFile(filepath).get_resume_headers('http://localhost/file.pdf') is None
+
+    def test_interrupted_without_validator(self, tmp_path, fake_response):
+        filepath = str(tmp_path / 'file.pdf')
+
+        part = PartFile(filepath)
+        part.open('http://localhost/file.pdf', fake_response(b''))
+        part.write(b'abcd')
+        part.abort()
+
+        assert os.listdir(str(tmp_path)) == []
+
+
+class TestSegments:
+    @pytest.fixture(scope='class', autouse=True)
+    def controller(self):
+        Alias.destroy()
+        Options.set_segments(3)
+        Options.set_segment_threshold(4)
+        yield
+        Options.set_segments(4)
+        Options.set_segment_threshold(32 * 1024 * 1024)
+        Alias.destroy()
+
+    def test_split(self):
+        assert PartFile.split(6, 3) == [(0, 1), (2, 3), (4, 5)]
+        assert PartFile.split(7, 3) == [(0, 2), (3, 5), (6, 6)]
+        assert PartFile.split(2, 4) == [(0, 0), (1, 1)]
+
+    def test_download(self, moodle_server, d, queue):
+        base, requested = moodle_server
+        subject = Subject('SEGMENTS', str(random.randint(0, 10 ** 9)), d, queue)
+        resource = Resource('tema', base + '/segments/mod/resource/view.php?id=2', subject, d,
+                            queue)
+        resource.download()
+
+        with open(resource.filepath, 'rb') as file_handler:
+            assert file_handler.read() == b'tema 1'
+
+        assert resource.content_hash == sha1(b'tema 1').hexdigest()
+        assert REAL_FILE_CACHE[resource.filepath] == 6
+        assert os.listdir(os.path.dirname(resource.filepath)) == ['tema.pdf']
+        assert sorted(requested[1:]) == ['/mod/resource/view.php?id=2 [bytes=0-1]',
+                                         '/mod/resource/view.php?id=2 [bytes=2-3]',
+                                         '/mod/resource/view.php?id=2 [bytes=4-5]']
+
+    def test_ranges_not_supported(self, moodle_server, d, queue):
+        base, requested = moodle_server
+        subject = Subject('SEGMENTS', str(random.randint(0, 10 ** 9)), d, queue)
+        resource = Resource('p1', base + '/segments/pluginfile.php/4/p1.txt', subject, d,
+                            queue)
+        resource.download()
+
+        assert requested == ['/pluginfile.php/4/p1.txt']
+
+
+class TestProbe:
+    @pytest.fixture(scope='class', autouse=True)
+    def controller(self):
+        Alias.destroy()
+        yield
+        Alias.destroy()
+
+    @pytest.fixture
+    def _probed(self, queue, fake_response):
+        def p(link_name, headers, status_code=200):
+            class ProbeDownloader:
+                def head(self, url, **kwargs):
+                    response = fake_response(b'', headers, status_code)
+                    response.url = url
+                    return response
+
+            d = ProbeDownloader()
+            subject = Subject('PROBE', str(random.randint(0, 10 ** 9)), d, queue)
+            return Resource(link_name, 'http://localhost/file.pdf', subject, d, queue)
+
+        return p
+
+    def test_same_length(self, _probed):
+        resource = _probed('same', {'Content-Type': 'application/pdf', 'Content-Length': '20'})
+        resource.url += '?same'
+        resource.response_name = 'same.pdf'
+        resource.response = Response()
+        resource.autoset_filepath()
+        REAL_FILE_CACHE[resource.filepath] = 20
+        resource.filepath = None
+
+        assert resource.probe() is False
+        assert os.path.basename(resource.filepath) == 'same.pdf'
+
+    def test_new_file(self, _probed):
+        resource = _probed('new', {'Content-Type': 'application/pdf', 'Content-Length': '20'})
+        resource.url += '?new'
+        assert resource.probe() is True
+
+    def test_html(self, _probed):
+        resource = _probed('html', {'Content-Type': 'text/html', 'Content-Length': '20'})
+        assert resource.probe() is True
+
+    def test_error(self, _probed):
+        resource = _probed('error', {}, 403)
+        assert resource.probe() is True
+
+    def test_skipped(self, _probed):
+        Options.set_content_type('application/pdf', 'skip')
+
+        try:
+            resource = _probed('skip', {'Content-Type': 'application/pdf'})
+            assert resource.probe() is False
+            assert resource.filepath is None
+        finally:
+            Options.CONTENT_TYPES.clear()
+
+
+class TestContentTypes:
+    @pytest.fixture(scope='class', autouse=True)
+    def controller(self):
+        Alias.destroy()
+        yield
+        Alias.destroy()
+
+    def test_sniffed(self, moodle_server, d, queue):
+        base, requested = moodle_server
+        subject = Subject('SNIFF', str(random.randint(0, 10 ** 9)), d, queue)
+        resource = Resource('informe', base + '/sniff/pluginfile.php/8/informe', subject, d,
+                            queue)
+        resource.download()
+
+        assert resource.resource_type == 'pdf'
+        assert os.path.basename(resource.filepath) == 'informe.pdf'
+        assert requested[-1] == '/pluginfile.php/8/informe [bytes=0-31]'
+
+    def test_saved_as_unknown(self, moodle_server, d, queue):
+        base, requested = moodle_server
+        subject = Subject('UKN', str(random.randint(0, 10 ** 9)), d, queue)
+        resource = Resource('informe', base + '/ukn/pluginfile.php/8/informe', subject, d,
+                            queue)
+
+        # Saved before the extension was taken from the content type.
+        real = os.path.normpath(os.path.join(Options.ROOT_FOLDER, subject.folder,
+                                             'informe.ukn'))
+        Alias.real_to_alias(sha1(resource.alias_url.encode()).hexdigest(), real)
+        resource.download()
+
+        assert resource.resource_type == 'pdf'
+        assert resource.filepath == real
+        assert os.path.isfile(real)
+
+    def test_skipped(self, moodle_server, d, queue):
+        base, requested = moodle_server
+        subject = Subject('SKIP', str(random.randint(0, 10 ** 9)), d, queue)
+        resource = Resource('video', base + '/skip/pluginfile.php/8/video.mp4', subject, d,
+                            queue)
+        Options.set_content_type('video/mp4', 'skip')
+
+        try:
+            resource.download()
+        finally:
+            Options.CONTENT_TYPES.clear()
+
+        assert resource.filepath is None
+        assert requested == ['/pluginfile.php/8/video.mp4']
+
+
 class TestResource:
     @pytest.fixture(scope='class', autouse=True)
     def controller(self):
@@ -329,6 +616,20 @@ class TestResource:
         assert resource.filepath == 'temp_tests/RORY/SPQR/centurion.json'
         assert os.path.isfile('temp_tests/RORY/SPQR/centurion.json')
 
+    def test_parse_only_main_region(self, _resource, fake_response):
+        resource = _resource('WRAPPER', 'Tema 1')
+        resource.response = fake_response(
+            b'<nav><a href="/course/view.php?id=1">Asignatura</a></nav><div role="main">'
+            b'<h2>Tema 1</h2><div class="resourcecontent"><iframe id="resourceobject" '
+            b'src="http://localhost/pluginfile.php/2/tema1.pdf"></iframe></div></div>',
+            {'Content-Type': 'text/html; charset=utf-8'})
+        resource.parse_html()
+
+        assert resource.soup.find('nav') is None
+        wrapped = resource.queue.get_nowait()
+        assert wrapped.name == 'Tema 1'
+        assert wrapped.url == 'http://localhost/pluginfile.php/2/tema1.pdf'
+
 
 class TestFolder:
     @pytest.fixture(scope='class', autouse=True)
@@ -378,6 +679,144 @@ class TestDelivery:
         assert os.path.isdir('temp_tests/MyDelivery/Box')
 
 
+class TestForum:
+    @pytest.fixture(scope='class', autouse=True)
+    def controller(self):
+        Alias.destroy()
+        FORUM_MARKERS.data = {}
+        yield
+        FORUM_MARKERS.data = {}
+        Alias.destroy()
+
+    @pytest.fixture
+    def _crawl(self, moodle_server, d, crawl):
+        base, requested = moodle_server
+
+        def p(prefix='/forum'):
+            queue = Queue()
+            subject = Subject('FORUM', base + prefix + '/course/view.php?id=1', d, queue)
+            queue.put(Forum('Foro', base + prefix + '/mod/forum/view.php?id=9', subject, d,
+                            queue))
+            crawl(queue)
+
+            VISITED.clear()
+            PAGES.clear()
+            result = sorted(requested)
+            requested.clear()
+            return result
+
+        return p
+
+    def test_get_marker(self):
+        soup = Soup('<table><tr><td class="topic starter"><a href="/d">D</a></td>'
+                    '<td class="replies"> 3 </td><td class="lastpost">Ana<br>lun, 5 oct</td>'
+                    '</tr></table><td class="topic starter"><a href="/e">E</a></td>',
+                    'html.parser')
+        themes = soup.find_all('td', {'class': 'topic starter'})
+
+        assert Forum.get_marker(themes[0]) == '3 | Analun, 5 oct'
+        assert Forum.get_marker(themes[1]) is None
+
+    def test_get_page(self):
+        assert Forum.get_page('http://localhost/mod/forum/view.php?id=9&page=2') == 2
+        assert Forum.get_page('http://localhost/mod/forum/view.php?id=9') == 0
+        assert Forum.get_page('http://localhost/mod/forum/view.php?id=9&page=x') == 0
+
+    def test_unchanged_discussions(self, _crawl):
+        assert _crawl() == ['/mod/forum/discuss.php?d=10', '/mod/forum/discuss.php?d=11',
+                            '/mod/forum/view.php?id=9', '/mod/forum/view.php?id=9&page=1',
+                            '/pluginfile.php/10/horario.pdf', '/pluginfile.php/11/examen.pdf']
+        assert len(FORUM_MARKERS) == 2
+
+        # The attachments are saved in the folder of their discussion, as before the markers.
+        forums = ['foros'] if Options.FORUMS_SUBFOLDERS else []
+        assert sorted(data['subfolders'] for data in FORUM_MARKERS.data.values()) == [
+            forums + ['Examen'], forums + ['Horario']]
+
+        # The markers did not change and the attachments were saved.
+        assert _crawl() == ['/mod/forum/view.php?id=9', '/mod/forum/view.php?id=9&page=1']
+
+        for url, data in FORUM_MARKERS.data.items():
+            if url.endswith('d=11'):
+                data['marker'] = '1 | Alumno mar, 6 oct'
+
+        assert _crawl() == ['/mod/forum/discuss.php?d=11', '/mod/forum/view.php?id=9',
+                            '/mod/forum/view.php?id=9&page=1', '/pluginfile.php/11/examen.pdf']
+
+    def test_deleted_attachments(self, moodle_server, _crawl):
+        base, _ = moodle_server
+        _crawl('/deleted-forum')
+        os.remove(VALIDATORS[base + '/deleted-forum/pluginfile.php/10/horario.pdf']['filepath'])
+
+        # The discussion did not change, but its deleted attachment is requested again.
+        assert _crawl('/deleted-forum') == ['/mod/forum/view.php?id=9',
+                                            '/mod/forum/view.php?id=9&page=1',
+                                            '/pluginfile.php/10/horario.pdf']
+
+    def test_skipped_attachments(self, _crawl):
+        Options.set_content_type('application/pdf', 'skip')
+
+        try:
+            assert '/pluginfile.php/10/horario.pdf' in _crawl('/skipped-forum')
+
+            # The attachments were skipped, so they are not requested again.
+            assert _crawl('/skipped-forum') == ['/mod/forum/view.php?id=9',
+                                                '/mod/forum/view.php?id=9&page=1']
+        finally:
+            Options.CONTENT_TYPES.clear()
+
+
+class TestWrappers:
+    @pytest.fixture(scope='class', autouse=True)
+    def controller(self):
+        Alias.destroy()
+        WRAPPERS.data = {}
+        yield
+        WRAPPERS.data = {}
+        Alias.destroy()
+
+    @pytest.fixture
+    def _crawl(self, moodle_scenario, d, crawl):
+        base, requested = moodle_scenario
+
+        def p():
+            queue = Queue()
+            subject = Subject('WRAPPERS', base + '/course/view.php?id=1', d, queue)
+            queue.put(Resource('Tema 2', base + '/mod/resource/view.php?id=3', subject, d,
+                               queue))
+            crawl(queue)
+
+            VISITED.clear()
+            PAGES.clear()
+            result = sorted(set(requested))
+            requested.clear()
+            return base, result
+
+        return p
+
+    def test_cached_wrapper(self, _crawl):
+        base, requested = _crawl()
+        assert requested == ['/mod/resource/view.php?id=3', '/pluginfile.php/3/tema2.zip']
+        assert WRAPPERS.get_target(base + '/mod/resource/view.php?id=3') == {
+            'name': 'Tema 2', 'url': base + '/pluginfile.php/3/tema2.zip'}
+
+        # The wrapper was resolved in the last execution, so it is not requested again.
+        _, requested = _crawl()
+        assert requested == ['/pluginfile.php/3/tema2.zip']
+
+    def test_cached_wrapper_failed(self, _crawl):
+        base, _ = _crawl()
+        WRAPPERS.update(base + '/mod/resource/view.php?id=3', 'Tema 2',
+                        base + '/pluginfile.php/3/missing.zip')
+
+        # The cached resource does not exist anymore, so the wrapper is resolved again.
+        _, requested = _crawl()
+        assert requested == ['/mod/resource/view.php?id=3', '/pluginfile.php/3/missing.zip',
+                             '/pluginfile.php/3/tema2.zip']
+        assert WRAPPERS.get_target(base + '/mod/resource/view.php?id=3') == {
+            'name': 'Tema 2', 'url': base + '/pluginfile.php/3/tema2.zip'}
+
+
 @pytest.fixture
 def queue():
     return Queue()
@@ -393,6 +832,18 @@ def d():
     return Downloader()
 
 
+@pytest.fixture
+def fake_response():
+    def p(content, headers=None, status_code=200):
+        response = Response()
+        response.status_code = status_code
+        response.headers.update(headers or {})
+        response.raw = io.BytesIO(content)
+        return response
+
+    return p
+
+
 @pytest.fixture
 def test_link(subject, queue, d):
     return BaseLink('test-name', 'http://localhost/url-test-link', subject, d, queue)
@@ -521,3 +521,220 @@ def test_set_timeout():
     Options.set_timeout(30)
 
 # todo test Options.load_config
+
+
+# noinspection PyTypeChecker
+def test_set_probe():
+    Options.set_probe(True)
+    assert Options.PROBE is True
+
+    Options.set_probe(False)
+    assert Options.PROBE is False
+
+    with pytest.raises(TypeError, match='probe must be bool, not'):
+        Options.set_probe('true')
+    with pytest.raises(TypeError, match='probe must be bool, not'):
+        Options.set_probe(1)
+
+
+def test_set_chunk_size():
+    Options.set_chunk_size(1024)
+    assert Options.CHUNK_SIZE == 1024
+
+    Options.set_chunk_size('2048')
+    assert Options.CHUNK_SIZE == 2048
+
+    with pytest.raises(ValueError, match='chunk_size must be positive'):
+        Options.set_chunk_size(0)
+
+    Options.set_chunk_size(64 * 1024)
+
+
+# noinspection PyTypeChecker
+def test_set_pool_block():
+    Options.set_pool_block(True)
+    assert Options.POOL_BLOCK is True
+
+    Options.set_pool_block(False)
+    assert Options.POOL_BLOCK is False
+
+    with pytest.raises(TypeError, match='pool_block must be bool, not'):
+        Options.set_pool_block('true')
+
+
+def test_set_retry_options():
+    backoff_factor = Options.BACKOFF_FACTOR
+
+    Options.set_retry_budget('100')
+    assert Options.RETRY_BUDGET == 100
+    Options.set_backoff_factor('0.25')
+    assert Options.BACKOFF_FACTOR == 0.25
+    Options.set_backoff_max(10)
+    assert Options.BACKOFF_MAX == 10
+
+    with pytest.raises(ValueError, match='retry_budget must be positive or zero'):
+        Options.set_retry_budget(-1)
+    with pytest.raises(ValueError, match='backoff_factor must be positive or zero'):
+        Options.set_backoff_factor(-0.5)
+    with pytest.raises(ValueError, match='backoff_max must be positive or zero'):
+        Options.set_backoff_max(-1)
+
+    Options.set_retry_budget(500)
+    Options.set_backoff_factor(backoff_factor)
+    Options.set_backoff_max(60)
+
+
+def test_set_segments():
+    Options.set_segments('8')
+    assert Options.SEGMENTS == 8
+    Options.set_segment_threshold(1024)
+    assert Options.SEGMENT_THRESHOLD == 1024
+
+    with pytest.raises(ValueError, match='segments must be at least 1'):
+        Options.set_segments(0)
+    with pytest.raises(ValueError, match='segment_threshold must be positive'):
+        Options.set_segment_threshold(0)
+
+    Options.set_segments(4)
+    Options.set_segment_threshold(32 * 1024 * 1024)
+
+
+def test_set_limits():
+    Options.set_max_per_host('6')
+    assert Options.MAX_PER_HOST == 6
+    Options.set_rate_limit('2.5')
+    assert Options.RATE_LIMIT == 2.5
+    Options.set_rate_burst(5)
+    assert Options.RATE_BURST == 5
+
+    with pytest.raises(ValueError, match='max_per_host must be positive or zero'):
+        Options.set_max_per_host(-1)
+    with pytest.raises(ValueError, match='rate_limit must be positive or zero'):
+        Options.set_rate_limit(-1)
+    with pytest.raises(ValueError, match='rate_burst must be at least 1'):
+        Options.set_rate_burst(0)
+
+    Options.set_max_per_host(0)
+    Options.set_rate_limit(0)
+    Options.set_rate_burst(10)
+
+
+def test_set_adaptive_workers():
+    Options.set_adaptive_workers(True)
+    assert Options.ADAPTIVE_WORKERS is True
+    Options.set_workers_range('2', 8)
+    assert (Options.MIN_WORKERS, Options.MAX_WORKERS) == (2, 8)
+
+    with pytest.raises(TypeError, match='adaptive_workers must be bool, not str'):
+        Options.set_adaptive_workers('true')
+    with pytest.raises(ValueError, match='Invalid workers range: 0-8'):
+        Options.set_workers_range(0, 8)
+    with pytest.raises(ValueError, match='Invalid workers range: 9-8'):
+        Options.set_workers_range(9, 8)
+
+    Options.set_adaptive_workers(False)
+    Options.set_workers_range(5, 100)
+
+
+def test_set_shutdown_timeout():
+    Options.set_shutdown_timeout('0.5')
+    assert Options.SHUTDOWN_TIMEOUT == 0.5
+
+    with pytest.raises(ValueError, match='shutdown_timeout must be positive or zero'):
+        Options.set_shutdown_timeout(-1)
+
+    Options.set_shutdown_timeout(2)
+
+
+def test_set_deadline():
+    Options.set_deadline('resource', '60')
+    assert Options.DEADLINES['resource'] == 60
+
+    with pytest.raises(ValueError, match='Invalid kind of task'):
+        Options.set_deadline('other', 10)
+
+    with pytest.raises(ValueError, match='deadline must be positive or zero'):
+        Options.set_deadline('subject', -1)
+
+    Options.set_deadline('resource', 1800)
+
+
+def test_set_max_requeues():
+    Options.set_max_requeues('3')
+    assert Options.MAX_REQUEUES == 3
+
+    with pytest.raises(ValueError, match='max_requeues must be positive or zero'):
+        Options.set_max_requeues(-1)
+
+    Options.set_max_requeues(2)
+
+
+def test_set_bandwidth_limits():
+    Options.set_bandwidth_limit('1048576')
+    Options.set_worker_bandwidth_limit(65536)
+    assert Options.BANDWIDTH_LIMIT == 1048576
+    assert Options.WORKER_BANDWIDTH_LIMIT == 65536
+
+    with pytest.raises(ValueError, match='bandwidth_limit must be positive or zero'):
+        Options.set_bandwidth_limit(-1)
+
+    with pytest.raises(ValueError, match='worker_bandwidth_limit must be positive or zero'):
+        Options.set_worker_bandwidth_limit(-1)
+
+    Options.set_bandwidth_limit(0)
+    Options.set_worker_bandwidth_limit(0)
+
+
+def test_set_checkpoint_interval():
+    Options.set_checkpoint_interval('10')
+    assert Options.CHECKPOINT_INTERVAL == 10
+
+    with pytest.raises(ValueError, match='checkpoint_interval must be positive or zero'):
+        Options.set_checkpoint_interval(-1)
+
+    Options.set_checkpoint_interval(30)
+
+
+def test_set_watch_interval():
+    Options.set_watch_interval('60')
+    assert Options.WATCH_INTERVAL == 60
+
+    with pytest.raises(ValueError, match='watch_interval must be positive'):
+        Options.set_watch_interval(0)
+
+    Options.set_watch_interval(15 * 60)
+
+
+def test_set_html_parser():
+    Options.set_html_parser('html.parser')
+    assert Options.HTML_PARSER == 'html.parser'
+
+    with pytest.raises(ValueError, match="Invalid html parser: 'html5'"):
+        Options.set_html_parser('html5')
+
+    Options.set_html_parser('auto')
+
+
+def test_set_content_type():
+    Options.set_content_type('Video/MP4', 'skip')
+    Options.set_content_type('application/x-matlab', 'matlab .m')
+    assert Options.CONTENT_TYPES == {'video/mp4': ('skipped', 'skip', None),
+                                     'application/x-matlab': ('matlab', 'save', 'm')}
+
+    with pytest.raises(ValueError, match="Invalid content type 'matlab': 'matlab'"):
+        Options.set_content_type('matlab', 'matlab')
+
+    with pytest.raises(ValueError, match="Invalid content type 'text/x-c': 'c source .c'"):
+        Options.set_content_type('text/x-c', 'c source .c')
+
+    Options.CONTENT_TYPES.clear()
+
+
+def test_set_backend():
+    Options.set_backend('webservice')
+    assert Options.BACKEND == 'webservice'
+
+    with pytest.raises(ValueError, match="Invalid backend: 'soap'"):
+        Options.set_backend('soap')
+
+    Options.set_backend('html')
@@ -0,0 +1,83 @@
+import sys
+
+from vcd import Options
+from vcd.benchmarks import benchmark_parsers, benchmark_partial_parsing, make_sample_pages
+from vcd.parsers import get_parser, is_available, make_strainer, parse_html
+
+
+def test_is_available():
+    assert is_available('html.parser') is True
+    assert is_available('html5') is False
+
+
+def test_get_parser(caplog):
+    expected = 'lxml' if is_available('lxml') else 'html.parser'
+    assert get_parser() == expected
+
+    Options.set_html_parser('html.parser')
+    try:
+        assert get_parser() == 'html.parser'
+
+        Options.HTML_PARSER = 'lxml'
+        assert get_parser() == expected
+        if expected != 'lxml':
+            assert 'not installed' in caplog.text
+    finally:
+        Options.set_html_parser('auto')
+
+
+def test_get_parser_without_lxml(monkeypatch, caplog):
+    # A None entry in sys.modules makes the import fail as if lxml was not installed
+    monkeypatch.setitem(sys.modules, 'lxml', None)
+    is_available.cache_clear()
+    try:
+        assert is_available('lxml') is False
+        assert get_parser() == 'html.parser'
+
+        Options.HTML_PARSER = 'lxml'
+        assert get_parser() == 'html.parser'
+        assert "HTML parser 'lxml' is not installed" in caplog.text
+
+        soup = parse_html(b'<p><a href="/a">A</a></p>')
+        assert soup.a['href'] == '/a'
+    finally:
+        Options.set_html_parser('auto')
+        is_available.cache_clear()
+
+
+def test_parse_html():
+    soup = parse_html(b'<div role="main"><a href="/a">A</a><a href="/b">B</a></div>')
+    assert [a['href'] for a in soup.find_all('a')] == ['/a', '/b']
+    assert soup.find('div', role='main') is not None
+
+
+def test_make_strainer():
+    markup = '<div class="x"><div class="activityinstance big"><a href="/a">A</a></div>' \
+             '<div class="activityinstancex"></div><table><tr><td class="topic starter">' \
+             '<a href="/d">D</a></td></tr></table><a target="_blank" href="/f">F</a></div>'
+
+    soup = parse_html(markup, parse_only=make_strainer('div', ['activityinstance']))
+    assert [a['href'] for a in soup.find_all('a')] == ['/a']
+
+    soup = parse_html(markup, parse_only=make_strainer(['td', 'div'], ['topic', 'big']))
+    assert [a['href'] for a in soup.find_all('a')] == ['/a', '/d']
+    assert soup.find('td', {'class': 'topic starter'}) is not None
+
+    soup = parse_html(markup, parse_only=make_strainer('a', target='_blank'))
+    assert [a['href'] for a in soup.find_all('a')] == ['/f']
+
+
+def test_benchmark_parsers():
+    pages = make_sample_pages(size=5)
+    assert set(pages) == {'course', 'folder', 'forum', 'assign', 'resource'}
+
+    results = benchmark_parsers(pages, parsers=['html.parser'], repeat=1)
+    assert set(results) == set(pages)
+    assert all(times['html.parser'] > 0 for times in results.values())
+
+
+def test_benchmark_partial_parsing():
+    results = benchmark_partial_parsing(make_sample_pages(size=50), repeat=1)
+
+    for measures in results.values():
+        assert measures['partial'][1] < measures['full'][1]
@@ -0,0 +1,139 @@
+import os
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from vcd import Downloader
+from vcd.credentials import Credentials, StudentCredentials
+from vcd.session import SessionManager, SessionStore
+
+
+class TestSessionStore:
+    def test_save_and_load(self):
+        d = Downloader()
+        d.cookies.set('MoodleSession', 'abc', domain='localhost', path='/')
+        SessionStore.save('user', d.cookies)
+
+        if os.name == 'posix':
+            assert os.stat(SessionStore.path).st_mode & 0o777 == 0o600
+
+        other = Downloader()
+        assert SessionStore.load('user', other.cookies) is True
+        assert other.cookies.get('MoodleSession') == 'abc'
+
+        assert SessionStore.load('other-user', Downloader().cookies) is False
+
+        SessionStore.clear()
+        assert SessionStore.load('user', Downloader().cookies) is False
+
+    def test_expired_cookies(self):
+        d = Downloader()
+        d.cookies.set('MoodleSession', 'abc', domain='localhost', path='/', expires=1)
+        SessionStore.save('user', d.cookies)
+
+        assert SessionStore.load('user', Downloader().cookies) is False
+        SessionStore.clear()
+
+
+class TestSessionManager:
+    def test_login_and_restore(self, campus):
+        d = Downloader()
+        response = SessionManager(d, campus.url).start()
+        assert 'Vista general de cursos' in response.text
+        assert campus.logins == 1
+        assert d.session_manager is not None
+
+        d = Downloader()
+        response = SessionManager(d, campus.url).start()
+        assert 'Vista general de cursos' in response.text
+        assert campus.logins == 1
+
+    def test_saved_session_expired(self, campus):
+        SessionManager(Downloader(), campus.url).start()
+        campus.session = 'new-session'
+
+        response = SessionManager(Downloader(), campus.url).start()
+        assert 'Vista general de cursos' in response.text
+        assert campus.logins == 2
+
+    def test_login_not_correct(self, campus, monkeypatch):
+        monkeypatch.setattr(Credentials, 'get',
+                            lambda: StudentCredentials('alias', 'user', 'wrong'))
+
+        with pytest.raises(SystemExit):
+            SessionManager(Downloader(), campus.url).start()
+
+        assert not os.path.isfile(SessionStore.path)
+
+    def test_expired_in_the_middle(self, campus):
+        d = Downloader()
+        SessionManager(d, campus.url).start()
+        assert d.get(campus.url + '/course').text == 'course'
+
+        campus.session = 'new-session'
+        assert d.get(campus.url + '/course').text == 'course'
+        assert d.get(campus.url + '/course').text == 'course'
+        assert campus.logins == 2
+
+    def test_relogin_once(self, campus):
+        d = Downloader()
+        manager = SessionManager(d, campus.url)
+        manager.start()
+
+        manager.relogin(0)
+        assert campus.logins == 1
+
+
+@pytest.fixture
+def campus(http_server, monkeypatch):
+    """Local server with the login of the virtual campus."""
+
+    class Campus:
+        url = None
+        session = 'session'
+        logins = 0
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def is_logged(self):
+            return f'MoodleSession={Campus.session}' in self.headers.get('Cookie', '')
+
+        def send(self, code, body='', headers=None):
+            self.send_response(code)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def do_POST(self):
+            data = self.rfile.read(int(self.headers['Content-Length'])).decode()
+
+            if self.path == '/login/index.php' and 'password=secret' in data:
+                Campus.logins += 1
+                self.send(303, headers={'Location': '/my/',
+                                        'Set-Cookie': f'MoodleSession={Campus.session}; Path=/'})
+            else:
+                self.send(200, 'login form')
+
+        def do_GET(self):
+            if self.path == '/login/index.php':
+                self.send(200, 'login form')
+            elif not self.is_logged():
+                self.send(303, headers={'Location': '/login/index.php'})
+            elif self.path == '/my/':
+                self.send(200, 'Vista general de cursos')
+            else:
+                self.send(200, 'course')
+
+        def log_message(self, *args):
+            pass
+
+    monkeypatch.setattr(Credentials, 'get', lambda: StudentCredentials('alias', 'user', 'secret'))
+
+    with http_server(Handler) as url:
+        Campus.url = url
+        yield Campus
+
+    SessionStore.clear()
@@ -5,8 +5,9 @@ from queue import Queue
 import pytest
 import requests
 
-from vcd import runserver
+from vcd import Downloader, Options, runserver
 from vcd._threading import Worker
+from vcd.status_server import create_app
 
 
 class TestStatusServer:
@@ -51,6 +52,36 @@ class TestStatusServer:
             assert f'Test-{i:03d}' in r.text
 
 
+class TestBandwidth:
+    @pytest.fixture
+    def client(self, monkeypatch):
+        monkeypatch.setattr(Options, 'BANDWIDTH_LIMIT', 0)
+        monkeypatch.setattr(Options, 'WORKER_BANDWIDTH_LIMIT', 0)
+        self.downloader = Downloader()
+        return create_app(Queue(), [], self.downloader).test_client()
+
+    def test_get_does_not_change_limits(self, client):
+        r = client.get('/bandwidth?limit=1000&worker_limit=100')
+        assert r.status_code == 200
+        assert r.get_json()['rate'] == 0
+        assert (Options.BANDWIDTH_LIMIT, Options.WORKER_BANDWIDTH_LIMIT) == (0, 0)
+
+    def test_post(self, client):
+        r = client.post('/bandwidth', data={'limit': 1000, 'worker_limit': 100})
+        assert r.status_code == 200
+        assert r.get_json()['rate'] == 1000
+        assert self.downloader.bandwidth.worker_rate == 100
+
+        assert client.post('/bandwidth', data={'limit': -1}).status_code == 400
+
+    def test_post_from_other_machine(self, client):
+        r = client.post('/bandwidth', data={'limit': 1000},
+                        environ_base={'REMOTE_ADDR': '192.168.1.20'})
+        assert r.status_code == 403
+        assert Options.BANDWIDTH_LIMIT == 0
+        assert self.downloader.bandwidth.rate == 0
+
+
 @pytest.fixture(autouse=True, scope='module')
 def auto_close_threads():
     yield
@@ -0,0 +1,123 @@
+import os
+
+import pytest
+from requests import Response
+
+from vcd.filecache import REAL_FILE_CACHE
+from vcd.stores import ForumMarkerStore, JsonStore, StoreError, Validator, ValidatorStore, \
+    WrapperStore
+
+
+class DummyStore(JsonStore):
+    filename = 'dummy-store.json'
+
+
+class TestExceptions:
+    def test_store_error(self):
+        with pytest.raises(StoreError):
+            raise StoreError
+
+
+class TestJsonStore:
+    def test_load_without_file(self):
+        store = DummyStore()
+        store.load()
+        assert len(store) == 0
+
+    def test_save_and_load(self):
+        store = DummyStore()
+        store['a'] = {'x': 1}
+        store['b'] = [1, 2, 3]
+        store.save()
+
+        other = DummyStore()
+        other.load()
+        assert other['a'] == {'x': 1}
+        assert other['b'] == [1, 2, 3]
+        assert 'c' not in other
+
+        os.remove(store.path)
+
+    def test_invalid_file(self):
+        store = DummyStore()
+        with open(store.path, 'wt') as file_handler:
+            file_handler.write('[1, 2]')
+
+        with pytest.raises(StoreError, match='Invalid store file'):
+            store.load()
+
+        os.remove(store.path)
+
+
+class TestValidator:
+    def test_to_headers(self):
+        assert Validator('url').to_headers() == {}
+        assert Validator('url', etag='"abc"').to_headers() == {'If-None-Match': '"abc"'}
+        assert Validator('url', etag='"abc"', last_modified='date').to_headers() == {
+            'If-None-Match': '"abc"', 'If-Modified-Since': 'date'}
+
+    def test_from_response(self):
+        response = Response()
+        response.url = 'http://localhost/final'
+        response.headers.update({'ETag': '"abc"', 'Last-Modified': 'date'})
+
+        validator = Validator.from_response('http://localhost/x', response, 25, 'file.pdf')
+        assert validator.to_json() == {
+            'url': 'http://localhost/x', 'etag': '"abc"', 'last_modified': 'date', 'size': 25,
+            'final_url': 'http://localhost/final', 'filepath': 'file.pdf'}
+
+
+class TestValidatorStore:
+    @pytest.fixture
+    def store(self):
+        response = Response()
+        response.url = 'http://localhost/final'
+        response.headers['ETag'] = '"abc"'
+
+        store = ValidatorStore()
+        store.update('http://localhost/x', response, 25, 'validator-store-file.pdf')
+        return store
+
+    def test_file_not_in_cache(self, store):
+        assert store.get_validator('http://localhost/x') is None
+        assert store.get_validator('http://localhost/unknown') is None
+
+    def test_file_in_cache(self, store):
+        REAL_FILE_CACHE['validator-store-file.pdf'] = 25
+        validator = store.get_validator('http://localhost/x')
+        assert validator.etag == '"abc"'
+        assert validator.to_headers() == {'If-None-Match': '"abc"'}
+
+    def test_file_changed(self, store):
+        REAL_FILE_CACHE['validator-store-file.pdf'] = 26
+        assert store.get_validator('http://localhost/x') is None
+
+
+class TestForumMarkerStore:
+    def test_markers(self):
+        store = ForumMarkerStore()
+        assert store.is_unchanged('http://localhost/discuss.php?d=1', '2 | lun') is False
+        assert store.get_attachments('http://localhost/discuss.php?d=1') == ([], [])
+
+        store.update('http://LOCALHOST/discuss.php?d=1#p3', '2 | lun', ['foros', 'Dudas'],
+                     [('dudas', 'http://localhost/dudas.pdf')])
+
+        assert store.is_unchanged('http://localhost/discuss.php?d=1', '2 | lun') is True
+        assert store.is_unchanged('http://localhost/discuss.php?d=1', '3 | mar') is False
+        assert store.get_attachments('http://localhost/discuss.php?d=1') == (
+            ['foros', 'Dudas'], [['dudas', 'http://localhost/dudas.pdf']])
+
+
+class TestWrapperStore:
+    def test_wrappers(self):
+        store = WrapperStore()
+        assert store.get_target('http://localhost/mod/resource/view.php?id=3') is None
+        assert store.invalidate('http://localhost/mod/resource/view.php?id=3') is False
+
+        store.update('http://LOCALHOST/mod/resource/view.php?id=3', 'Tema 2',
+                     'http://localhost/pluginfile.php/3/tema2.zip')
+
+        assert store.get_target('http://localhost/mod/resource/view.php?id=3') == {
+            'name': 'Tema 2', 'url': 'http://localhost/pluginfile.php/3/tema2.zip'}
+        assert store.invalidate('http://localhost/mod/resource/view.php?id=3') is True
+        assert store.get_target('http://localhost/mod/resource/view.php?id=3') is None
@@ -35,6 +35,8 @@ def test_make_request(_subject):
 
     assert subject.response.status_code == 200
     assert subject.response.content == requests.get(subject.url).content
+
+    subject.process_request_bs4()
     assert subject.soup == Soup(subject.response.content, 'html.parser')
 
 
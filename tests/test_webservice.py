@@ -0,0 +1,351 @@
+import json
+import logging
+import os
+from http.server import BaseHTTPRequestHandler
+from queue import Queue
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+
+from vcd import Downloader, Options, Subject
+from vcd.alias import Alias
+from vcd.frontier import PAGES, VISITED
+from vcd.stores import VALIDATORS
+from vcd.webservice import WebService, WebServiceError, WebServiceSubject, flatten_params
+
+TOKEN = '0123456789abcdef'
+
+# Responses of the web service of a Moodle 3.8 server, keyed by function.
+WEBSERVICE_RESPONSES = {
+    'core_webservice_get_site_info': {'sitename': 'Campus', 'userid': 42},
+    'core_enrol_get_users_courses': [
+        {'id': 3, 'shortname': 'WS', 'fullname': 'Web Service (2020-21)'},
+        {'id': 4, 'shortname': 'GRADO', 'fullname': 'Grado en Ingenieria'},
+    ],
+    'core_course_get_contents': [
+        {'id': 1, 'name': 'Tema 1', 'modules': [
+            {'id': 2, 'instance': 20, 'name': 'Tema 1', 'modname': 'resource',
+             'url': '{base}/mod/resource/view.php?id=2', 'contents': [
+                {'type': 'file', 'filename': 'tema1.pdf', 'filepath': '/', 'filesize': 6,
+                 'timemodified': 1600000000,
+                 'fileurl': '{base}/webservice/pluginfile.php/10/mod_resource/content/1/'
+                            'tema1.pdf?forcedownload=1'}]},
+            {'id': 4, 'instance': 40, 'name': 'Practicas', 'modname': 'folder',
+             'url': '{base}/mod/folder/view.php?id=4', 'contents': [
+                {'type': 'file', 'filename': 'p1.txt', 'filepath': '/', 'filesize': 10,
+                 'timemodified': 1600000000,
+                 'fileurl': '{base}/webservice/pluginfile.php/11/mod_folder/content/0/p1.txt'},
+                {'type': 'file', 'filename': 'p2.txt', 'filepath': '/extra/', 'filesize': 10,
+                 'timemodified': 1600000000,
+                 'fileurl': '{base}/webservice/pluginfile.php/11/mod_folder/content/0/extra/'
+                            'p2.txt'}]},
+            {'id': 6, 'instance': 60, 'name': 'Foro', 'modname': 'forum',
+             'url': '{base}/mod/forum/view.php?id=6'},
+            {'id': 8, 'instance': 80, 'name': 'Enlace', 'modname': 'url',
+             'url': '{base}/mod/url/view.php?id=8', 'contents': [
+                {'type': 'url', 'filename': 'Enlace', 'fileurl': 'https://example.com'}]},
+        ]},
+        {'id': 2, 'name': 'Entregas', 'modules': [
+            {'id': 5, 'instance': 50, 'name': 'Entrega 1', 'modname': 'assign',
+             'url': '{base}/mod/assign/view.php?id=5'},
+        ]},
+    ],
+    'mod_assign_get_assignments': {'courses': [{'id': 3, 'assignments': [
+        {'id': 50, 'cmid': 5, 'name': 'Entrega 1', 'introattachments': [
+            {'filename': 'enunciado.pdf', 'filepath': '/', 'filesize': 9,
+             'timemodified': 1600000000,
+             'fileurl': '{base}/webservice/pluginfile.php/12/mod_assign/introattachment/0/'
+                        'enunciado.pdf'}]}]}]},
+    'mod_assign_get_submission_status': {'lastattempt': {'submission': {'plugins': [
+        {'type': 'onlinetext', 'fileareas': [{'area': 'submissions_onlinetext', 'files': []}]},
+        {'type': 'file', 'fileareas': [{'area': 'submission_files', 'files': [
+            {'filename': 'memoria.pdf', 'filepath': '/', 'filesize': 7,
+             'timemodified': 1600000000,
+             'fileurl': '{base}/webservice/pluginfile.php/12/assignsubmission_file/'
+                        'submission_files/90/memoria.pdf'},
+            {'filename': 'memoria.pdf', 'filepath': '/v2/', 'filesize': 10,
+             'timemodified': 1600000000,
+             'fileurl': '{base}/webservice/pluginfile.php/12/assignsubmission_file/'
+                        'submission_files/90/v2/memoria.pdf'}]}]}]}}},
+    'mod_forum_get_forum_discussions': {'discussions': [
+        {'id': 70, 'discussion': 7, 'name': 'Dudas'}]},
+    'mod_forum_get_discussion_posts': {'posts': [
+        {'id': 71, 'subject': 'Dudas', 'attachments': [
+            {'filename': 'dudas.pdf', 'filesize': 5, 'timemodified': 1600000000,
+             'fileurl': '{base}/webservice/pluginfile.php/13/mod_forum/attachment/71/'
+                        'dudas.pdf'}]},
+        {'id': 72, 'subject': 'Re: Dudas', 'attachments': []}]},
+}
+
+FILES = {
+    '/webservice/pluginfile.php/10/mod_resource/content/1/tema1.pdf': b'tema 1',
+    '/webservice/pluginfile.php/11/mod_folder/content/0/p1.txt': b'practica 1',
+    '/webservice/pluginfile.php/11/mod_folder/content/0/extra/p2.txt': b'practica 2',
+    '/webservice/pluginfile.php/12/mod_assign/introattachment/0/enunciado.pdf': b'enunciado',
+    '/webservice/pluginfile.php/12/assignsubmission_file/submission_files/90/memoria.pdf':
+        b'memoria',
+    '/webservice/pluginfile.php/12/assignsubmission_file/submission_files/90/v2/memoria.pdf':
+        b'memoria v2',
+    '/webservice/pluginfile.php/13/mod_forum/attachment/71/dudas.pdf': b'dudas',
+}
+
+# Pages of the same course, for the html backend.
+HTML_PAGES = {
+    '/course/view.php?id=3': """
+        <div class="activityinstance"><a href="{base}/mod/resource/view.php?id=2">
+            <span>Tema 1</span></a></div>
+        <div class="activityinstance"><a href="{base}/mod/folder/view.php?id=4">
+            <span>Practicas</span></a></div>
+        <div class="activityinstance"><a href="{base}/mod/assign/view.php?id=5">
+            <span>Entrega 1</span></a></div>
+        <div class="activityinstance"><a href="{base}/mod/forum/view.php?id=6">
+            <span>Foro</span></a></div>""",
+    '/mod/folder/view.php?id=4': """
+        <span class="fp-filename-icon">
+            <a href="{base}/pluginfile.php/11/mod_folder/content/0/p1.txt">p1.txt</a></span>
+        <span class="fp-filename-icon">
+            <a href="{base}/pluginfile.php/11/mod_folder/content/0/extra/p2.txt">p2.txt</a></span>
+        """,
+    '/mod/assign/view.php?id=5': """
+        <a target="_blank"
+            href="{base}/pluginfile.php/12/mod_assign/introattachment/0/enunciado.pdf"
+            >enunciado.pdf</a>
+        <a target="_blank"
+            href="{base}/pluginfile.php/12/assignsubmission_file/submission_files/90/memoria.pdf"
+            >memoria.pdf</a>
+        <a target="_blank" href=
+            "{base}/pluginfile.php/12/assignsubmission_file/submission_files/90/v2/memoria.pdf"
+            >memoria.pdf</a>""",
+    '/mod/forum/view.php?id=6': """
+        <td class="topic starter"><a href="{base}/mod/forum/discuss.php?d=7">Dudas</a></td>""",
+    '/mod/forum/discuss.php?d=7': """
+        <div class="attachments">
+            <a href="{base}/pluginfile.php/13/mod_forum/attachment/71/dudas.pdf">dudas.pdf</a>
+        </div>""",
+}
+
+
+@pytest.fixture
+def webservice_server(http_server):
+    """Stub of the web service of the virtual campus, that replays `WEBSERVICE_RESPONSES`.
+
+    Yields the base url of the server and the list of functions called and files requested.
+    """
+
+    requested = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def send_json(self, data):
+            base = f'http://{self.headers["Host"]}'
+            self.send_body('application/json', json.dumps(data).replace('{base}', base).encode())
+
+        def send_body(self, content_type, body, status_code=200, headers=None):
+            self.send_response(status_code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers['Content-Length'])
+            params = dict(parse_qsl(self.rfile.read(length).decode()))
+
+            if self.path == '/login/token.php':
+                requested.append('token')
+                if params == {'username': 'user', 'password': 'pass',
+                              'service': 'moodle_mobile_app'}:
+                    return self.send_json({'token': TOKEN, 'privatetoken': None})
+                return self.send_json({'error': 'Invalid login, please try again',
+                                       'errorcode': 'invalidlogin'})
+
+            function = params.pop('wsfunction')
+            requested.append(function)
+
+            if params.pop('wstoken') != TOKEN or params.pop('moodlewsrestformat') != 'json':
+                return self.send_json({'exception': 'moodle_exception',
+                                       'errorcode': 'invalidtoken',
+                                       'message': 'Invalid token - token not found'})
+
+            if function not in WEBSERVICE_RESPONSES:
+                return self.send_json({'exception': 'dml_missing_record_exception',
+                                       'errorcode': 'invalidrecord',
+                                       'message': "Can't find data record in database table "
+                                                  "external_functions."})
+
+            return self.send_json(WEBSERVICE_RESPONSES[function])
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            requested.append(parts.path)
+
+            if not parts.path.startswith('/webservice/'):
+                return self.send_html_backend(parts.path)
+
+            if dict(parse_qsl(parts.query)).get('token') != TOKEN or parts.path not in FILES:
+                return self.send_body('text/plain', b'', 404)
+
+            return self.send_body('application/octet-stream', FILES[parts.path])
+
+        def send_html_backend(self, path):
+            base = f'http://{self.headers["Host"]}'
+
+            if self.path in HTML_PAGES:
+                body = HTML_PAGES[self.path].replace('{base}', base).encode()
+                return self.send_body('text/html', body)
+
+            if self.path == '/mod/resource/view.php?id=2':
+                return self.send_body('application/pdf', FILES[
+                    '/webservice/pluginfile.php/10/mod_resource/content/1/tema1.pdf'],
+                    headers={'Content-Disposition': 'inline; filename="tema1.pdf"'})
+
+            if '/webservice' + path in FILES:
+                return self.send_body('application/octet-stream', FILES['/webservice' + path])
+
+            return self.send_body('text/plain', b'', 404)
+
+        def log_message(self, *args):
+            pass
+
+    with http_server(Handler) as base:
+        yield base, requested
+
+
+@pytest.fixture
+def web_service(webservice_server):
+    base, requested = webservice_server
+    web_service = WebService(Downloader(), base)
+    web_service.login('user', 'pass')
+    web_service.downloader.web_service = web_service
+    requested.clear()
+    return web_service
+
+
+@pytest.fixture(autouse=True)
+def controller():
+    Alias.destroy()
+    yield
+    Alias.destroy()
+
+
+def test_flatten_params():
+    assert flatten_params({'courseid': 3}) == {'courseid': 3}
+    assert flatten_params({'courseids': [3, 4], 'options': [{'name': 'a', 'value': 1}]}) == {
+        'courseids[0]': 3, 'courseids[1]': 4, 'options[0][name]': 'a', 'options[0][value]': 1}
+
+
+class TestWebService:
+    def test_login(self, webservice_server):
+        base, requested = webservice_server
+        web_service = WebService(Downloader(), base)
+        web_service.login('user', 'pass')
+
+        assert web_service.token == TOKEN
+        assert web_service.userid == 42
+        assert requested == ['token', 'core_webservice_get_site_info']
+
+        with pytest.raises(WebServiceError, match='Invalid login'):
+            web_service.login('user', 'wrong')
+
+    def test_call_error(self, web_service):
+        with pytest.raises(WebServiceError, match='core_unknown: Can.t find data record'):
+            web_service.call('core_unknown')
+
+        web_service.token = 'expired'
+        with pytest.raises(WebServiceError, match='Invalid token'):
+            web_service.call('core_webservice_get_site_info')
+
+    def test_file_url(self, web_service):
+        assert web_service.file_url('http://localhost/a.pdf') == \
+            f'http://localhost/a.pdf?token={TOKEN}'
+        assert web_service.file_url('http://localhost/a.pdf?forcedownload=1') == \
+            f'http://localhost/a.pdf?forcedownload=1&token={TOKEN}'
+
+    def test_find_subjects(self, web_service):
+        subjects = web_service.find_subjects(Queue())
+
+        assert len(subjects) == 1
+        assert isinstance(subjects[0], WebServiceSubject)
+        assert subjects[0].name == 'Web service'
+        assert subjects[0].course_id == 3
+        assert subjects[0].url == web_service.base_url + '/course/view.php?id=3'
+
+
+def test_synchronize(web_service, webservice_server, crawl, caplog):
+    _, requested = webservice_server
+    caplog.set_level(logging.DEBUG)
+
+    def synchronize():
+        queue = Queue()
+        subject = WebServiceSubject('WEBSERVICE', web_service.base_url + '/course/view.php?id=3',
+                                    web_service.downloader, queue, 3)
+        queue.put(subject)
+        crawl(queue)
+
+        return subject
+
+    subject = synchronize()
+    folder = os.path.join(Options.ROOT_FOLDER, subject.folder)
+    forums = 'foros/Dudas' if Options.FORUMS_SUBFOLDERS else 'Dudas'
+    saved = {}
+
+    for dirpath, _, filenames in os.walk(folder):
+        for filename in filenames:
+            with open(os.path.join(dirpath, filename), 'rb') as file_handler:
+                path = os.path.relpath(os.path.join(dirpath, filename), folder)
+                saved[path.replace(os.sep, '/')] = file_handler.read()
+
+    assert saved == {'Tema_1.pdf': b'tema 1', 'Practicas/p1.txt': b'practica 1',
+                     'Practicas/p2.txt': b'practica 2', 'Entrega_1/enunciado.pdf': b'enunciado',
+                     'Entrega_1/memoria_1.pdf': b'memoria',
+                     'Entrega_1/memoria_2.pdf': b'memoria v2',
+                     f'{forums}/dudas.pdf': b'dudas'}
+
+    assert sorted(x for x in requested if not x.startswith('/')) == [
+        'core_course_get_contents', 'mod_assign_get_assignments',
+        'mod_assign_get_submission_status', 'mod_forum_get_discussion_posts',
+        'mod_forum_get_forum_discussions']
+    assert sorted(x for x in requested if x.startswith('/')) == sorted(FILES)
+
+    # The token is not saved nor logged.
+    assert TOKEN not in json.dumps(VALIDATORS.data)
+    assert TOKEN not in caplog.text
+
+    # The files in the disk are up to date, so they are not requested again.
+    requested.clear()
+    VISITED.clear()
+    PAGES.clear()
+    synchronize()
+
+    assert not [x for x in requested if x.startswith('/')]
+
+
+def test_html_backend_tree(web_service, webservice_server, crawl):
+    """The files saved by the html backend are found by the webservice backend."""
+    _, requested = webservice_server
+    base = web_service.base_url
+    d = web_service.downloader
+
+    def synchronize(subject):
+        subject.queue.put(subject)
+        crawl(subject.queue)
+
+    subject = Subject('HTML', base + '/course/view.php?id=3', d, Queue())
+    synchronize(subject)
+    folder = os.path.join(Options.ROOT_FOLDER, subject.folder)
+    saved = sorted(os.path.relpath(os.path.join(dirpath, filename), folder)
+                   for dirpath, _, filenames in os.walk(folder) for filename in filenames)
+    assert len(saved) == len(FILES)
+
+    VISITED.clear()
+    PAGES.clear()
+    requested.clear()
+    synchronize(WebServiceSubject('HTML', subject.url, d, Queue(), 3))
+
+    assert sorted(os.path.relpath(os.path.join(dirpath, filename), folder)
+                  for dirpath, _, filenames in os.walk(folder)
+                  for filename in filenames) == saved
+    assert not [x for x in requested if x.startswith('/')]
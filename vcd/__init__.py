@@ -3,19 +3,24 @@ import logging
 import os
 import time
 from logging.handlers import RotatingFileHandler
-from queue import Queue
 from threading import current_thread
 
-from bs4 import BeautifulSoup
-from colorama import init as init_colorama, Fore
+from colorama import init as init_colorama
 
-from ._requests import Downloader
-from ._threading import start_workers
-from .credentials import Credentials
+from ._requests import RETRY_BUDGET, Downloader
+from ._threading import AdaptiveController, Checkpointer, PriorityWorkQueue, \
+    ThroughputMonitor, Watchdog, WorkerPool, get_queued, shutdown, start_workers, wait_queue
+from .cancellation import CANCELLATION, CancelledError
+from .checkpoint import CHECKPOINT
+from .frontier import PAGES, VISITED
 from .options import Options
+from .parsers import make_strainer, parse_html
+from .session import SessionManager
 from .status_server import runserver
+from .stores import FORUM_MARKERS, VALIDATORS, WRAPPERS
 from .subject import Subject
 from .time_operations import seconds_to_str
+from .webservice import WebService
 
 
 if os.environ.get('TESTING') is None:
@@ -37,39 +42,35 @@ logging.getLogger('urllib3').setLevel(logging.ERROR)
 logger = logging.getLogger(__name__)
 
 
-# noinspection PyShadowingNames
-def find_subjects(downloader, queue, nthreads=20, no_killer=False):
-    """Starts finding subjects.
+def login(downloader):
+    """Logs in the virtual campus, reusing the saved session if it has not expired.
 
     Args:
         downloader (Downloader): custom session with retry control.
-        queue (Queue): queue to organize threads.
-        nthreads (int): number of threads to start.
-        no_killer (bool): desactivate Killer thread.
 
-    """
-    logger = logging.getLogger(__name__)
-    logger.debug('Finding subjects')
+    Returns:
+        requests.Response: response of the main page of the user.
 
-    threads = start_workers(queue, nthreads, no_killer=no_killer)
-    runserver(queue, threads)
+    """
 
-    user = Credentials.get()
+    return SessionManager(downloader).start()
 
-    downloader.post(
-        'https://campusvirtual.uva.es/login/index.php',
-        data={'anchor': '', 'username': user.username, 'password': user.password})
 
-    response = downloader.get('https://campusvirtual.uva.es/my/')
+def parse_subjects(response, downloader, queue):
+    """Finds the subjects in the main page of the user.
 
-    logger.debug('Returned primary response with code %d', response.status_code)
+    Args:
+        response (requests.Response): response of the main page of the user.
+        downloader (Downloader): downloader that the subjects will use.
+        queue (Queue): queue that the subjects will use.
 
-    logger.debug('Login correct: %s', 'Vista general de cursos' in response.text)
+    Returns:
+        list: subjects sorted by name.
 
-    if 'Vista general de cursos' not in response.text:
-        exit(Fore.RED + 'Login not correct' + Fore.RESET)
+    """
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+    logger = logging.getLogger(__name__)
+    soup = parse_html(response.content, parse_only=make_strainer('div', ['course_title']))
     search = soup.findAll('div', {'class': 'course_title'})
 
     logger.debug('Found %d potential subjects', len(search))
@@ -86,23 +87,180 @@ def find_subjects(downloader, queue, nthreads=20, no_killer=False):
         subjects.append(Subject(name, subject_url, downloader, queue))
 
     subjects.sort(key=lambda x: x.name)
+    return subjects
+
+
+# noinspection PyShadowingNames
+def find_subjects(downloader, queue, nthreads=20, no_killer=False, pending=None):
+    """Starts finding subjects.
+
+    Args:
+        downloader (Downloader): custom session with retry control.
+        queue (Queue): queue to organize threads.
+        nthreads (int): number of threads to start.
+        no_killer (bool): desactivate Killer thread.
+        pending (list): tasks of an interrupted execution. If set, they are put in the queue
+            instead of the subjects.
+
+    Returns:
+        tuple: subjects found (or tasks resumed) and threads started.
+
+    """
+    logger = logging.getLogger(__name__)
+    logger.debug('Finding subjects')
+
+    monitor = ThroughputMonitor() if Options.ADAPTIVE_WORKERS else None
+    threads = start_workers(queue, nthreads, no_killer=no_killer, monitor=monitor)
+    pool = WorkerPool(queue, threads, monitor)
+
+    if Options.ADAPTIVE_WORKERS:
+        controller = AdaptiveController(pool)
+        controller.start()
+        threads.append(controller)
+
+    watchdog = Watchdog(threads)
+    watchdog.start()
+    threads.append(watchdog)
+
+    if Options.CHECKPOINT_INTERVAL:
+        checkpointer = Checkpointer(queue)
+        checkpointer.start()
+        threads.append(checkpointer)
+
+    runserver(queue, threads, downloader, pool)
+
+    if Options.BACKEND == 'webservice':
+        subjects = WebService(downloader).start().find_subjects(queue)
+    else:
+        response = login(downloader)
+
+        if pending:
+            logger.info('Resuming %d pending tasks', len(pending))
+            subjects = pending
+        else:
+            subjects = parse_subjects(response, downloader, queue)
 
     for i, _ in enumerate(subjects):
         queue.put(subjects[i])
 
+    return subjects, threads
+
+
+def reset_synchronization():
+    """Forgets the urls visited and the retries used, so a new synchronization can start."""
+    VISITED.clear()
+    RETRY_BUDGET.reset(Options.RETRY_BUDGET)
+
+
+def synchronize_again(downloader, queue):
+    """Puts the subjects in the queue again, to look for changes since the last
+    synchronization. The session of the downloader is reused.
+
+    Args:
+        downloader (Downloader): downloader with an active session.
+        queue (Queue): queue of the workers.
+
+    Returns:
+        list: subjects found.
+
+    """
+
+    if downloader.web_service is not None:
+        subjects = downloader.web_service.find_subjects(queue)
+    else:
+        response = downloader.get(downloader.session_manager.main_url)
+        subjects = parse_subjects(response, downloader, queue)
+
+    for subject in subjects:
+        queue.put(subject)
+
     return subjects
 
 
-def start(root_folder=None, nthreads=None, timeout=None, no_killer=False):
+def keep_synchronizing(downloader, queue):
+    """Synchronizes again every `Options.WATCH_INTERVAL` seconds, until the execution is
+    cancelled. A synchronization that fails is logged and tried again in the next interval, so
+    an error does not stop the watch mode.
+
+    Args:
+        downloader (Downloader): downloader with an active session.
+        queue (Queue): queue of the workers.
+
+    Returns:
+        bool: False if the execution was cancelled while a synchronization was running.
+
+    Raises:
+        CancelledError: if the execution is cancelled while waiting for the next
+            synchronization.
+
+    """
+
+    logger = logging.getLogger(__name__)
+    finished = True
+
+    while finished:
+        CHECKPOINT.close()
+        VALIDATORS.save()
+        FORUM_MARKERS.save()
+        WRAPPERS.save()
+        logger.info('Synchronization finished, next one in %s',
+                    seconds_to_str(Options.WATCH_INTERVAL))
+        CANCELLATION.sleep(Options.WATCH_INTERVAL)
+
+        try:
+            reset_synchronization()
+            CHECKPOINT.open(downloader, queue)
+            synchronize_again(downloader, queue)
+        except CancelledError:
+            raise
+        except Exception as ex:
+            logger.exception('Synchronization failed, trying again in %s (%r)',
+                             seconds_to_str(Options.WATCH_INTERVAL), ex)
+
+        # The subjects queued before a failure are still processed.
+        finished = wait_queue(queue)
+
+    return finished
+
+
+def start(root_folder=None, nthreads=None, timeout=None, no_killer=False, engine='threads',
+          resume=False, watch=False, backend=None):
     """Starts the app.
 
     Args:
         root_folder (str): folder where files will be downloaded.
-        nthreads (int): number of threads to start.
+        nthreads (int): number of threads to start. With the asyncio engine, number of
+            concurrent tasks.
         timeout (int): number of seconds before discarting TCP connection.
         no_killer (bool): desactivate Killer thread.
+        engine (str): 'threads' to use worker threads, 'asyncio' to use the asyncio engine.
+        resume (bool): continue the interrupted execution from its checkpoint. Only supported
+            by the threads engine.
+        watch (bool): keep running, synchronizing again every `Options.WATCH_INTERVAL`
+            seconds with the same session and workers. Pages that did not change are not
+            parsed again. Only supported by the threads engine.
+        backend (str): 'html' to find the files parsing the pages of the virtual campus,
+            'webservice' to find them with its web services. Defaults to `Options.BACKEND`.
+            The webservice backend is only supported by the threads engine and can not resume
+            executions.
     """
 
+    if engine not in ('threads', 'asyncio'):
+        raise ValueError(f'Invalid engine: {engine!r}')
+
+    if backend:
+        Options.set_backend(backend)
+
+    if Options.BACKEND == 'webservice' and (engine != 'threads' or resume):
+        raise ValueError('The webservice backend is only supported by the threads engine and '
+                         'can not resume executions')
+
+    if resume and engine != 'threads':
+        raise ValueError(f'The {engine} engine can not resume executions')
+
+    if watch and engine != 'threads':
+        raise ValueError(f'The {engine} engine does not support the watch mode')
+
     init_colorama()
 
     if not nthreads:
@@ -117,16 +275,73 @@ def start(root_folder=None, nthreads=None, timeout=None, no_killer=False):
     initial_time = time.time()
     main_logger = logging.getLogger(__name__)
     main_logger.info('STARTING APP')
+    main_logger.debug('Loading validators, forum markers and wrappers')
+    VALIDATORS.load()
+    FORUM_MARKERS.load()
+    WRAPPERS.load()
     main_logger.debug('Starting downloader')
-    downloader = Downloader()
-    main_logger.debug('Starting queue')
-    queue = Queue()
-
-    main_logger.debug('Launching subjects finder')
-    find_subjects(downloader, queue, nthreads, no_killer)
-
-    main_logger.debug('Waiting for queue to empty')
-    queue.join()
+    downloader = Downloader(pool_size=nthreads, pool_block=Options.POOL_BLOCK)
+    CANCELLATION.reset()
+    reset_synchronization()
+    # The pages and their links are only reused by the next synchronizations.
+    PAGES.clear()
+    PAGES.enabled = watch
+    threads = []
+
+    if engine == 'asyncio':
+        # Imported here so aiohttp is only needed by the asyncio engine.
+        from ._asyncio import start_engine
+        main_logger.debug('Launching asyncio engine')
+        start_engine(downloader, nthreads)
+    else:
+        main_logger.debug('Starting queue')
+        queue = PriorityWorkQueue()
+
+        CANCELLATION.register(downloader.abort)
+        pending = CHECKPOINT.open(downloader, queue, resume)
+
+        # Pages and files completed before the interruption are not processed again.
+        for url in CHECKPOINT.completed:
+            VISITED.add(url)
+
+        try:
+            main_logger.debug('Launching subjects finder')
+            _, threads = find_subjects(downloader, queue, nthreads, no_killer, pending)
+
+            main_logger.debug('Waiting for queue to empty')
+            finished = wait_queue(queue)
+
+            if finished and watch:
+                finished = keep_synchronizing(downloader, queue)
+        except KeyboardInterrupt:
+            CANCELLATION.cancel('keyboard interrupt')
+            finished = False
+        except CancelledError:
+            # Cancelled while waiting for the next synchronization, nothing is pending.
+            finished = True
+
+        if finished:
+            CHECKPOINT.close()
+        else:
+            main_logger.info('Saving checkpoint and stopping workers')
+            CANCELLATION.cancel('execution interrupted')
+            CHECKPOINT.close(get_queued(queue))
+            shutdown(queue, threads)
+
+    main_logger.debug('Saving validators, forum markers and wrappers')
+    VALIDATORS.save()
+    FORUM_MARKERS.save()
+    WRAPPERS.save()
+
+    main_logger.info('Connection pool: %r', downloader.pool_stats)
+    main_logger.info('Request limiter: %r', downloader.limiter_stats)
+    main_logger.info('Bandwidth: %r', downloader.bandwidth)
+
+    for thread in threads:
+        if isinstance(thread, Watchdog):
+            main_logger.info('Watchdog: %r', thread.stats)
+            for task in thread.stats.abandoned:
+                main_logger.warning('Abandoned after exceeding its deadline: %r', task)
 
     final_time = time.time() - initial_time
     main_logger.info('VCD executed in %s', seconds_to_str(final_time))
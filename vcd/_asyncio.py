@@ -0,0 +1,441 @@
+"""Asyncio engine for the vcd, alternative to the multithreading workers.
+
+All the HTTP traffic goes through aiohttp, so hundreds of requests can be in flight without a
+thread per request. The responses are processed by the same methods used by the workers
+(`process_response`), so both engines build the same file tree and alias database.
+"""
+
+import asyncio
+import logging
+import time
+
+import aiohttp
+import requests
+from requests.structures import CaseInsensitiveDict
+from yarl import URL
+
+from . import login, parse_subjects
+from ._requests import BandwidthLimiter, DownloaderError, RequestLimiter, RetryPolicy
+from .cancellation import CANCELLATION
+from .frontier import VISITED
+from .links import BaseLink, PartFile, Resource
+from .options import Options
+from .subject import Subject
+from .time_operations import seconds_to_str
+
+
+class _AioBody:
+    """Raw body of a requests.Response built from an aiohttp response."""
+
+    def __init__(self, response):
+        self.response = response
+
+    def close(self):
+        self.response.release()
+
+
+class AsyncDownloader:
+    """Asynchronous downloader with the same retries control as vcd._requests.Downloader.
+
+    The responses are returned as `requests.Response` objects without body, so they can be
+    processed by the links. The body must be read with `read` or streamed from
+    `response.raw.response.content`.
+    """
+
+    def __init__(self, limit=100, retry_policy=None, cookies=None, limiter=None,
+                 session_manager=None, bandwidth=None):
+        """
+        Args:
+            limit (int): maximum number of simultaneous connections.
+            retry_policy (RetryPolicy): policy to retry failed requests.
+            cookies (requests.cookies.RequestsCookieJar): cookies of the session, used to
+                share the login with a synchronous Downloader.
+            limiter (RequestLimiter): limiter of the requests, can be shared with a
+                synchronous Downloader.
+            session_manager (vcd.session.SessionManager): if set, it is used to log in again
+                if the session expires. The cookies are copied from its downloader.
+            bandwidth (BandwidthLimiter): limiter of the bytes read, can be shared with a
+                synchronous Downloader.
+        """
+
+        self.logger = logging.getLogger(__name__)
+        self.limit = limit
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.limiter = limiter or RequestLimiter()
+        self.bandwidth = bandwidth or BandwidthLimiter()
+        self.session_manager = session_manager
+        self.cookies = cookies
+        self.session: aiohttp.ClientSession = None
+
+    async def start(self):
+        """Creates the aiohttp session. Must be called inside the event loop."""
+        connector = aiohttp.TCPConnector(limit=self.limit)
+        timeout = aiohttp.ClientTimeout(sock_connect=Options.TIMEOUT, sock_read=Options.TIMEOUT)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        self.update_cookies(self.cookies or [])
+
+    def update_cookies(self, cookies):
+        """Copies the cookies of a synchronous session to the aiohttp session."""
+        for cookie in cookies:
+            domain = cookie.domain.lstrip('.')
+            self.session.cookie_jar.update_cookies(
+                {cookie.name: cookie.value}, URL(f'https://{domain}/') if domain else URL())
+
+    async def close(self):
+        await self.session.close()
+
+    @staticmethod
+    def to_response(aio_response):
+        """Builds a requests.Response without body from an aiohttp response."""
+        response = requests.Response()
+        response.status_code = aio_response.status
+        response.reason = aio_response.reason
+        response.url = str(aio_response.url)
+        response.headers = CaseInsensitiveDict(aio_response.headers)
+        response.raw = _AioBody(aio_response)
+        return response
+
+    @staticmethod
+    async def read(response):
+        """Reads the body of a response returned by the downloader."""
+        response._content = await response.raw.response.read()
+        response._content_consumed = True
+        response.raw.close()
+        return response
+
+    async def request(self, method, url, validator=None, headers=None):
+        """Makes a request, retrying it if there is a connection error or a timeout.
+
+        Args:
+            method (str): HTTP method.
+            url (str): url to request.
+            validator (vcd.stores.Validator): if set, the request will be conditional.
+            headers (dict): extra headers.
+
+        Returns:
+            requests.Response: the response, without body.
+
+        Raises:
+            DownloaderError: if all the retries failed.
+
+        """
+
+        self.logger.debug('%s %r', method, url)
+        policy = self.retry_policy
+        headers = dict(headers or {})
+        attempts = 0
+        status_retries = 0
+
+        if validator is not None:
+            headers.update(validator.to_headers())
+
+        while attempts < policy.retries:
+            attempts += 1
+
+            try:
+                async with self.limiter.async_limit(url):
+                    aio_response = await self.session.request(method, url, headers=headers)
+            except aiohttp.ClientConnectionError:
+                self.logger.warning('Connection error in %s, retries=%s', method,
+                                    policy.retries - attempts)
+            except asyncio.TimeoutError:
+                self.logger.warning('Timeout error in %s, retries=%s', method,
+                                    policy.retries - attempts)
+            else:
+                response = self.to_response(aio_response)
+
+                if not policy.is_retryable(response) or status_retries >= policy.status_retries:
+                    return response
+
+                status_retries += 1
+                attempts -= 1
+                backoff = policy.get_response_backoff(response, status_retries)
+
+                if backoff is None or not policy.budget.consume():
+                    self.logger.warning('Not retrying %s %r [%d]', method, url,
+                                        response.status_code)
+                    return response
+
+                self.logger.warning('Received status code %d in %s, retrying in %.2f s',
+                                    response.status_code, method, backoff)
+                response.close()
+                await asyncio.sleep(backoff)
+                continue
+
+            if attempts >= policy.retries:
+                break
+
+            if not policy.budget.consume():
+                self.logger.critical('Retry budget exhausted (%r)', policy.budget)
+                break
+
+            await asyncio.sleep(policy.get_backoff(attempts))
+
+        self.logger.critical('Download error in %s %r', method, url)
+        raise DownloaderError('max retries failed.')
+
+    async def session_request(self, method, url, validator=None, headers=None):
+        """Makes a request. If the session expired, logs in again and repeats it."""
+        started = time.monotonic()
+        response = await self.request(method, url, validator=validator, headers=headers)
+
+        if self.session_manager is not None and self.session_manager.is_expired(url, response):
+            response.close()
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.session_manager.relogin, started)
+            self.update_cookies(self.session_manager.downloader.cookies)
+            response = await self.request(method, url, validator=validator, headers=headers)
+
+        return response
+
+    async def get(self, url, validator=None, headers=None):
+        return await self.session_request('GET', url, validator=validator, headers=headers)
+
+    async def head(self, url, validator=None, headers=None):
+        return await self.session_request('HEAD', url, validator=validator, headers=headers)
+
+
+class AsyncWorkQueue:
+    """Queue used by the links to send new tasks to the engine.
+
+    `put` is synchronous, because links are processed inside the event loop.
+    """
+
+    def __init__(self):
+        self._queue = asyncio.Queue()
+
+    def put(self, item):
+        self._queue.put_nowait(item)
+
+    async def get(self):
+        return await self._queue.get()
+
+    def task_done(self):
+        self._queue.task_done()
+
+    async def join(self):
+        await self._queue.join()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+class AsyncEngine:
+    """Processes subjects and links with a fixed number of concurrent tasks."""
+
+    def __init__(self, downloader: AsyncDownloader, queue: AsyncWorkQueue, ntasks=50):
+        self.logger = logging.getLogger(__name__)
+        self.downloader = downloader
+        self.queue = queue
+        self.ntasks = ntasks
+
+    async def run(self):
+        """Processes the queue until it is empty."""
+        tasks = [asyncio.create_task(self.worker(f'A-{i + 1:03d}')) for i in range(self.ntasks)]
+
+        await self.queue.join()
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def worker(self, name):
+        while True:
+            anything = await self.queue.get()
+
+            try:
+                if isinstance(anything, BaseLink) and not VISITED.add(anything.url):
+                    self.logger.debug('[%s] Link already processed, skipping: %s', name,
+                                      anything.url)
+                elif isinstance(anything, BaseLink):
+                    self.logger.debug('[%s] Found Link %r, processing', name, anything.name)
+                    await self.process_link(anything)
+                elif isinstance(anything, Subject):
+                    self.logger.debug('[%s] Found Subject %r, processing', name, anything.name)
+                    await self.process_subject(anything)
+            except DownloaderError as ex:
+                self.logger.exception('DownloaderError in %r (%r)', anything, ex)
+            except Exception as ex:
+                self.logger.exception('Error processing %r (%r)', anything, ex)
+            finally:
+                self.queue.task_done()
+
+    async def process_subject(self, subject: Subject):
+        self.logger.debug('Finding links of %s', subject.name)
+        subject.response = await self.downloader.read(await self.downloader.get(subject.url))
+        subject.process_request_bs4()
+        subject.process_response()
+
+    async def probe(self, resource: Resource):
+        """Asynchronous version of `Resource.probe`."""
+        resource.response = await self.downloader.head(resource.url,
+                                                       validator=resource.validator)
+
+        if resource.response.status_code in (405, 501):
+            resource.close_connection()
+            resource.response = await self.downloader.get(
+                resource.url, headers={'Range': 'bytes=0-0'}, validator=resource.validator)
+
+        resource.close_connection()
+        return resource.check_probe()
+
+    async def process_link(self, link: BaseLink):
+        link.deferred_save = True
+
+        if isinstance(link, Resource) and link.resolve_cached_wrapper():
+            return
+
+        if link.skip_request():
+            return
+
+        link.prepare_request()
+
+        if isinstance(link, Resource) and Options.PROBE and not await self.probe(link):
+            return
+
+        link.response = await self.downloader.get(link.request_url, validator=link.validator,
+                                                  headers=link.resume_headers)
+
+        if link.resume_rejected():
+            link.response = await self.downloader.get(link.request_url)
+
+        link.check_response()
+
+        if isinstance(link, Resource) and not link.claim_final_url():
+            return
+
+        if link.body_required():
+            await self.downloader.read(link.response)
+
+        link.process_response()
+
+        if not link.pending_save:
+            link.close_connection()
+            return
+
+        link.pending_save = False
+
+        try:
+            part_path, length = await self.stream_to_partfile(link)
+        except PermissionError:
+            link.log_permission_error()
+            return
+
+        link.finish_save(part_path, length)
+
+    async def stream_to_partfile(self, link: BaseLink):
+        """Asynchronous version of `BaseLink.stream_to_partfile`."""
+        part = PartFile(link.filepath)
+        offset = 0
+
+        if link.resume_headers is not None:
+            offset = link.check_range_response(part, part.get_size())
+
+            if offset is None:
+                link.close_connection()
+                link.response = await self.downloader.get(link.request_url)
+                offset = 0
+
+        elif link.can_split():
+            try:
+                return await self.stream_segments(link, part)
+            except (DownloaderError, OSError) as ex:
+                link.logger.warning('Segmented download of %r failed (%r), downloading it '
+                                    'in one request', link.filepath, ex)
+                link.response = await self.downloader.get(link.request_url)
+
+        try:
+            part.open(link.url, link.response, offset)
+            async for chunk in link.response.raw.response.content.iter_chunked(
+                    Options.CHUNK_SIZE):
+                CANCELLATION.check()
+                await self.downloader.bandwidth.async_consume(len(chunk))
+                part.write(chunk)
+        except BaseException:
+            part.abort()
+            raise
+        finally:
+            link.close_connection()
+
+        part.finish()
+        link.content_hash = part.hexdigest()
+        return part.path, part.length
+
+    async def stream_segments(self, link: BaseLink, part: PartFile):
+        """Asynchronous version of `BaseLink.stream_segments`."""
+        length = link.get_header_length()
+        if_range = link.get_if_range()
+
+        link.close_connection()
+        part.allocate(length)
+
+        try:
+            await asyncio.gather(*[self.download_segment(link, part, start, end, if_range)
+                                   for start, end in part.split(length, Options.SEGMENTS)])
+        except BaseException:
+            part.abort()
+            raise
+
+        part.hash_content()
+        part.finish()
+        link.content_hash = part.hexdigest()
+        return part.path, part.length
+
+    async def download_segment(self, link, part, start, end, if_range):
+        """Asynchronous version of `BaseLink.download_segment`."""
+        response = await self.downloader.get(link.request_url,
+                                             headers={'Range': f'bytes={start}-{end}',
+                                                      'If-Range': if_range})
+
+        try:
+            if not part.is_range_response(response, start):
+                raise DownloaderError(f'invalid response for segment {start}-{end} '
+                                      f'[{response.status_code}]')
+
+            with part.open_segment(start) as file_handler:
+                async for chunk in response.raw.response.content.iter_chunked(
+                        Options.CHUNK_SIZE):
+                    CANCELLATION.check()
+                    await self.downloader.bandwidth.async_consume(len(chunk))
+                    file_handler.write(chunk)
+
+                if file_handler.tell() != end + 1:
+                    raise DownloaderError(f'incomplete segment {start}-{end}')
+        finally:
+            response.close()
+
+
+async def _run(response, downloader, ntasks):
+    downloader = AsyncDownloader(limit=ntasks, cookies=downloader.cookies,
+                                 limiter=downloader.limiter, bandwidth=downloader.bandwidth,
+                                 session_manager=downloader.session_manager)
+    await downloader.start()
+
+    try:
+        queue = AsyncWorkQueue()
+
+        for subject in parse_subjects(response, downloader, queue):
+            queue.put(subject)
+
+        await AsyncEngine(downloader, queue, ntasks).run()
+    finally:
+        await downloader.close()
+
+
+def start_engine(downloader, ntasks=50):
+    """Logs in with the synchronous downloader and downloads everything with the asyncio engine.
+
+    Args:
+        downloader (vcd._requests.Downloader): downloader used to log in.
+        ntasks (int): number of concurrent tasks.
+
+    """
+
+    logger = logging.getLogger(__name__)
+    initial_time = time.time()
+
+    response = login(downloader)
+    asyncio.run(_run(response, downloader, ntasks))
+
+    logger.info('Asyncio engine finished in %s', seconds_to_str(time.time() - initial_time))
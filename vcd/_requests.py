@@ -2,9 +2,26 @@
 
 """Custom downloader with retries control."""
 
+import asyncio
 import logging
+import random
+import socket
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from threading import BoundedSemaphore, Lock, get_ident
+from urllib.parse import urlsplit
+from weakref import WeakSet
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool, PoolManager
+from urllib3.util.connection import is_connection_dropped
+
+from .cancellation import CANCELLATION
+from .frontier import strip_token
+from .options import Options
 
 HEADERS = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) AppleWebKit/537.36 '
                          '(KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'}
@@ -14,48 +31,720 @@ class DownloaderError(Exception):
     """Error while downloading."""
 
 
+class RetryBudget:
+    """Number of retries allowed in the whole process, shared by all the downloaders."""
+
+    def __init__(self, total=None):
+        """
+        Args:
+            total (int): number of retries allowed. If it is None, retries are unlimited.
+        """
+        self.lock = Lock()
+        self.total = total
+        self.used = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(total={self.total}, used={self.used})'
+
+    def reset(self, total=None):
+        """Sets a new total and forgets the retries used."""
+        with self.lock:
+            self.total = total
+            self.used = 0
+
+    def consume(self):
+        """Takes one retry from the budget.
+
+        Returns:
+            bool: True if the retry is allowed, False if the budget is exhausted.
+
+        """
+        with self.lock:
+            if self.total is not None and self.used >= self.total:
+                return False
+
+            self.used += 1
+            return True
+
+
+RETRY_BUDGET = RetryBudget(Options.RETRY_BUDGET)
+
+
+class RetryPolicy:
+    """Controls when and how much to wait before retrying a request."""
+    STATUS_FORCELIST = (408, 429, 500, 502, 503, 504)
+
+    def __init__(self, retries=10, status_retries=3, backoff_factor=None, backoff_max=None,
+                 jitter=True, status_forcelist=STATUS_FORCELIST, budget=RETRY_BUDGET):
+        """
+        Args:
+            retries (int): number of attempts of each request before giving up because of
+                connection errors or timeouts.
+            status_retries (int): number of times a request is repeated if the server answers
+                with a status code in status_forcelist.
+            backoff_factor (float): seconds to wait before the first retry. The wait is doubled
+                on each retry. Defaults to `Options.BACKOFF_FACTOR`.
+            backoff_max (float): maximum number of seconds to wait before a retry. If the
+                server asks (Retry-After) for a longer wait, the request is not retried.
+                Defaults to `Options.BACKOFF_MAX`.
+            jitter (bool): if True, the wait is a random number between 0 and the backoff, to
+                avoid all the threads retrying at the same time.
+            status_forcelist (tuple): status codes that must be retried.
+            budget (RetryBudget): budget of retries shared with other policies.
+        """
+
+        self.retries = retries
+        self.status_retries = status_retries
+        self.backoff_factor = backoff_factor if backoff_factor is not None \
+            else Options.BACKOFF_FACTOR
+        self.backoff_max = backoff_max if backoff_max is not None else Options.BACKOFF_MAX
+        self.jitter = jitter
+        self.status_forcelist = status_forcelist
+        self.budget = budget
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(retries={self.retries}, ' \
+            f'status_retries={self.status_retries}, backoff_factor={self.backoff_factor}, ' \
+            f'backoff_max={self.backoff_max})'
+
+    @staticmethod
+    def parse_retry_after(value):
+        """Parses the value of a Retry-After header.
+
+        Args:
+            value (str): seconds or HTTP date.
+
+        Returns:
+            float: number of seconds to wait, or None if the value is not valid.
+
+        """
+
+        if not value:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+
+        return max(0.0, date.timestamp() - time.time())
+
+    def get_backoff(self, retry_number):
+        """Returns the number of seconds to wait before a retry.
+
+        Args:
+            retry_number (int): number of the retry, starting at 1.
+
+        Returns:
+            float: seconds to wait.
+
+        """
+
+        backoff = min(self.backoff_max, self.backoff_factor * 2 ** (retry_number - 1))
+
+        if self.jitter:
+            return random.uniform(0, backoff)
+        return backoff
+
+    def is_retryable(self, response):
+        """Checks if a response must be retried because of its status code."""
+        return response.status_code in self.status_forcelist
+
+    def get_response_backoff(self, response, retry_number):
+        """Returns the number of seconds to wait before retrying a response, honoring the
+        Retry-After header.
+
+        Returns:
+            float: seconds to wait, or None if the request should not be retried because the
+                server asked for a wait longer than `backoff_max`.
+
+        """
+
+        retry_after = self.parse_retry_after(response.headers.get('Retry-After'))
+
+        if retry_after is None:
+            return self.get_backoff(retry_number)
+
+        if retry_after > self.backoff_max:
+            return None
+
+        return retry_after
+
+
+class TokenBucket:
+    """Thread-safe token bucket that allows `rate` requests per second on average, with bursts
+    of up to `capacity` requests."""
+
+    def __init__(self, rate, capacity=1):
+        """
+        Args:
+            rate (float): tokens added to the bucket per second.
+            capacity (int): maximum number of tokens in the bucket.
+        """
+
+        self.lock = Lock()
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(rate={self.rate}, capacity={self.capacity})'
+
+    def reserve(self, tokens=1):
+        """Takes tokens from the bucket. If the bucket is empty the tokens are borrowed from
+        the future, so the callers are served in order.
+
+        Args:
+            tokens (float): number of tokens to take.
+
+        Returns:
+            float: seconds the caller must wait before using the tokens.
+
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class LimiterStats:
+    """Thread-safe statistics of the time requests spend waiting in a RequestLimiter."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.requests = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(requests={self.requests}, waits={self.waits}, ' \
+            f'wait_time={self.wait_time:.2f}, max_wait={self.max_wait:.2f})'
+
+    def add(self, seconds):
+        """Records the wait of a request."""
+        with self.lock:
+            self.requests += 1
+            if seconds > 0.001:
+                self.waits += 1
+                self.wait_time += seconds
+                self.max_wait = max(self.max_wait, seconds)
+
+    def to_json(self):
+        """Returns the statistics json serialized."""
+        with self.lock:
+            return {'requests': self.requests, 'waits': self.waits,
+                    'wait_time': self.wait_time, 'max_wait': self.max_wait}
+
+
+class RequestLimiter:
+    """Limits the number of requests in flight per host and the number of requests per
+    second. A request is in flight until its headers are received."""
+
+    def __init__(self, max_per_host=None, rate=None, burst=None):
+        """
+        Args:
+            max_per_host (int): maximum number of requests in flight per host. If it is 0 there
+                is no limit. Defaults to `Options.MAX_PER_HOST`.
+            rate (float): maximum number of requests per second. If it is 0 there is no
+                limit. Defaults to `Options.RATE_LIMIT`.
+            burst (int): number of requests that can be made at once before the rate limit is
+                applied. Defaults to `Options.RATE_BURST`.
+        """
+
+        self.max_per_host = max_per_host if max_per_host is not None else Options.MAX_PER_HOST
+        rate = rate if rate is not None else Options.RATE_LIMIT
+        burst = burst if burst is not None else Options.RATE_BURST
+
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.stats = LimiterStats()
+        self.lock = Lock()
+        self.semaphores = {}
+        self.async_semaphores = {}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(max_per_host={self.max_per_host}, ' \
+            f'bucket={self.bucket!r})'
+
+    def _get_semaphore(self, semaphores, url, factory):
+        host = urlsplit(url).netloc
+
+        with self.lock:
+            if host not in semaphores:
+                semaphores[host] = factory(self.max_per_host)
+            return semaphores[host]
+
+    @contextmanager
+    def limit(self, url):
+        """Waits until a request to the url is allowed, and holds its slot inside the
+        context."""
+        start = time.monotonic()
+
+        if self.bucket is not None:
+            delay = self.bucket.reserve()
+            if delay:
+                CANCELLATION.sleep(delay)
+
+        if not self.max_per_host:
+            self.stats.add(time.monotonic() - start)
+            yield
+            return
+
+        semaphore = self._get_semaphore(self.semaphores, url, BoundedSemaphore)
+
+        with semaphore:
+            self.stats.add(time.monotonic() - start)
+            yield
+
+    @asynccontextmanager
+    async def async_limit(self, url):
+        """Asynchronous version of `limit`."""
+        start = time.monotonic()
+
+        if self.bucket is not None:
+            delay = self.bucket.reserve()
+            if delay:
+                await asyncio.sleep(delay)
+
+        if not self.max_per_host:
+            self.stats.add(time.monotonic() - start)
+            yield
+            return
+
+        semaphore = self._get_semaphore(self.async_semaphores, url, asyncio.Semaphore)
+
+        async with semaphore:
+            self.stats.add(time.monotonic() - start)
+            yield
+
+
+class BandwidthLimiter:
+    """Limits the bytes per second of the bodies read, in the whole process and per worker.
+
+    Readers reserve each chunk from a token bucket before reading the next one, so the bandwidth
+    is shared between the workers in the order they ask for it. The limits can be changed while
+    the downloads are running.
+    """
+
+    WINDOW = 5
+
+    def __init__(self, rate=None, worker_rate=None):
+        """
+        Args:
+            rate (int): maximum number of bytes per second of the process. If it is 0 there is
+                no limit. Defaults to `Options.BANDWIDTH_LIMIT`.
+            worker_rate (int): maximum number of bytes per second of each worker. If it is 0
+                there is no limit. Defaults to `Options.WORKER_BANDWIDTH_LIMIT`.
+        """
+
+        self.lock = Lock()
+        self.transferred = 0
+        self.samples = deque()
+        self.set_limits(rate if rate is not None else Options.BANDWIDTH_LIMIT,
+                        worker_rate if worker_rate is not None else Options.WORKER_BANDWIDTH_LIMIT)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(rate={self.rate}, worker_rate={self.worker_rate}, ' \
+            f'transferred={self.transferred})'
+
+    def set_limits(self, rate, worker_rate):
+        """Changes the limits. The buckets start full, so the new limits apply at once.
+
+        Args:
+            rate (int): maximum number of bytes per second of the process, 0 for no limit.
+            worker_rate (int): maximum number of bytes per second of each worker, 0 for no
+                limit.
+
+        """
+
+        with self.lock:
+            self.rate = rate
+            self.worker_rate = worker_rate
+            # Bursts of up to one second of transfer.
+            self.bucket = TokenBucket(rate, rate) if rate else None
+            self.worker_buckets = {}
+
+    def _reserve(self, nbytes, key):
+        with self.lock:
+            now = time.monotonic()
+            self.transferred += nbytes
+            self.samples.append((now, nbytes))
+            self._prune(now)
+
+            buckets = [self.bucket]
+            if self.worker_rate:
+                if key not in self.worker_buckets:
+                    self.worker_buckets[key] = TokenBucket(self.worker_rate, self.worker_rate)
+                buckets.append(self.worker_buckets[key])
+
+        return max([bucket.reserve(nbytes) for bucket in buckets if bucket is not None],
+                   default=0.0)
+
+    def _prune(self, now):
+        while self.samples and self.samples[0][0] < now - self.WINDOW:
+            self.samples.popleft()
+
+    def consume(self, nbytes, key=None):
+        """Waits until `nbytes` bytes can be read.
+
+        Args:
+            nbytes (int): number of bytes read.
+            key (int): worker reading the bytes. Defaults to the current thread.
+
+        """
+
+        delay = self._reserve(nbytes, get_ident() if key is None else key)
+        if delay:
+            CANCELLATION.sleep(delay)
+
+    async def async_consume(self, nbytes, key=None):
+        """Asynchronous version of `consume`. The worker defaults to the current task."""
+        delay = self._reserve(nbytes, id(asyncio.current_task()) if key is None else key)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def get_rate(self):
+        """Returns the bytes per second read in the last seconds."""
+        with self.lock:
+            self._prune(time.monotonic())
+            return sum(nbytes for _, nbytes in self.samples) / self.WINDOW
+
+    def to_json(self):
+        """Returns the limits and the bandwidth used json serialized."""
+        actual = self.get_rate()
+        with self.lock:
+            return {'rate': self.rate, 'worker_rate': self.worker_rate, 'actual': actual,
+                    'transferred': self.transferred}
+
+
+class PoolStats:
+    """Thread-safe counters of the connections of a connection pool."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.active = WeakSet()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(created={self.created}, reused={self.reused}, ' \
+            f'discarded={self.discarded})'
+
+    def increment(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def to_json(self):
+        """Returns the counters json serialized."""
+        with self.lock:
+            return {'created': self.created, 'reused': self.reused,
+                    'discarded': self.discarded}
+
+
+class _CountingPoolMixin:
+    """Connection pool that records its activity in a PoolStats."""
+    stats: PoolStats = None
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout=timeout)
+
+        # is_connection_dropped works with urllib3 1.x and 2.x (conn.is_connected is 2.x only).
+        if getattr(conn, '_vcd_used', False) and not is_connection_dropped(conn):
+            self.stats.increment('reused')
+        else:
+            if getattr(conn, '_vcd_used', False):
+                # Dropped by the server, it will be opened again.
+                self.stats.increment('discarded')
+            self.stats.increment('created')
+            conn._vcd_used = True
+
+        # Thread using the connection, so the watchdog can abort the connections of a task.
+        conn._vcd_owner = get_ident()
+        self.stats.active.add(conn)
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            self.stats.active.discard(conn)
+
+        if conn is not None and self.pool is not None and self.pool.full():
+            self.stats.increment('discarded')
+
+        return super()._put_conn(conn)
+
+
+class _CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _CountingPoolManager(PoolManager):
+    """Pool manager whose pools share a PoolStats."""
+
+    def __init__(self, *args, stats=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats
+        self.pool_classes_by_scheme = {'http': _CountingHTTPConnectionPool,
+                                       'https': _CountingHTTPSConnectionPool}
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context=request_context)
+        pool.stats = self.stats
+        return pool
+
+
+class PoolAdapter(HTTPAdapter):
+    """HTTP adapter with configurable pool size that keeps statistics of its connections."""
+
+    def __init__(self, pool_maxsize=requests.adapters.DEFAULT_POOLSIZE, pool_block=False):
+        self.stats = PoolStats()
+        super().__init__(pool_maxsize=pool_maxsize, pool_block=pool_block)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+
+        self.poolmanager = _CountingPoolManager(num_pools=connections, maxsize=maxsize,
+                                                block=block, stats=self.stats, **pool_kwargs)
+
+    def abort(self, ident=None):
+        """Shuts down the sockets of the connections in use, so the threads waiting for data
+        are interrupted.
+
+        Args:
+            ident (int): if set, only the connections used by this thread are aborted.
+
+        """
+
+        for conn in list(self.stats.active):
+            if ident is not None and getattr(conn, '_vcd_owner', None) != ident:
+                continue
+
+            sock = getattr(conn, 'sock', None)
+
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
 class Downloader(requests.Session):
     """Downloader with retries control."""
 
-    def __init__(self, retries=10, silenced=False):
+    def __init__(self, retries=10, silenced=False, pool_size=None, pool_block=False,
+                 retry_policy=None, limiter=None, bandwidth=None):
+        """
+        Args:
+            retries (int): number of attempts of each request. Ignored if retry_policy is set.
+            silenced (bool): if True, only critical messages will be logged.
+            pool_size (int): maximum number of connections kept alive per host. It should be
+                at least the number of threads using the downloader. If it is not set, the
+                default of requests (10) is used.
+            pool_block (bool): if True, requests will wait for a free connection when the pool
+                is exhausted instead of opening a connection that will be discarded.
+            retry_policy (RetryPolicy): policy to retry failed requests.
+            limiter (RequestLimiter): limiter of the requests. Defaults to the limits set in
+                the options.
+            bandwidth (BandwidthLimiter): limiter of the bytes read. Defaults to the limits set
+                in the options.
+        """
+
         self.logger = logging.getLogger(__name__)
 
         if silenced is True:
             self.logger.setLevel(logging.CRITICAL)
 
-        self._retries = retries
+        self.retry_policy = retry_policy or RetryPolicy(retries=retries)
+        self.limiter = limiter or RequestLimiter()
+        self.bandwidth = bandwidth or BandwidthLimiter()
+
+        # Set by vcd.session.SessionManager once logged in.
+        self.session_manager = None
+        # Set by vcd.webservice.WebService once it has a token.
+        self.web_service = None
         super().__init__()
 
-    def get(self, url, **kwargs):
-        self.logger.debug('GET %r', url)
-        retries = self._retries
+        self.adapter = PoolAdapter(pool_maxsize=pool_size or requests.adapters.DEFAULT_POOLSIZE,
+                                   pool_block=pool_block)
+        self.mount('http://', self.adapter)
+        self.mount('https://', self.adapter)
 
-        while retries > 0:
-            try:
-                return super().get(url, **kwargs)
-            except requests.exceptions.ConnectionError:
-                retries -= 1
-                self.logger.warning('Connection error in GET, retries=%s', retries)
-            except requests.exceptions.ReadTimeout:
-                retries -= 1
-                self.logger.warning('Timeout error in GET, retries=%s', retries)
+    @property
+    def pool_stats(self):
+        """PoolStats: statistics of the connections of the downloader."""
+        return self.adapter.stats
 
-        self.logger.critical('Download error in GET %r', url)
-        raise DownloaderError('max retries failed.')
+    @property
+    def limiter_stats(self):
+        """LimiterStats: statistics of the time spent waiting for the limiter."""
+        return self.limiter.stats
 
-    def post(self, url, data=None, json=None, **kwargs):
-        self.logger.debug('POST %r', url)
-        retries = self._retries
+    def _retry_request(self, method, url, **kwargs):
+        """Makes a request, retrying it if there is a connection error or a timeout.
+
+        Args:
+            method (str): HTTP method.
+            url (str): url to request.
+            **kwargs: keyword arguments passed to `requests.Session.request`.
+
+        Returns:
+            requests.Response: the response.
+
+        Raises:
+            DownloaderError: if all the retries failed.
+
+        """
+
+        self.logger.debug('%s %r', method, strip_token(url))
+        policy = self.retry_policy
+        attempts = 0
+        status_retries = 0
+
+        while attempts < policy.retries:
+            attempts += 1
+            CANCELLATION.check()
 
-        while retries > 0:
             try:
-                return super().post(url=url, data=data, json=json, **kwargs)
+                with self.limiter.limit(url):
+                    response = super().request(method, url, **kwargs)
             except requests.exceptions.ConnectionError:
-                retries -= 1
-                self.logger.warning('Connection error in POST, retries=%s', retries)
+                CANCELLATION.check()
+                self.logger.warning('Connection error in %s, retries=%s', method,
+                                    policy.retries - attempts)
             except requests.exceptions.ReadTimeout:
-                retries -= 1
-                self.logger.warning('Timeout error in POST, retries=%s', retries)
+                self.logger.warning('Timeout error in %s, retries=%s', method,
+                                    policy.retries - attempts)
+            else:
+                if not policy.is_retryable(response) or status_retries >= policy.status_retries:
+                    return response
+
+                status_retries += 1
+                attempts -= 1
+                backoff = policy.get_response_backoff(response, status_retries)
+
+                if backoff is None or not policy.budget.consume():
+                    self.logger.warning('Not retrying %s %r [%d]', method, strip_token(url),
+                                        response.status_code)
+                    return response
+
+                self.logger.warning('Received status code %d in %s, retrying in %.2f s',
+                                    response.status_code, method, backoff)
+                response.close()
+                self._sleep(backoff)
+                continue
+
+            if attempts >= policy.retries:
+                break
 
-        self.logger.critical('Download error in POST %r', url)
+            if not policy.budget.consume():
+                self.logger.critical('Retry budget exhausted (%r)', policy.budget)
+                break
+
+            self._sleep(policy.get_backoff(attempts))
+
+        self.logger.critical('Download error in %s %r', method, strip_token(url))
         raise DownloaderError('max retries failed.')
+
+    @staticmethod
+    def _sleep(seconds):
+        """Waits before a retry.
+
+        Raises:
+            CancelledError: if the execution is cancelled while waiting.
+
+        """
+        CANCELLATION.sleep(seconds)
+
+    def abort(self, ident=None):
+        """Interrupts the requests in progress. Registered as a cancellation callback.
+
+        Args:
+            ident (int): if set, only the requests of this thread are interrupted.
+
+        """
+
+        self.adapter.abort(ident)
+
+    def _add_validator_headers(self, kwargs, validator):
+        """Adds the conditional headers of the validator to the request keyword arguments."""
+        if validator is None:
+            return
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        headers.update(validator.to_headers())
+        kwargs['headers'] = headers
+        self.logger.debug('Conditional request (%r)', headers)
+
+    def _session_request(self, method, url, check_session=True, **kwargs):
+        """Makes a request. If the session expired, logs in again and repeats it."""
+        started = time.monotonic()
+        response = self._retry_request(method, url, **kwargs)
+
+        if check_session and self.session_manager is not None \
+                and self.session_manager.is_expired(url, response):
+            response.close()
+            self.session_manager.relogin(started)
+            response = self._retry_request(method, url, **kwargs)
+
+        return response
+
+    def get(self, url, validator=None, check_session=True, **kwargs):
+        """Makes a GET request.
+
+        Args:
+            url (str): url to request.
+            validator (vcd.stores.Validator): if set, the request will be conditional, so the
+                server will answer with a 304 if the content has not been modified.
+            check_session (bool): if True and the server redirects to the login page, the
+                session is renewed and the request is repeated.
+            **kwargs: keyword arguments passed to `requests.Session.request`.
+
+        Returns:
+            requests.Response: the response.
+
+        """
+
+        self._add_validator_headers(kwargs, validator)
+        kwargs.setdefault('allow_redirects', True)
+        return self._session_request('GET', url, check_session, **kwargs)
+
+    def head(self, url, validator=None, check_session=True, **kwargs):
+        """Makes a HEAD request. Unlike `requests.Session.head`, redirects are followed by
+        default.
+
+        Args:
+            url (str): url to request.
+            validator (vcd.stores.Validator): if set, the request will be conditional.
+            check_session (bool): if True and the server redirects to the login page, the
+                session is renewed and the request is repeated.
+            **kwargs: keyword arguments passed to `requests.Session.request`.
+
+        Returns:
+            requests.Response: the response.
+
+        """
+
+        self._add_validator_headers(kwargs, validator)
+        kwargs.setdefault('allow_redirects', True)
+        return self._session_request('HEAD', url, check_session, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self._retry_request('POST', url, data=data, json=json, **kwargs)
@@ -5,27 +5,139 @@ import threading
 import time
 import webbrowser
 
-from queue import Queue
+from collections import OrderedDict, deque
+from queue import Empty, Queue
+from threading import Lock
+from weakref import WeakKeyDictionary
 
 from ._requests import DownloaderError
-from .links import BaseLink
+from .cancellation import CANCELLATION, CancelledError, TaskTimeoutError
+from .checkpoint import CHECKPOINT
+from .frontier import VISITED
+from .links import BaseLink, Resource
+from .options import Options
 from .subject import Subject
 from .time_operations import seconds_to_str
 from .utils import getch
 
 
+def get_task_kind(item):
+    """Returns the kind of a task: 'subject', 'discovery' (folders, forums and deliveries),
+    'wrapper' (resources that are html pages) or 'resource' (files). Items that are not tasks
+    return None."""
+
+    if isinstance(item, Subject):
+        return 'subject'
+
+    if isinstance(item, Resource):
+        if '/mod/resource/view.php' in item.url:
+            return 'wrapper'
+        return 'resource'
+
+    if isinstance(item, BaseLink):
+        return 'discovery'
+
+    return None
+
+
+class PriorityWorkQueue(Queue):
+    """Queue that serves first the tasks that discover more work, sharing the workers fairly
+    between subjects.
+
+    The tasks are served by priority (lower first). Inside each priority the subjects take
+    turns (round-robin), so a subject with hundreds of files does not delay the rest, and the
+    tasks of each subject are served in FIFO order. Messages that are not tasks (like the None
+    that closes a worker) are served before any task. The `join` and `task_done` semantics are
+    the same as in `queue.Queue`.
+    """
+
+    PRIORITIES = {'subject': 0, 'discovery': 1, 'wrapper': 2, 'resource': 3}
+
+    def __init__(self, maxsize=0, priorities=None):
+        """
+        Args:
+            maxsize (int): maximum number of items in the queue. If it is 0 there is no limit.
+            priorities (dict): priorities that replace the default ones (`PRIORITIES`), by
+                kind of task: 'subject', 'discovery' (folders, forums and deliveries), 'wrapper'
+                (resources that are html pages) and 'resource' (files).
+        """
+
+        self.priorities = dict(self.PRIORITIES, **(priorities or {}))
+        super().__init__(maxsize)
+
+    @property
+    def queue(self):
+        """list: items of the queue, in the order they will be served."""
+        items = []
+        for priority in sorted(self.levels):
+            turns = [deque(tasks) for tasks in self.levels[priority].values()]
+            while turns:
+                tasks = turns.pop(0)
+                items.append(tasks.popleft())
+                if tasks:
+                    turns.append(tasks)
+
+        return items
+
+    def get_priority(self, item):
+        """Returns the priority of an item of the queue."""
+        kind = get_task_kind(item)
+        return -1 if kind is None else self.priorities[kind]
+
+    @staticmethod
+    def get_subject(item):
+        """Returns the subject an item of the queue belongs to, or None if it is not a task."""
+        if isinstance(item, Subject):
+            return item
+
+        if isinstance(item, BaseLink):
+            return item.subject
+
+        return None
+
+    def _init(self, maxsize):
+        # Priority -> subject -> tasks. The first subject of each priority has the next turn.
+        self.levels = {}
+        self.size = 0
+
+    def _qsize(self):
+        return self.size
+
+    def _put(self, item):
+        level = self.levels.setdefault(self.get_priority(item), OrderedDict())
+        level.setdefault(self.get_subject(item), deque()).append(item)
+        self.size += 1
+
+    def _get(self):
+        priority = min(self.levels)
+        level = self.levels[priority]
+        subject, tasks = next(iter(level.items()))
+        item = tasks.popleft()
+
+        if tasks:
+            level.move_to_end(subject)
+        else:
+            del level[subject]
+            if not level:
+                del self.levels[priority]
+
+        self.size -= 1
+        return item
+
+
 class Worker(threading.Thread):
     """Special worker for vcd multithreading."""
 
-    def __init__(self, queue, *args, **kwargs):
+    def __init__(self, queue, *args, monitor=None, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.logger = logging.getLogger(__name__)
         self.queue: Queue = queue
+        self.monitor: ThroughputMonitor = monitor
+        self.watchdog: Watchdog = None
         self.status = 'idle'
         self.timestamp = None
         self.current_object = None
-        self.active = True
 
     def to_log(self, integer=False):
         color = 'black'
@@ -66,10 +178,83 @@ class Worker(threading.Thread):
 
         return (status, status_code)
 
+    def record(self, anything, nbytes, error):
+        """Records the task that has just been completed in the monitor, if any. Resources
+        that did not transfer a body (not modified or found in the disk) are recorded as
+        'cached', because they are much faster than the ones that did."""
+        if self.monitor is None:
+            return
+
+        kind = get_task_kind(anything)
+        if kind == 'resource' and not nbytes:
+            kind = 'cached'
+
+        self.monitor.record(time.time() - self.timestamp, nbytes, error, kind)
+
+    def process(self, anything):
+        """Processes a link or a subject. The task is marked as done even if it fails.
+
+        If the watchdog interrupts the task, it is handed back to the watchdog, which may put
+        it in the queue again.
+        """
+
+        error = False
+        completed = False
+        subfolders = list(anything.subfolders) if isinstance(anything, BaseLink) else None
+        CHECKPOINT.start_task(anything)
+
+        try:
+            if isinstance(anything, BaseLink) and not VISITED.add(anything.url):
+                self.logger.debug('Link already processed, skipping: %s', anything.url)
+            elif isinstance(anything, BaseLink):
+                self.logger.debug('Found Link %r, processing', anything.name)
+                anything.download()
+                completed = True
+                self.logger.info('Worker %r completed work of Link %r', self.name,
+                                 anything.name)
+            else:
+                self.logger.debug('Found Subject %r, processing', anything.name)
+                anything.find_links()
+                completed = True
+                self.logger.info('Worker %r completed work of Subject %r', self.name,
+                                 anything.name)
+        except TaskTimeoutError:
+            self.logger.warning('Worker %r interrupted by the watchdog processing %r',
+                                self.name, anything)
+        except CancelledError:
+            self.logger.info('Worker %r cancelled processing %r', self.name, anything)
+        except FileNotFoundError as ex:
+            self.logger.exception('FileNotFoundError in url %s (%r)', anything.url, ex)
+        except DownloaderError as ex:
+            if not CANCELLATION.is_interrupted():
+                error = True
+                self.logger.exception('DownloaderError in %r (%r)', anything, ex)
+        except Exception as ex:
+            # Interrupted sockets raise all kind of errors once the execution is cancelled.
+            if not CANCELLATION.is_set() and not CANCELLATION.is_interrupted():
+                raise
+            self.logger.info('Worker %r interrupted processing %r (%r)', self.name, anything, ex)
+        finally:
+            nbytes = anything.downloaded_bytes if isinstance(anything, BaseLink) else 0
+            self.record(anything, nbytes, error)
+
+            # A task that finished after being interrupted (parts that do not check the
+            # interruption, like the segments of a download) is not processed again.
+            interrupted = CANCELLATION.clear_interrupt()
+
+            if interrupted and not completed and self.watchdog is not None:
+                if subfolders is not None:
+                    anything.subfolders = subfolders
+                self.watchdog.requeue(self.queue, anything)
+
+            CHECKPOINT.finish_task(anything, completed)
+            self.queue.task_done()
+
     # noinspection PyUnresolvedReferences
     def run(self):
-        """Runs the thread"""
-        while self.active:
+        """Runs the thread until it receives None, it is retired or the execution is
+        cancelled."""
+        while not CANCELLATION.is_set():
             self.status = 'idle'
             self.logger.info('Worker %r ready to continue working', self.name)
             anything = self.queue.get()
@@ -80,58 +265,411 @@ class Worker(threading.Thread):
             self.status = 'working'
             self.current_object = anything
 
-            if isinstance(anything, BaseLink):
-                self.logger.debug('Found Link %r, processing', anything.name)
-                try:
-                    anything.download()
-                except FileNotFoundError as ex:
-                    self.logger.exception('FileNotFoundError in url %s (%r)', anything.url, ex)
-                except DownloaderError as ex:
-                    self.logger.exception('DownloaderError in url %s (%r)', anything.url, ex)
-
-                self.logger.info('Worker %r completed work of Link %r', self.name, anything.name)
-                self.queue.task_done()
-
-            elif isinstance(anything, Subject):
-                self.logger.debug('Found Subject %r, processing', anything.name)
-                try:
-                    anything.find_links()
-                except DownloaderError as ex:
-                    self.logger.exception('DownloaderError in subject %s (%r)', anything.name, ex)
-
-                self.logger.info('Worker %r completed work of Subject %r', self.name, anything.name)
+            if isinstance(anything, (BaseLink, Subject)):
+                self.process(anything)
+            elif anything == 'retire':
+                self.logger.info('Closing thread, retired by the pool controller')
+                self.status = 'retired'
+                self.current_object = None
+                self.timestamp = None
                 self.queue.task_done()
+                return
             elif anything is None:
                 self.logger.info('Closing thread, received None')
                 self.logger.info('%d unfinished tasks', self.queue.unfinished_tasks)
                 self.current_object = None
                 self.timestamp = None
+                self.queue.task_done()
+                if CANCELLATION.is_set():
+                    break
                 return
-            elif anything == 'killed':
-                self.status = 'killed'
-                break
 
             self.logger.info('%d unfinished tasks', self.queue.unfinished_tasks)
             self.current_object = None
             self.timestamp = None
 
-        # if self.status == 'killed':
+        self.logger.info('Closing thread, execution cancelled')
+        self.status = 'killed'
         self.timestamp = None
         self.current_object = 'Dead thread'
 
-        for thread in threading.enumerate():
-            if isinstance(thread, Worker):
-                self.queue.put('killed')
-                thread.status = 'killed'
-                thread.active = 0
 
-        while True:
-            foo = self.queue.get()
-            if not foo:
-                break
-            self.queue.task_done()
+class ThroughputMonitor:
+    """Thread-safe statistics of the tasks completed by the workers, collected by windows."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        self.tasks = 0
+        self.bytes = 0
+        self.errors = 0
+        self.latency = 0.0
+        # Kind of task -> [total latency, tasks].
+        self.kinds = {}
+        self.start = time.time()
+
+    def record(self, seconds, nbytes, error, kind=None):
+        """Records a completed task.
+
+        Args:
+            seconds (float): time spent processing the task.
+            nbytes (int): bytes downloaded by the task.
+            error (bool): True if the task failed.
+            kind (str): kind of the task, its latency is also averaged by kind.
+
+        """
+
+        with self.lock:
+            self.tasks += 1
+            self.bytes += nbytes
+            self.errors += bool(error)
+            self.latency += seconds
+
+            totals = self.kinds.setdefault(kind, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def collect(self):
+        """Returns the statistics of the window and starts a new one.
+
+        Returns:
+            dict: tasks, bytes and errors completed, mean latency of the tasks, mean latency
+                by kind of task and length of the window in seconds.
+
+        """
+
+        with self.lock:
+            window = {'tasks': self.tasks, 'bytes': self.bytes, 'errors': self.errors,
+                      'latency': self.latency / self.tasks if self.tasks else 0.0,
+                      'latencies': {kind: total / count
+                                    for kind, (total, count) in self.kinds.items()},
+                      'seconds': max(time.time() - self.start, 1e-6)}
+            self.reset()
+            return window
+
+
+class WorkerPool:
+    """Set of workers that can be resized while they are running."""
+
+    def __init__(self, queue, threadlist, monitor=None):
+        """
+        Args:
+            queue (Queue): queue of the workers.
+            threadlist (list): threads started by `start_workers`. The list is updated when
+                workers are added or retired, so it can be shared with the status server.
+            monitor (ThroughputMonitor): monitor given to the new workers.
+        """
+
+        self.logger = logging.getLogger(__name__)
+        self.queue = queue
+        self.threadlist = threadlist
+        self.monitor = monitor
+        self.lock = Lock()
+        self.target = len(self.workers)
+        self.counter = len(self.workers)
+
+    @property
+    def workers(self):
+        """list: workers that have not been retired."""
+        return [thread for thread in self.threadlist
+                if isinstance(thread, Worker) and thread.status != 'retired']
+
+    @property
+    def size(self):
+        return len(self.workers)
+
+    def resize(self, target):
+        """Starts or retires workers until the pool has `target` workers.
+
+        Workers are retired with a message served before any task, so a busy worker finishes
+        its current task before leaving.
+        """
+
+        with self.lock:
+            self.threadlist[:] = [thread for thread in self.threadlist
+                                  if not isinstance(thread, Worker) or thread.is_alive()]
+
+            if target > self.target:
+                for _ in range(target - self.target):
+                    self.counter += 1
+                    thread = Worker(self.queue, name=f'W-{self.counter:02d}', daemon=True,
+                                    monitor=self.monitor)
+                    thread.start()
+                    self.threadlist.append(thread)
+            else:
+                for _ in range(self.target - target):
+                    self.queue.put('retire')
+
+            if target != self.target:
+                self.logger.info('Worker pool resized: %d -> %d', self.target, target)
+
+            self.target = target
+
+
+class AdaptiveController(threading.Thread):
+    """Adjusts the size of a WorkerPool to the throughput observed.
+
+    Every `interval` seconds the throughput (bytes per second, or tasks per second if no file
+    was downloaded) of the last window is compared with the previous one, if both use the same
+    unit. The pool keeps growing or shrinking by `step` workers while the throughput improves,
+    and changes direction when it gets worse. If the error rate exceeds `max_error_rate` or the
+    latency of a kind of task doubles its baseline, the server is considered throttled and the
+    pool is reduced to three quarters. The baseline of each kind is a moving average
+    (`LATENCY_SMOOTHING`) of its latency, so it follows the latency up again after a window of
+    unusually fast tasks.
+    """
+
+    LATENCY_SMOOTHING = 0.5
+
+    def __init__(self, pool: WorkerPool, min_workers=None, max_workers=None, interval=10,
+                 step=5, max_error_rate=0.05):
+        super().__init__(name='Controller', daemon=True)
+        self.logger = logging.getLogger(__name__)
+        self.pool = pool
+        self.min_workers = min_workers or Options.MIN_WORKERS
+        self.max_workers = max_workers or Options.MAX_WORKERS
+        self.interval = interval
+        self.step = step
+        self.max_error_rate = max_error_rate
+        self.direction = 1
+        self.last_throughput = None
+        self.last_unit = None
+        self.latency_baselines = {}
+        self.status = 'online'
+
+    def to_log(self, *args, **kwargs):
+        output = f'<font color="blue">{self.name}: {self.status} ' \
+            f'({self.pool.size} workers, target {self.pool.target})'
+        return (output, 0)
+
+    def run(self):
+        try:
+            while not CANCELLATION.is_set():
+                CANCELLATION.sleep(self.interval)
+                self.pool.resize(self.get_target(self.pool.monitor.collect()))
+        except CancelledError:
+            pass
+
+        self.status = 'stopped'
+
+    def get_target(self, window):
+        """Returns the size of the pool that should be used after a window.
+
+        Args:
+            window (dict): statistics returned by `ThroughputMonitor.collect`.
+
+        Returns:
+            int: the new size of the pool.
+
+        """
+
+        target = self.pool.target
+
+        if not window['tasks']:
+            return target
+
+        unit = 'bytes' if window['bytes'] else 'tasks'
+        throughput = window[unit] / window['seconds']
+
+        # Throughputs in different units can not be compared.
+        if unit != self.last_unit:
+            self.last_throughput = None
+            self.last_unit = unit
+
+        error_rate = window['errors'] / window['tasks']
+        latencies = window.get('latencies', {})
+        slow = [kind for kind, latency in latencies.items()
+                if self.latency_baselines.get(kind) and
+                latency > 2 * self.latency_baselines[kind]]
+
+        if error_rate > self.max_error_rate or slow:
+            self.logger.warning('Throttling detected (error rate %.2f, latency %.2f s)',
+                                error_rate, window['latency'])
+            target = int(target * 0.75)
+            self.direction = 1
+            self.last_throughput = None
+        else:
+            if self.last_throughput is not None and throughput < self.last_throughput:
+                self.direction = -self.direction
+
+            target += self.direction * self.step
+            self.last_throughput = throughput
+
+        for kind, latency in latencies.items():
+            baseline = self.latency_baselines.get(kind)
+            if baseline is None:
+                self.latency_baselines[kind] = latency
+            else:
+                self.latency_baselines[kind] = baseline + \
+                    self.LATENCY_SMOOTHING * (latency - baseline)
+
+        self.status = f'{throughput:.1f} {unit}/s, errors {error_rate:.0%}'
+        return max(self.min_workers, min(self.max_workers, target))
+
+
+class WatchdogStats:
+    """Thread-safe record of the actions of the watchdog."""
 
-        exit()
+    def __init__(self):
+        self.lock = Lock()
+        self.interrupted = 0
+        self.requeued = 0
+        self.abandoned = []
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(interrupted={self.interrupted}, ' \
+            f'requeued={self.requeued}, abandoned={len(self.abandoned)})'
+
+    def increment(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def abandon(self, task):
+        with self.lock:
+            self.abandoned.append(task)
+
+    def to_json(self):
+        """Returns the statistics json serialized."""
+        with self.lock:
+            return {'interrupted': self.interrupted, 'requeued': self.requeued,
+                    'abandoned': [task.url for task in self.abandoned]}
+
+
+class Watchdog(threading.Thread):
+    """Interrupts the tasks that exceed the deadline of their kind (`Options.DEADLINES`).
+
+    The connections of the stuck worker are aborted and its task is interrupted. Once the worker
+    gives it up, the task is put in the queue again, at most `max_requeues` times. After that
+    it is abandoned and reported in the summary of the execution.
+    """
+
+    def __init__(self, threadlist, deadlines=None, max_requeues=None, interval=1):
+        """
+        Args:
+            threadlist (list): threads of the execution. Only the workers are watched.
+            deadlines (dict): maximum number of seconds of each kind of task (see
+                `get_task_kind`). A deadline of 0 disables it. Defaults to `Options.DEADLINES`.
+            max_requeues (int): times a task can be put in the queue again. Defaults to
+                `Options.MAX_REQUEUES`.
+            interval (float): seconds between checks.
+        """
+
+        super().__init__(name='Watchdog', daemon=True)
+        self.logger = logging.getLogger(__name__)
+        self.threadlist = threadlist
+        self.deadlines = deadlines or Options.DEADLINES
+        self.max_requeues = max_requeues if max_requeues is not None else Options.MAX_REQUEUES
+        self.interval = interval
+        self.stats = WatchdogStats()
+        self.requeues = WeakKeyDictionary()
+        self.watched = WeakKeyDictionary()
+        self.status = 'online'
+
+    def to_log(self, *args, **kwargs):
+        output = f'<font color="blue">{self.name}: {self.status} ({self.stats.interrupted} ' \
+            f'interrupted, {len(self.stats.abandoned)} abandoned)'
+        return (output, 0)
+
+    def run(self):
+        while not CANCELLATION.is_set():
+            time.sleep(self.interval)
+            self.check()
+
+    def check(self):
+        """Interrupts the workers whose task exceeded its deadline."""
+        now = time.time()
+
+        for worker in list(self.threadlist):
+            if not isinstance(worker, Worker) or worker.status != 'working':
+                continue
+
+            task = worker.current_object
+            started = worker.timestamp
+            kind = get_task_kind(task)
+
+            if kind is None or started is None or not self.deadlines.get(kind):
+                continue
+
+            # Each task is interrupted once, the worker may need some time to give it up.
+            if now - started < self.deadlines[kind] or self.watched.get(worker) == started:
+                continue
+
+            self.watched[worker] = started
+            self.interrupt(worker, task, now - started)
+
+    def interrupt(self, worker, task, elapsed):
+        """Interrupts the task of a worker and aborts its connections."""
+        self.logger.warning('Task %r of worker %r exceeded its deadline (%s), interrupting',
+                            task, worker.name, seconds_to_str(elapsed))
+
+        worker.watchdog = self
+        CANCELLATION.interrupt(worker.ident)
+        task.downloader.abort(worker.ident)
+        self.stats.increment('interrupted')
+
+    def requeue(self, queue, task):
+        """Puts an interrupted task in the queue again, unless it was requeued too many times.
+
+        Called by the worker once it gives the task up, before marking it as done.
+        """
+
+        requeues = self.requeues.get(task, 0)
+
+        if requeues >= self.max_requeues:
+            self.logger.error('Task %r interrupted %d times, abandoning it', task, requeues + 1)
+            self.stats.abandon(task)
+            return
+
+        self.requeues[task] = requeues + 1
+        self.stats.increment('requeued')
+
+        if isinstance(task, BaseLink):
+            VISITED.discard(task.url)
+
+        queue.put(task)
+
+
+def get_queued(queue):
+    """Returns the items of a queue, in the order they will be served."""
+    with queue.mutex:
+        return list(queue.queue)
+
+
+class Checkpointer(threading.Thread):
+    """Saves the checkpoint of the execution (`vcd.checkpoint.CHECKPOINT`) periodically."""
+
+    def __init__(self, queue, interval=None):
+        """
+        Args:
+            queue (Queue): queue of the workers.
+            interval (float): seconds between checkpoints. Defaults to
+                `Options.CHECKPOINT_INTERVAL`.
+        """
+
+        super().__init__(name='Checkpointer', daemon=True)
+        self.logger = logging.getLogger(__name__)
+        self.queue = queue
+        self.interval = interval or Options.CHECKPOINT_INTERVAL
+        self.saved = None
+        self.status = 'online'
+
+    def to_log(self, *args, **kwargs):
+        saved = 'never' if self.saved is None else \
+            seconds_to_str(time.time() - self.saved, integer=True) + ' ago'
+        output = f'<font color="blue">{self.name}: {self.status} (saved {saved})'
+        return (output, 0)
+
+    def run(self):
+        while not CANCELLATION.is_set():
+            time.sleep(self.interval)
+            self.save()
+
+    def save(self):
+        CHECKPOINT.update(get_queued(self.queue))
+        self.saved = time.time()
+        self.logger.debug('Checkpoint saved')
 
 
 class Killer(threading.Thread):
@@ -155,14 +693,9 @@ class Killer(threading.Thread):
 
             if real in ('q', 'k'):
                 print('Exiting')
-
-                for thread in threading.enumerate():
-                    if isinstance(thread, Worker):
-                        thread.active = False
-                        thread.status = 'killed'
-
                 self.status = 'commited suicide'
-                exit(1)
+                CANCELLATION.cancel('killed by the user')
+                return
 
             if real in ('w', 'o'):
                 print('Opening status server')
@@ -170,12 +703,94 @@ class Killer(threading.Thread):
                 webbrowser.get(chrome_path).open_new('localhost')
 
 
-def start_workers(queue, nthreads=20, no_killer=False):
+def wait_queue(queue, interval=0.1):
+    """Waits until all the tasks of the queue are done or the execution is cancelled.
+
+    Unlike `Queue.join`, the wait can be interrupted with Ctrl-C.
+
+    Returns:
+        bool: True if all the tasks were done, False if the execution was cancelled.
+
+    """
+
+    with queue.all_tasks_done:
+        while queue.unfinished_tasks and not CANCELLATION.is_set():
+            queue.all_tasks_done.wait(interval)
+
+    return not CANCELLATION.is_set()
+
+
+def drain(queue):
+    """Removes the pending items of the queue, marking them as done.
+
+    Returns:
+        int: number of items removed.
+
+    """
+
+    drained = 0
+    while True:
+        try:
+            queue.get_nowait()
+        except Empty:
+            return drained
+        queue.task_done()
+        drained += 1
+
+
+def shutdown(queue, threadlist, timeout=None):
+    """Stops the workers after the execution is cancelled.
+
+    The tasks that have not started are removed from the queue (and marked as done), and the
+    workers are woken up and waited for at most `timeout` seconds. Workers still running after
+    the deadline are daemon threads, so they do not prevent the program from exiting.
+
+    Args:
+        queue (Queue): queue of the workers.
+        threadlist (list): threads of the execution.
+        timeout (float): maximum number of seconds to wait. Defaults to
+            `Options.SHUTDOWN_TIMEOUT`.
+
+    Returns:
+        list: workers still alive after the deadline.
+
+    """
+
+    logger = logging.getLogger(__name__)
+    timeout = timeout if timeout is not None else Options.SHUTDOWN_TIMEOUT
+    deadline = time.time() + timeout
+
+    CANCELLATION.cancel('shutdown')
+    workers = [thread for thread in threadlist if isinstance(thread, Worker)]
+
+    logger.info('Removed %d tasks from the queue', drain(queue))
+
+    for _ in workers:
+        queue.put(None)
+
+    for worker in workers:
+        worker.join(max(0.0, deadline - time.time()))
+
+    # Workers that saw the cancellation before getting their None leave it in the queue.
+    drain(queue)
+
+    alive = [worker for worker in workers if worker.is_alive()]
+
+    if alive:
+        logger.warning('%d workers did not stop before the deadline (%s s)', len(alive),
+                       timeout)
+
+    return alive
+
+
+def start_workers(queue, nthreads=20, no_killer=False, monitor=None):
     """Starts the wokers.
 
     Args:
         queue (Queue): queue to manage the workers's tasks.
         nthreads (int): number of trheads to start.
+        no_killer (bool): desactivate Killer thread.
+        monitor (ThroughputMonitor): monitor where the workers record their tasks.
 
     Returns:
 
@@ -191,7 +806,7 @@ def start_workers(queue, nthreads=20, no_killer=False):
         print('Killer not started')
 
     for i in range(nthreads):
-        thread = Worker(queue, name=f'W-{i + 1:02d}', daemon=True)
+        thread = Worker(queue, name=f'W-{i + 1:02d}', daemon=True, monitor=monitor)
         thread.logger.debug('Started worker named %r', thread.name)
         thread.start()
         thread_list.append(thread)
@@ -232,3 +232,26 @@ class Alias:
                 return file['old']
 
         raise IdError(f'Id not found: {id_}')
+
+    @staticmethod
+    def get_alias_from_id(id_):
+        """Returns the alias given the id.
+
+        Args:
+            id_ (str | int): id.
+
+        Returns:
+            str: the alias if the id is found in the alias database.
+
+        Raises
+            IdError: if the id is not in the database.
+
+        """
+        self = Alias.__new__(Alias)
+        self.__init__()
+
+        for file in self.json:
+            if file['id'] == id_:
+                return file['new']
+
+        raise IdError(f'Id not found: {id_}')
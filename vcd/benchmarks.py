@@ -0,0 +1,205 @@
+"""Benchmark of the HTML parsers with pages of the virtual campus.
+
+Usage: python -m vcd.benchmarks [saved pages...] [--repeat N] [--partial]
+
+Without saved pages, course, folder, forum, assign and resource pages with the markup of the
+virtual campus are generated. With --partial, the full parse of the generated pages is compared
+with the partial parse of the link that processes them, for the kinds of page that have one.
+"""
+
+import argparse
+import os
+import time
+import tracemalloc
+
+from .links import Delivery, Folder, Resource
+from .parsers import PARSERS, is_available, parse_html
+from .subject import Subject
+
+# Forums are left out: the discussion table is most of their page, so a strainer that keeps it
+# is not faster than the full parse.
+STRAINERS = {'course': Subject.PARSE_ONLY, 'folder': Folder.PARSE_ONLY,
+             'assign': Delivery.PARSE_ONLY, 'resource': Resource.PARSE_ONLY}
+
+
+def make_sample_pages(size=200):
+    """Generates pages with the markup of the virtual campus.
+
+    Args:
+        size (int): number of activities, files or topics of each page.
+
+    Returns:
+        dict: html of the pages, by kind of page.
+
+    """
+
+    # Navigation and blocks of the page, which are not used by the links.
+    navigation = '<nav class="block_navigation"><ul>' + ''.join(
+        f'<li class="type_course"><p class="tree_item branch"><a title="Asignatura {i}" '
+        f'href="https://campus/course/view.php?id={i}"><span class="item-content-wrap">'
+        f'Asignatura {i}</span></a></p></li>'
+        for i in range(size // 2)) + '</ul></nav>'
+
+    def wrap(body):
+        return f'<html><head><title>Campus</title></head><body>{navigation}' \
+            f'<div role="main">{body}</div></body></html>'
+
+    course = ''.join(
+        f'<li class="activity"><div class="mod-indent"></div><div class="activityinstance">'
+        f'<a href="https://campus/mod/resource/view.php?id={i}"><img src="icon.png">'
+        f'<span class="instancename">Tema {i}<span class="accesshide"> Archivo</span></span>'
+        f'</a></div><div class="contentafterlink">Descripcion del tema {i}</div></li>'
+        for i in range(size))
+
+    folder = ''.join(
+        f'<li><span class="fp-filename-icon"><a href="https://campus/pluginfile.php/4/'
+        f'mod_folder/content/0/p{i}.pdf?forcedownload=1"><span class="fp-icon"><img '
+        f'src="pdf.png"></span><span class="fp-filename">p{i}.pdf</span></a></span></li>'
+        for i in range(size))
+
+    forum = '<table class="forumheaderlist">' + ''.join(
+        f'<tr class="discussion"><td class="topic starter"><a href="https://campus/mod/forum/'
+        f'discuss.php?d={i}">Duda {i}</a></td><td class="author">Alumno {i}</td>'
+        f'<td class="replies"><a href="#">{i % 7}</a></td><td class="lastpost">hoy</td></tr>'
+        for i in range(size)) + '</table>'
+
+    assign = '<table class="generaltable">' + ''.join(
+        f'<tr><td class="cell">Archivo {i}</td><td class="cell"><a target="_blank" '
+        f'href="https://campus/pluginfile.php/5/assignsubmission_file/{i}/entrega{i}.pdf">'
+        f'entrega{i}.pdf</a></td></tr>'
+        for i in range(size)) + '</table>'
+
+    # The html wrapper of a resource: its page is the navigation, the blocks and the file.
+    resource = '<h2>Tema 1</h2><div class="resourcecontent resourcepdf"><object ' \
+        'id="resourceobject" data="https://campus/pluginfile.php/2/mod_resource/content/1/' \
+        'tema1.pdf" type="application/pdf"></object></div><div class="resourceworkaround">' \
+        '<a href="https://campus/pluginfile.php/2/mod_resource/content/1/tema1.pdf">' \
+        'tema1.pdf</a></div>'
+
+    return {'course': wrap(course), 'folder': wrap(folder), 'forum': wrap(forum),
+            'assign': wrap(assign), 'resource': wrap(resource)}
+
+
+def benchmark_parsers(pages, parsers=None, repeat=10):
+    """Measures the time each parser needs to parse each page.
+
+    Args:
+        pages (dict): html of the pages, by name.
+        parsers (list): parsers to compare. Defaults to the parsers installed.
+        repeat (int): number of times each page is parsed.
+
+    Returns:
+        dict: seconds per parse, by page and parser.
+
+    """
+
+    parsers = parsers or [parser for parser in PARSERS if is_available(parser)]
+    results = {}
+
+    for name, markup in pages.items():
+        results[name] = {}
+
+        for parser in parsers:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                parse_html(markup, parser)
+            results[name][parser] = (time.perf_counter() - start) / repeat
+
+    return results
+
+
+def measure_parse(markup, parse_only=None, repeat=10):
+    """Measures a parse of a page.
+
+    Args:
+        markup (str | bytes): content of the page.
+        parse_only (bs4.SoupStrainer): filter of the parse, None to parse the full page.
+        repeat (int): number of times the page is parsed to measure the time.
+
+    Returns:
+        tuple: seconds per parse and peak of memory allocated by a parse, in bytes.
+
+    """
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse_html(markup, parse_only=parse_only)
+    seconds = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    try:
+        soup = parse_html(markup, parse_only=parse_only)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    del soup
+    return seconds, peak
+
+
+def benchmark_partial_parsing(pages, repeat=10):
+    """Compares the full parse of the pages with the partial parse of their links.
+
+    Args:
+        pages (dict): html of the pages, by kind of page (see `STRAINERS`).
+        repeat (int): number of times each page is parsed.
+
+    Returns:
+        dict: 'full' and 'partial' tuples of `measure_parse`, by kind of page.
+
+    """
+
+    return {name: {'full': measure_parse(markup, repeat=repeat),
+                   'partial': measure_parse(markup, STRAINERS[name], repeat=repeat)}
+            for name, markup in pages.items() if name in STRAINERS}
+
+
+def print_partial_report(results):
+    """Prints the time and memory of the full and partial parses."""
+    for name, measures in results.items():
+        print(f'{name}:')
+
+        for kind, (seconds, peak) in measures.items():
+            print(f'    {kind:8} {seconds * 1000:8.2f} ms {peak / 1024:10.1f} KiB')
+
+        full, partial = measures['full'], measures['partial']
+        print(f'    {full[0] / partial[0]:.1f}x faster, {full[1] / partial[1]:.1f}x less memory')
+
+
+def print_report(results, baseline='html.parser'):
+    """Prints the milliseconds per parse and the speedup over the baseline parser."""
+    for name, times in results.items():
+        print(f'{name}:')
+
+        for parser, seconds in times.items():
+            line = f'    {parser:12} {seconds * 1000:8.2f} ms'
+            if baseline in times and parser != baseline:
+                line += f'  ({times[baseline] / seconds:.1f}x faster than {baseline})'
+            print(line)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser('vcd.benchmarks')
+    parser.add_argument('pages', nargs='*', help='saved html pages')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--partial', action='store_true',
+                        help='compare full and partial parses of the generated pages')
+    opt = parser.parse_args(args)
+
+    if opt.partial:
+        print_partial_report(benchmark_partial_parsing(make_sample_pages(), repeat=opt.repeat))
+        return
+
+    if opt.pages:
+        pages = {}
+        for path in opt.pages:
+            with open(path, 'rb') as file_handler:
+                pages[os.path.basename(path)] = file_handler.read()
+    else:
+        pages = make_sample_pages()
+
+    print_report(benchmark_parsers(pages, repeat=opt.repeat))
+
+
+if __name__ == '__main__':
+    main()
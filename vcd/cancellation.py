@@ -0,0 +1,125 @@
+"""Cancellation of the execution, shared by all the threads."""
+
+import logging
+import time
+from threading import Event, Lock, get_ident
+
+
+class CancelledError(Exception):
+    """The execution was cancelled."""
+
+
+class TaskTimeoutError(CancelledError):
+    """The task of a thread was interrupted because it exceeded its deadline."""
+
+
+class Cancellation:
+    """Stop signal of the execution.
+
+    Blocking operations (retries, rate limits, body reads) check it, so a cancelled execution
+    stops in about a second. Callbacks can be registered to interrupt operations that can not
+    check it, like a socket waiting for data. The task of a single thread can also be
+    interrupted, without cancelling the rest of the execution.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.event = Event()
+        self.lock = Lock()
+        self.callbacks = []
+        self.interrupted = set()
+
+    def is_set(self):
+        return self.event.is_set()
+
+    def register(self, callback):
+        """Registers a function that will be called when the execution is cancelled."""
+        with self.lock:
+            self.callbacks.append(callback)
+
+    def cancel(self, reason='cancelled'):
+        """Cancels the execution. Only the first call has effect."""
+        with self.lock:
+            if self.event.is_set():
+                return
+
+            self.logger.warning('Execution cancelled: %s', reason)
+            self.event.set()
+            callbacks = list(self.callbacks)
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as ex:
+                self.logger.exception('Error in cancellation callback %r (%r)', callback, ex)
+
+    def reset(self):
+        """Clears the signal and the callbacks, so a new execution can start."""
+        with self.lock:
+            self.event.clear()
+            self.callbacks = []
+            self.interrupted = set()
+
+    def interrupt(self, ident):
+        """Interrupts the task of a thread: its checks will raise TaskTimeoutError until it
+        calls `clear_interrupt`.
+
+        Args:
+            ident (int): identifier of the thread.
+
+        """
+
+        with self.lock:
+            self.interrupted.add(ident)
+
+    def is_interrupted(self):
+        """Returns True if the task of the current thread was interrupted."""
+        return get_ident() in self.interrupted
+
+    def clear_interrupt(self):
+        """Clears the interruption of the current thread.
+
+        Returns:
+            bool: True if the task of the thread had been interrupted.
+
+        """
+
+        with self.lock:
+            if get_ident() not in self.interrupted:
+                return False
+
+            self.interrupted.discard(get_ident())
+            return True
+
+    def check(self):
+        """Raises CancelledError if the execution was cancelled, or TaskTimeoutError if the
+        task of the current thread was interrupted."""
+        if self.event.is_set():
+            raise CancelledError
+
+        if self.is_interrupted():
+            raise TaskTimeoutError
+
+    def sleep(self, seconds):
+        """Waits the number of seconds, unless the execution is cancelled.
+
+        Raises:
+            CancelledError: if the execution was cancelled, or TaskTimeoutError if the task of
+                the current thread was interrupted.
+
+        """
+
+        # Interruptions of a thread do not set the event, so it is checked every second.
+        deadline = time.monotonic() + seconds
+        while True:
+            self.check()
+            remaining = deadline - time.monotonic()
+
+            if remaining <= 0:
+                return
+
+            if self.event.wait(min(remaining, 1)):
+                raise CancelledError
+
+
+CANCELLATION = Cancellation()
@@ -0,0 +1,216 @@
+"""Checkpoint of the crawl frontier, to resume an interrupted execution."""
+
+import os
+from threading import Lock
+
+from .cancellation import CANCELLATION
+from .frontier import normalize_url
+from .links import BaseLink, Delivery, Folder, Forum, Resource
+from .stores import JsonStore
+from .subject import Subject
+
+LINK_TYPES = {cls.__name__: cls for cls in (Resource, Folder, Forum, Delivery)}
+
+
+def task_to_json(task, subfolders=None):
+    """Returns the data needed to create a task again, or None if it is not a task.
+
+    Args:
+        task (Subject | BaseLink): task to serialize.
+        subfolders (list): subfolders of the link when it started, if it is running. Links
+            add their own folder to their subfolders while they are processed.
+
+    Returns:
+        dict: the task json serialized.
+
+    """
+
+    if isinstance(task, Subject):
+        return {'type': 'Subject', 'name': task.name, 'url': task.url}
+
+    if isinstance(task, BaseLink) and type(task).__name__ in LINK_TYPES:
+        data = {'type': type(task).__name__, 'name': task.name, 'url': task.url,
+                'subject': {'name': task.subject.name, 'url': task.subject.url},
+                'subfolders': list(task.subfolders if subfolders is None else subfolders)}
+
+        if isinstance(task, Forum):
+            data['marker'] = task.marker
+
+        return data
+
+    return None
+
+
+def task_from_json(data, downloader, queue, subjects):
+    """Creates a task serialized with `task_to_json`.
+
+    Args:
+        data (dict): the task json serialized.
+        downloader (Downloader): downloader of the task.
+        queue (Queue): queue of the task.
+        subjects (dict): subjects already created, by url. The links of the same subject share
+            the same Subject, which is created and added to the dict if needed.
+
+    Returns:
+        Subject | BaseLink: the task.
+
+    """
+
+    subject_data = data if data['type'] == 'Subject' else data['subject']
+
+    if subject_data['url'] not in subjects:
+        subjects[subject_data['url']] = Subject(subject_data['name'], subject_data['url'],
+                                                downloader, queue)
+
+    subject = subjects[subject_data['url']]
+
+    if data['type'] == 'Subject':
+        return subject
+
+    link = LINK_TYPES[data['type']](data['name'], data['url'], subject, downloader, queue)
+    link.subfolders = list(data['subfolders'])
+
+    if 'marker' in data:
+        link.marker = data['marker']
+
+    return link
+
+
+class Checkpoint(JsonStore):
+    """Pending tasks and completed urls of the execution, saved in the root folder.
+
+    The pending tasks are the ones in the queue plus the ones being processed, or interrupted
+    by the cancellation of the execution. The file is removed when the execution finishes, so
+    it only exists if the execution was interrupted.
+    """
+
+    filename = 'vcd-checkpoint.json'
+
+    def __init__(self):
+        super().__init__()
+        self.tasks_lock = Lock()
+        self.update_lock = Lock()
+        self.completed = set()
+        self.running = []
+        self.started_subfolders = {}
+        self.closed = True
+
+    def open(self, downloader, queue, resume=False):
+        """Starts the checkpoint of an execution.
+
+        Args:
+            downloader (Downloader): downloader of the restored tasks.
+            queue (Queue): queue of the restored tasks.
+            resume (bool): if True, the checkpoint of the interrupted execution is loaded.
+                Otherwise it is discarded.
+
+        Returns:
+            list: the pending tasks of the interrupted execution, empty if there are none.
+
+        """
+
+        if resume:
+            self.load()
+        else:
+            self.remove()
+
+        with self.tasks_lock:
+            self.completed = set(self.get('completed', []))
+            self.running = []
+            self.started_subfolders = {}
+
+        with self.update_lock:
+            self.closed = False
+
+        subjects = {}
+        return [task_from_json(data, downloader, queue, subjects)
+                for data in self.get('pending', [])]
+
+    def start_task(self, task):
+        """Records that a task is being processed, with the subfolders it started with."""
+        with self.tasks_lock:
+            self.running.append(task)
+
+            if isinstance(task, BaseLink):
+                self.started_subfolders[id(task)] = list(task.subfolders)
+
+    def finish_task(self, task, completed):
+        """Records the end of a task. Tasks interrupted by the cancellation of the execution
+        stay pending.
+
+        Args:
+            task (Subject | BaseLink): task processed.
+            completed (bool): True if the task was processed successfully.
+
+        """
+
+        with self.tasks_lock:
+            if completed:
+                self.completed.add(normalize_url(task.url))
+            elif CANCELLATION.is_set():
+                return
+
+            self.running.remove(task)
+
+            if task not in self.running:
+                self.started_subfolders.pop(id(task), None)
+
+    def is_completed(self, url):
+        with self.tasks_lock:
+            return normalize_url(url) in self.completed
+
+    def update(self, queued):
+        """Saves the pending tasks and the urls completed so far. Ignored once the checkpoint
+        is closed.
+
+        Args:
+            queued (list): items of the queue. Items that are not tasks are ignored.
+
+        """
+
+        with self.update_lock:
+            if not self.closed:
+                self._save(queued)
+
+    def close(self, queued=None):
+        """Saves the last checkpoint of the execution, or removes it if it has finished.
+
+        Args:
+            queued (list): items left in the queue if the execution was interrupted, None if
+                it finished.
+
+        """
+
+        with self.update_lock:
+            self.closed = True
+
+            if queued is None:
+                self.remove()
+            else:
+                self._save(queued)
+
+    def remove(self):
+        """Forgets the checkpoint and removes its file."""
+        with self.lock:
+            self.data = {}
+
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _save(self, queued):
+        with self.tasks_lock:
+            tasks = list(self.running) + list(queued)
+            subfolders = dict(self.started_subfolders)
+            completed = sorted(self.completed)
+
+        # A task requeued by the watchdog may be in the queue and still running.
+        unique = list({id(task): task for task in tasks}.values())
+        pending = [task_to_json(task, subfolders.get(id(task))) for task in unique]
+        self['pending'] = [data for data in pending if data is not None]
+        self['completed'] = completed
+        self.save()
+
+
+CHECKPOINT = Checkpoint()
@@ -0,0 +1,190 @@
+"""Registry of the content types of the resources and what to do with each one."""
+
+import mimetypes
+
+from .options import Options
+
+SAVE = 'save'
+PARSE = 'parse'
+SKIP = 'skip'
+
+# Signatures of the first bytes of the content, as (offset, signature, content type).
+MAGIC_BYTES = (
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'\x1f\x8b', 'application/gzip'),
+    (0, b'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed'),
+    (0, b'Rar!\x1a\x07', 'application/x-rar-compressed'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (4, b'ftyp', 'video/mp4'),
+    (0, b'<!doctype html', 'text/html'),
+    (0, b'<html', 'text/html'),
+)
+
+MAGIC_SIZE = 32
+
+
+def parse_content_type(header):
+    """Returns the content type of a Content-Type header, without its parameters.
+
+    Args:
+        header (str): value of the header, or None.
+
+    Returns:
+        str: the content type lowercased, or None if the header is missing or empty.
+
+    """
+
+    if not header:
+        return None
+
+    return header.split(';')[0].strip().lower() or None
+
+
+def sniff_content_type(content):
+    """Identifies the content type of a content by its first bytes.
+
+    Args:
+        content (bytes): first bytes of the content (at least `MAGIC_SIZE`, if it is longer).
+
+    Returns:
+        str: the content type, or None if it is not identified.
+
+    """
+
+    # HTML may start with whitespace and its tags are case insensitive.
+    text = content.lstrip()[:MAGIC_SIZE].lower()
+
+    for offset, signature, content_type in MAGIC_BYTES:
+        head = text if signature.startswith(b'<') else content
+        if head[offset:offset + len(signature)] == signature:
+            return content_type
+
+    return None
+
+
+class ContentType:
+    """What to do with the resources of a content type.
+
+    Args:
+        resource_type (str): name of the type, used in the logs.
+        action (str): SAVE to save the resource, PARSE to parse it as HTML or SKIP to
+            discard it without downloading its body.
+        extension (str): extension of the file if its name does not have one.
+
+    """
+
+    def __init__(self, resource_type, action=SAVE, extension=None):
+        self.resource_type = resource_type
+        self.action = action
+        self.extension = extension
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(resource_type={self.resource_type!r}, ' \
+            f'action={self.action!r}, extension={self.extension!r})'
+
+
+class ContentTypeRegistry:
+    """Content types known, by content type.
+
+    The entries of the `content_types` section of the config file (`Options.CONTENT_TYPES`)
+    take precedence over the registered ones.
+    """
+
+    def __init__(self):
+        self.types = {}
+
+    def __contains__(self, content_type):
+        return self.get(content_type) is not None
+
+    def register(self, content_type, resource_type, action=SAVE, extension=None):
+        """Registers a content type.
+
+        Args:
+            content_type (str): the content type, like 'application/pdf'.
+            resource_type (str): see `ContentType`.
+            action (str): see `ContentType`.
+            extension (str): see `ContentType`.
+
+        """
+
+        self.types[content_type.lower()] = ContentType(resource_type, action, extension)
+
+    def get(self, content_type):
+        """Returns the ContentType of a content type, or None if it is not known.
+
+        Args:
+            content_type (str): the content type, without parameters.
+
+        """
+
+        if content_type in Options.CONTENT_TYPES:
+            return ContentType(*Options.CONTENT_TYPES[content_type])
+
+        return self.types.get(content_type)
+
+    def resolve(self, header, filename=None, content=None):
+        """Identifies a resource by its Content-Type header. If the header is missing or its
+        type is unknown, the type is guessed from the filename and then from the first bytes
+        of the content.
+
+        Args:
+            header (str): value of the Content-Type header, or None.
+            filename (str): name or url of the resource.
+            content (bytes): first bytes of the content.
+
+        Returns:
+            ContentType: the ContentType of the resource, or None if it is not identified.
+
+        """
+
+        entry = self.get(parse_content_type(header))
+        if entry is not None:
+            return entry
+
+        if filename:
+            entry = self.get(mimetypes.guess_type(filename, strict=False)[0])
+            if entry is not None:
+                return entry
+
+        if content:
+            return self.get(sniff_content_type(content))
+
+        return None
+
+
+CONTENT_TYPES = ContentTypeRegistry()
+
+for _content_type, _resource_type, _extension in (
+        ('application/pdf', 'pdf', 'pdf'),
+        ('application/msword', 'word', 'doc'),
+        ('application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'word',
+         'docx'),
+        ('application/vnd.ms-excel', 'excel', 'xls'),
+        ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'excel', 'xlsx'),
+        ('application/vnd.ms-powerpoint', 'power-point', 'ppt'),
+        ('application/mspowerpoint', 'power-point', 'ppt'),
+        ('application/powerpoint', 'power-point', 'ppt'),
+        ('application/vnd.openxmlformats-officedocument.presentationml.presentation',
+         'power-point', 'pptx'),
+        ('application/vnd.openxmlformats-officedocument.presentationml.slideshow',
+         'power-point', 'ppsx'),
+        ('application/zip', 'zip', 'zip'),
+        ('application/gzip', 'gzip', 'gz'),
+        ('application/g-zip', 'gzip', 'gz'),
+        ('application/x-gzip', 'gzip', 'gz'),
+        ('application/x-7z-compressed', '7zip', '7z'),
+        ('application/x-rar-compressed', 'rar', 'rar'),
+        ('application/vnd.rar', 'rar', 'rar'),
+        ('text/plain', 'plain', 'txt'),
+        ('application/json', 'json', 'json'),
+        ('application/octet-stream', 'octect-stream', None),
+        ('image/jpeg', 'jpeg', 'jpg'),
+        ('image/png', 'png', 'png'),
+        ('video/mp4', 'mp4', 'mp4'),
+        ('video/x-ms-wmv', 'avi', 'wmv'),
+        ('video/x-ms-wm', 'avi', 'wmv')):
+    CONTENT_TYPES.register(_content_type, _resource_type, SAVE, _extension)
+
+CONTENT_TYPES.register('text/html', 'html', PARSE)
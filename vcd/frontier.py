@@ -0,0 +1,198 @@
+"""Urls already processed in the execution, shared by all the workers."""
+
+from _sha1 import sha1
+from copy import copy
+from threading import Lock
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+SECRET_ARGUMENTS = ('token', 'wstoken')
+
+
+def normalize_url(url):
+    """Returns a canonical form of an url, so the same document always has the same key.
+
+    The scheme and host are lowercased, the default port, the credentials and the fragment are
+    removed and the query arguments are sorted.
+
+    Args:
+        url (str): url to normalize.
+
+    Returns:
+        str: the url normalized.
+
+    """
+
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or '').lower()
+
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc += f':{parts.port}'
+
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+
+def strip_token(url):
+    """Returns the url without the token of the web service, so it is not saved nor logged.
+
+    Args:
+        url (str): url that may contain the token.
+
+    Returns:
+        str: the url without the token.
+
+    """
+
+    if not url or 'token=' not in url:
+        return url
+
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if key not in SECRET_ARGUMENTS]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class VisitedSet:
+    """Thread safe set of normalized urls."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.urls = set()
+
+    def __contains__(self, url):
+        return normalize_url(url) in self.urls
+
+    def __len__(self):
+        return len(self.urls)
+
+    def add(self, url):
+        """Marks an url as visited.
+
+        Args:
+            url (str): url to mark.
+
+        Returns:
+            bool: True if the url had not been visited, False otherwise.
+
+        """
+
+        key = normalize_url(url)
+
+        with self.lock:
+            if key in self.urls:
+                return False
+
+            self.urls.add(key)
+            return True
+
+    def discard(self, url):
+        """Forgets an url, so it can be processed again."""
+        with self.lock:
+            self.urls.discard(normalize_url(url))
+
+    def clear(self):
+        """Forgets all the urls, so a new execution can start."""
+        with self.lock:
+            self.urls.clear()
+
+
+class PageHashes:
+    """Thread safe hashes of the pages parsed, by normalized url.
+
+    They are kept between the synchronizations of the watch mode, so pages that did not change
+    are not parsed again. The links found in each page are kept with its hash, so they can be
+    processed again without parsing it. Nothing is recorded unless `enabled` is set, because
+    a single synchronization never reuses them.
+    """
+
+    def __init__(self, enabled=False):
+        self.lock = Lock()
+        self.enabled = enabled
+        self.hashes = {}
+        self.links = {}
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def update(self, url, content):
+        """Records the content of a page.
+
+        Args:
+            url (str): url of the page.
+            content (bytes): content of the page.
+
+        Returns:
+            bool: True if the content is different from the last one recorded (or it is the
+                first one or the hashes are not enabled), False otherwise.
+
+        """
+
+        if not self.enabled:
+            return True
+
+        key = normalize_url(url)
+        digest = sha1(content).hexdigest()
+
+        with self.lock:
+            changed = self.hashes.get(key) != digest
+            self.hashes[key] = digest
+
+            if changed:
+                self.links[key] = []
+
+            return changed
+
+    def add_link(self, url, link):
+        """Records a link found in a page. A copy is kept, before the link is processed.
+
+        Args:
+            url (str): url of the page.
+            link (vcd.links.BaseLink): link found in the page.
+
+        """
+
+        if not self.enabled:
+            return
+
+        template = copy(link)
+        template.subfolders = list(link.subfolders)
+
+        with self.lock:
+            self.links.setdefault(normalize_url(url), []).append(template)
+
+    def get_links(self, url, queue):
+        """Returns new copies of the links found in a page the last time it was parsed.
+
+        Args:
+            url (str): url of the page.
+            queue (Queue): queue of the current synchronization, used by the copies.
+
+        Returns:
+            list: the links.
+
+        """
+
+        with self.lock:
+            templates = list(self.links.get(normalize_url(url), []))
+
+        links = []
+
+        for template in templates:
+            link = copy(template)
+            link.subfolders = list(template.subfolders)
+            link.queue = queue
+            links.append(link)
+
+        return links
+
+    def clear(self):
+        """Forgets all the hashes, so every page is parsed again."""
+        with self.lock:
+            self.hashes.clear()
+            self.links.clear()
+
+
+VISITED = VisitedSet()
+PAGES = PageHashes()
@@ -1,21 +1,29 @@
 """Contains the links that can be downloaded."""
+import json
 import logging
 import os
 import random
 import unidecode
-import warnings
 
 from _sha1 import sha1
+from concurrent.futures import ThreadPoolExecutor
 from queue import Queue
+from threading import get_ident
+from urllib.parse import parse_qs, urljoin, urlsplit
 
 from bs4 import BeautifulSoup
 from requests import Response
 
-from ._requests import Downloader
-from .alias import Alias
+from ._requests import Downloader, DownloaderError
+from .alias import Alias, IdError
+from .cancellation import CANCELLATION
+from .content_types import CONTENT_TYPES, MAGIC_SIZE, PARSE, SKIP
 from .filecache import REAL_FILE_CACHE
+from .frontier import PAGES, VISITED, normalize_url, strip_token
 from .options import Options
+from .parsers import make_strainer, parse_html
 from .results import Results
+from .stores import FORUM_MARKERS, VALIDATORS, WRAPPERS, Validator
 from .utils import secure_filename
 
 
@@ -28,8 +36,185 @@ class DownloadsRecorder:
             fh.write(something % args + '\n')
 
 
+class PartFile:
+    """Partial download of a file, written to `<filepath>.part`.
+
+    A sidecar file (`<filepath>.part.json`) keeps the validator of the response that is being
+    saved, so if the transfer is interrupted the next execution can resume it with a range
+    request. The length and the sha1 of the content are computed while writing.
+    """
+
+    def __init__(self, filepath):
+        """
+        Args:
+            filepath (str): final path of the file. The part file is created in the same folder,
+                so it can be moved to the filepath atomically.
+        """
+
+        self.filepath = filepath
+        self.path = filepath + '.part'
+        self.sidecar_path = self.path + '.json'
+        self.file_handler = None
+        self.length = 0
+        self.hash = sha1()
+
+    def get_size(self):
+        """Returns the number of bytes already downloaded."""
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def load_validator(self):
+        """Returns the validator saved in the sidecar, or None if it can not be read."""
+        try:
+            with open(self.sidecar_path, encoding='utf-8') as file_handler:
+                return Validator(**json.load(file_handler))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def get_resume_headers(self, url):
+        """Returns the headers of a range request for the content that is not in the part file.
+
+        The part file can only be resumed if it was downloaded from the same url and the sidecar
+        has a validator (a strong ETag or, if the server did not send ETags, the Last-Modified
+        date). The validator is sent in the If-Range header, so the server answers with the rest
+        of the content only if it did not change, and with the full content otherwise.
+
+        Args:
+            url (str): url of the file.
+
+        Returns:
+            dict: the headers, or None if the file must be downloaded from the start.
+
+        """
+
+        size = self.get_size()
+        validator = self.load_validator()
+
+        if not size or validator is None or validator.url != url:
+            return None
+
+        if validator.etag:
+            if validator.etag.startswith('W/'):
+                return None
+        elif not validator.last_modified:
+            return None
+
+        return self.get_range_headers(size)
+
+    def get_range_headers(self, offset):
+        """Returns the headers to request the content after `offset`, only if it did not
+        change."""
+        validator = self.load_validator()
+        return {'Range': f'bytes={offset}-',
+                'If-Range': validator.etag or validator.last_modified}
+
+    @staticmethod
+    def is_range_response(response, offset):
+        """Checks if the response contains the content after `offset`."""
+        return response.status_code == 206 and \
+            response.headers.get('Content-Range', '').startswith(f'bytes {offset}-')
+
+    def open(self, url, response, offset=0):
+        """Opens the part file to write the body of the response.
+
+        Args:
+            url (str): url of the file.
+            response (requests.Response): response that will be written.
+            offset (int): if it is not 0, the body is appended to the bytes already downloaded.
+
+        """
+
+        if offset:
+            self.hash_content()
+            self.file_handler = open(self.path, 'ab')
+            return
+
+        validator = Validator.from_response(url, response, None, self.filepath)
+        with open(self.sidecar_path, 'wt', encoding='utf-8') as file_handler:
+            json.dump(validator.to_json(), file_handler)
+
+        self.file_handler = open(self.path, 'wb')
+
+    def hash_content(self):
+        """Computes the length and the sha1 of the content already in the part file."""
+        self.length = 0
+        self.hash = sha1()
+
+        with open(self.path, 'rb') as file_handler:
+            for chunk in iter(lambda: file_handler.read(Options.CHUNK_SIZE), b''):
+                self.hash.update(chunk)
+                self.length += len(chunk)
+
+    def allocate(self, length):
+        """Creates the part file with its final length, so its segments can be written in
+        place. A segmented part file can not be resumed, so it has no sidecar."""
+        self.remove(self.sidecar_path)
+
+        with open(self.path, 'wb') as file_handler:
+            file_handler.truncate(length)
+
+    def open_segment(self, start):
+        """Returns a new file handler of the part file, positioned at `start`."""
+        file_handler = open(self.path, 'r+b')
+        file_handler.seek(start)
+        return file_handler
+
+    @staticmethod
+    def split(length, segments):
+        """Splits a content of `length` bytes in ranges of similar size.
+
+        Returns:
+            list: tuples with the first and the last byte of each range.
+
+        """
+
+        size = -(-length // segments)
+        return [(start, min(start + size, length) - 1) for start in range(0, length, size)]
+
+    def write(self, chunk):
+        self.file_handler.write(chunk)
+        self.hash.update(chunk)
+        self.length += len(chunk)
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+    def close(self):
+        if self.file_handler is not None:
+            self.file_handler.close()
+
+    def finish(self):
+        """Closes the part file once the transfer is complete. The sidecar is no longer needed."""
+        self.close()
+        self.remove(self.sidecar_path)
+
+    def abort(self):
+        """Closes the part file after an error. The part file is kept if it can be resumed."""
+        self.close()
+
+        validator = self.load_validator()
+        if validator is None or not (validator.etag or validator.last_modified):
+            self.remove(self.path)
+            self.remove(self.sidecar_path)
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
 class BaseLink:
-    """Base class for Links."""
+    """Base class for Links.
+
+    Subclasses can set `PARSE_ONLY` to the elements of the page they use, so the rest of the
+    page is not parsed.
+    """
+
+    PARSE_ONLY = None
 
     def __init__(self, name, url, subject, downloader, queue):
         """
@@ -52,12 +237,27 @@ class BaseLink:
         self.filepath: str = None
         self.redirect_url = None
         self.response_name = None
+        self.content_hash = None
+        self.downloaded_bytes = 0
+        self.validator = None
+        # Range headers to resume the part file left by an interrupted transfer, if any.
+        self.resume_headers = None
         self.subfolders = []
 
+        # If deferred_save is True, save_response_content does not read the body. It sets
+        # pending_save instead, so the caller can stream it (used by the asyncio engine).
+        self.deferred_save = False
+        self.pending_save = False
+
         self.logger = logging.getLogger(__name__)
         self.logger.debug('Created %s(name=%r, url=%r, subject=%r)',
                           self.__class__.__name__, self.name, self.url, self.subject.name)
 
+    @property
+    def alias_url(self):
+        """Url that identifies the file of the link in the alias database."""
+        return self.url
+
     @property
     def content_disposition(self):
         if self.response is None:
@@ -138,30 +338,158 @@ class BaseLink:
         """Creates the subject's principal folder."""
         return self.subject.create_folder()
 
+    @property
+    def request_url(self):
+        return self.redirect_url or self.url
+
+    def prepare_request(self):
+        """Prepares the state needed to make the request. Can be overridden by subclasses."""
+
+    def skip_request(self):
+        """Returns True if the link does not need to be requested. Can be overridden by
+        subclasses."""
+        return False
+
     def make_request(self):
-        """Makes the request for the Link."""
+        """Makes the request for the Link.
+
+        The request is streamed, so the body is not read until it is needed. Links that parse
+        the response read it through `response.text`, resources stream it straight to disk.
+        """
 
         self.logger.debug('Making request')
 
-        self.response = self.downloader.get(self.redirect_url or self.url, timeout=Options.TIMEOUT)
+        self.response = self.downloader.get(self.request_url, timeout=Options.TIMEOUT,
+                                            stream=True, validator=self.validator,
+                                            headers=self.resume_headers)
+
+        if self.resume_rejected():
+            self.response = self.downloader.get(self.request_url, timeout=Options.TIMEOUT,
+                                                stream=True)
 
         self.logger.debug('Response obtained [%d]', self.response.status_code)
+        self.check_response()
+
+    def prepare_resume(self):
+        """Looks for the part file left by an interrupted transfer, so the request only asks
+        for the content that is missing. The alias database records the filepath before the
+        transfer starts, so the part file can be found before making the request."""
+
+        self.resume_headers = None
+
+        try:
+            filepath = Alias.get_alias_from_id(sha1(self.alias_url.encode()).hexdigest())
+        except IdError:
+            return
+
+        self.resume_headers = PartFile(filepath).get_resume_headers(self.url)
+
+        if self.resume_headers is not None:
+            # The file in the disk is older than the part file, it can not be validated.
+            self.validator = None
+
+    def resume_rejected(self):
+        """Checks if the server rejected the range of a resumed transfer (416). If so, the
+        response is closed and the file must be requested again from the start.
+
+        Returns:
+            bool: True if the file must be requested again.
+
+        """
+
+        if self.resume_headers is None or self.response.status_code != 416:
+            return False
+
+        self.logger.info('Could not resume %r [416], downloading it again', self.url)
+        self.close_connection()
+        self.resume_headers = None
+        return True
+
+    def page_changed(self):
+        """Checks if the page changed since the last synchronization. Unchanged pages are not
+        parsed again: the links found in them the last time are put in the queue instead, so
+        the ones that failed are retried and the conditional requests of the resources find
+        out which ones changed.
+
+        Returns:
+            bool: True if the page must be parsed.
+
+        """
+
+        if PAGES.update(self.url, self.response.content):
+            return True
+
+        self.logger.debug('Page not changed since the last synchronization: %s', self.url)
+        self.close_connection()
+
+        for link in PAGES.get_links(self.url, self.queue):
+            self.queue.put(link)
+
+        return False
+
+    def queue_link(self, link):
+        """Puts in the queue a link found in the page, recording it with the page so it can be
+        processed again while the page does not change (see `page_changed`)."""
+        PAGES.add_link(self.url, link)
+        self.queue.put(link)
+
+    def claim_final_url(self):
+        """Marks the url the request was redirected to as visited.
+
+        Returns:
+            bool: False if other link already processed that url, True otherwise.
+
+        """
+
+        final_url = self.response.url if self.response is not None else None
+
+        if not final_url or normalize_url(final_url) == normalize_url(self.url):
+            return True
+
+        if VISITED.add(final_url):
+            return True
+
+        self.logger.debug('Redirected to an url already processed, skipping: %s',
+                          strip_token(final_url))
+        self.close_connection()
+        return False
+
+    def check_response(self):
+        """Checks the response before processing it.
+
+        Raises:
+            DownloaderError: if the server answered with a 408 after all the retries.
+
+        """
 
         if self.response.status_code == 408:
-            self.logger.warning('Received response with code 408, retrying')
-            return self.make_request()
+            self.logger.error('Received response with code 408 after all the retries')
+            self.close_connection()
+            raise DownloaderError('request timeout (408)')
+
+    def body_required(self):
+        """Returns True if the body of the response is needed to process it."""
+        return True
+
+    def process_response(self):
+        """Abstract method to process the response. Must be overridden by subclasses."""
+        raise NotImplementedError
 
     def close_connection(self):
-        warnings.warn('Since streams are not used, this method should not be called',
-                      DeprecationWarning)
+        """Closes the response, discarding the part of the body that has not been read. Does
+        nothing if there is no response (the link was requeued after a redirect)."""
+        if self.response is None:
+            return
+
         self.logger.debug('Closing connection')
         self.response.close()
 
     def process_request_bs4(self):
-        """Parses the response with BeautifulSoup with the html parser."""
+        """Parses the response with the fastest HTML parser available (see `vcd.parsers`).
+        Only the elements matched by `PARSE_ONLY` are parsed, if it is set."""
 
         self.logger.debug('Parsing response (bs4)')
-        self.soup = BeautifulSoup(self.response.text, 'html.parser')
+        self.soup = parse_html(self.response.text, parse_only=self.PARSE_ONLY)
         self.logger.debug('Response parsed (bs4)')
 
     def autoset_filepath(self):
@@ -171,7 +499,7 @@ class BaseLink:
             self.logger.debug('Filepath is setted, skipping (%s)', self.filepath)
             return
 
-        if self.response is None:
+        if self.response is None and self.response_name is None:
             raise RuntimeError('Request not launched')
 
         filename = self._process_filename(self.name) + '.' + self._get_ext_from_response()
@@ -187,7 +515,8 @@ class BaseLink:
 
         self.filepath = os.path.normpath(os.path.join(Options.ROOT_FOLDER, self.filepath))
 
-        self.filepath = Alias.real_to_alias(sha1(self.url.encode()).hexdigest(), self.filepath)
+        self.filepath = Alias.real_to_alias(sha1(self.alias_url.encode()).hexdigest(),
+                                            self.filepath)
 
         self.logger.debug('Set filepath: %r', self.filepath)
 
@@ -197,62 +526,285 @@ class BaseLink:
         raise NotImplementedError
 
     def get_header_length(self):
+        """Returns the length of the content declared in the headers, or None if the server did
+        not send it. The body of a range response (206) is only part of the content, so its
+        length is taken from the Content-Range header."""
         try:
+            if self.response.status_code == 206:
+                return int(self.response.headers['Content-Range'].split('/')[-1])
+
             return int(self.response.headers['Content-Length'])
-        except KeyError:
-            return len(self.response.content)
+        except (KeyError, ValueError):
+            return None
 
     @property
     def content_type(self):
-        if 'Content-Type' in self.response.headers:
+        if self.response is not None and 'Content-Type' in self.response.headers:
             return self.response.headers['Content-Type']
 
         return None
 
-    def save_response_content(self):
-        """Saves the response content to the disk."""
+    def stream_to_partfile(self):
+        """Streams the response body to the part file of the filepath.
+
+        If a previous execution left part of the file in the disk, the request was already a
+        range request (see `prepare_resume`), so the body is appended to the part file. The body
+        is written in chunks of `Options.CHUNK_SIZE` bytes, so the memory used does not depend on
+        the size of the file.
+
+        Returns:
+            tuple: path of the part file and length of the content.
+
+        """
+
+        part = PartFile(self.filepath)
+        offset = 0
+
+        if self.resume_headers is not None:
+            offset = self.check_range_response(part, part.get_size())
+
+            if offset is None:
+                self.close_connection()
+                self.response = self.downloader.get(self.request_url, timeout=Options.TIMEOUT,
+                                                    stream=True)
+                offset = 0
+
+        elif self.can_split():
+            try:
+                return self.stream_segments(part)
+            except (DownloaderError, OSError) as ex:
+                self.logger.warning('Segmented download of %r failed (%r), downloading it '
+                                    'in one request', self.filepath, ex)
+                self.response = self.downloader.get(self.request_url, timeout=Options.TIMEOUT,
+                                                    stream=True)
+
+        try:
+            part.open(self.url, self.response, offset)
+            for chunk in self.response.iter_content(chunk_size=Options.CHUNK_SIZE):
+                CANCELLATION.check()
+                self.downloader.bandwidth.consume(len(chunk))
+                part.write(chunk)
+        except BaseException:
+            part.abort()
+            raise
+        finally:
+            self.close_connection()
+
+        part.finish()
+        self.content_hash = part.hexdigest()
+        self.logger.debug('Streamed %d bytes to %r (sha1=%s)', part.length, part.path,
+                          self.content_hash)
+        return part.path, part.length
+
+    def get_if_range(self):
+        """Returns the value of the If-Range header that makes a range request fail if the
+        content changed, or None if the response does not have a strong validator."""
+        etag = self.response.headers.get('ETag')
+
+        if etag:
+            return None if etag.startswith('W/') else etag
+
+        return self.response.headers.get('Last-Modified')
+
+    def can_split(self):
+        """Returns True if the response is large enough to be downloaded in segments and the
+        server supports it."""
+        length = self.get_header_length()
+
+        return Options.SEGMENTS > 1 and self.response.status_code == 200 \
+            and length is not None and length >= Options.SEGMENT_THRESHOLD \
+            and self.response.headers.get('Accept-Ranges', '').lower() == 'bytes' \
+            and self.get_if_range() is not None
+
+    def stream_segments(self, part):
+        """Downloads the content in `Options.SEGMENTS` ranges at the same time. Each range is
+        written in place in the preallocated part file.
+
+        Returns:
+            tuple: path of the part file and length of the content.
+
+        Raises:
+            DownloaderError: if any of the segments could not be downloaded.
+
+        """
+
+        length = self.get_header_length()
+        segments = part.split(length, Options.SEGMENTS)
+        if_range = self.get_if_range()
+
+        self.logger.debug('Downloading %r in %d segments (%d bytes)', self.filepath,
+                          len(segments), length)
+        self.close_connection()
+        part.allocate(length)
+
+        try:
+            with ThreadPoolExecutor(len(segments), thread_name_prefix='segment') as executor:
+                futures = [executor.submit(self.download_segment, part, start, end, if_range,
+                                           get_ident())
+                           for start, end in segments]
+
+                for future in futures:
+                    future.result()
+        except BaseException:
+            part.abort()
+            raise
+
+        part.hash_content()
+        part.finish()
+        self.content_hash = part.hexdigest()
+        self.logger.debug('Streamed %d bytes to %r in %d segments (sha1=%s)', part.length,
+                          part.path, len(segments), self.content_hash)
+        return part.path, part.length
+
+    def download_segment(self, part, start, end, if_range, worker=None):
+        """Downloads the bytes from `start` to `end` (both included) to the part file. The
+        segments share the bandwidth limit of the `worker` thread that splits the file."""
+        response = self.downloader.get(self.request_url, timeout=Options.TIMEOUT, stream=True,
+                                       headers={'Range': f'bytes={start}-{end}',
+                                                'If-Range': if_range})
+
+        try:
+            if not part.is_range_response(response, start):
+                raise DownloaderError(f'invalid response for segment {start}-{end} '
+                                      f'[{response.status_code}]')
+
+            with part.open_segment(start) as file_handler:
+                for chunk in response.iter_content(chunk_size=Options.CHUNK_SIZE):
+                    CANCELLATION.check()
+                    self.downloader.bandwidth.consume(len(chunk), worker)
+                    file_handler.write(chunk)
+
+                if file_handler.tell() != end + 1:
+                    raise DownloaderError(f'incomplete segment {start}-{end}')
+        finally:
+            response.close()
+
+    def check_range_response(self, part, offset):
+        """Checks the response of a range request.
+
+        Returns:
+            int: the offset where the body of the response starts (0 if the server sent the full
+                content), or None if the response can not be used and the file must be
+                requested again.
+
+        """
+
+        if part.is_range_response(self.response, offset):
+            self.logger.info('Resuming download of %r from byte %d', self.filepath, offset)
+            return offset
+
+        self.logger.info('Could not resume %r [%d], downloading it again', self.filepath,
+                         self.response.status_code)
+
+        if self.response.status_code == 200:
+            return 0
+
+        return None
+
+    def prepare_save(self):
+        """Sets the filepath and checks if the body of the response must be saved.
+
+        Returns:
+            bool: False if the file in the disk has the length declared by the server, so the
+                body does not need to be read. True otherwise.
+
+        """
+
         if self.filepath is None:
             self.autoset_filepath()
 
         self.create_subject_folder()
         self.create_subfolder()
 
+        header_length = self.get_header_length()
         self.logger.debug('filepath in REAL_FILE_CACHE: %s', self.filepath in REAL_FILE_CACHE)
 
+        if self.filepath in REAL_FILE_CACHE and REAL_FILE_CACHE[self.filepath] == header_length:
+            self.logger.debug('File found in cache: Same content (%d)', header_length)
+            self.close_connection()
+            VALIDATORS.update(self.url, self.response, header_length, self.filepath)
+            return False
+
+        return True
+
+    def finish_save(self, part_path, length):
+        """Moves the part file with the body to the filepath, if the content changed.
+
+        Args:
+            part_path (str): path of the part file.
+            length (int): length of the body.
+
+        """
+
+        self.downloaded_bytes = length
+
         if self.filepath in REAL_FILE_CACHE:
-            if REAL_FILE_CACHE[self.filepath] == self.get_header_length():
-                self.logger.debug('File found in cache: Same content (%d)',
-                                  len(self.response.content))
+            if REAL_FILE_CACHE[self.filepath] == length:
+                self.logger.debug('File found in cache: Same content (%d)', length)
+                os.remove(part_path)
+                VALIDATORS.update(self.url, self.response, length, self.filepath)
                 return
 
             self.logger.debug('File found in cache: Different content (%d --> %d)',
-                              REAL_FILE_CACHE[self.filepath], len(self.response.content))
+                              REAL_FILE_CACHE[self.filepath], length)
             Results.print_updated(f'File updated: {self.filepath}')
         else:
-            self.logger.debug('File added to cache: %s [%d]', self.filepath,
-                              len(self.response.content))
-            REAL_FILE_CACHE[self.filepath] = len(self.response.content)
+            self.logger.debug('File added to cache: %s [%d]', self.filepath, length)
             Results.print_new(f'New file: {self.filepath}')
 
         try:
-            with open(self.filepath, 'wb') as file_handler:
-                file_handler.write(self.response.content)
+            os.replace(part_path, self.filepath)
+            REAL_FILE_CACHE[self.filepath] = length
+            VALIDATORS.update(self.url, self.response, length, self.filepath)
             self.logger.debug('File downloaded and saved: %s', self.filepath)
             DownloadsRecorder.write('Downloaded %s -- %s', self.subject.name,
                                     os.path.basename(self.filepath))
         except PermissionError:
-            self.logger.warning('File couldn\'t be downloaded due to permission error: %s',
-                                os.path.basename(self.filepath))
-            self.logger.warning('Permission error %s -- %s', self.subject.name,
-                                os.path.basename(self.filepath))
+            os.remove(part_path)
+            self.log_permission_error()
+
+    def log_permission_error(self):
+        self.logger.warning('File couldn\'t be downloaded due to permission error: %s',
+                            os.path.basename(self.filepath))
+        self.logger.warning('Permission error %s -- %s', self.subject.name,
+                            os.path.basename(self.filepath))
+
+    def save_response_content(self):
+        """Saves the response content to the disk.
+
+        The content is streamed to a part file and then moved to the filepath, so a partial
+        transfer never replaces a complete file.
+        """
+
+        if not self.prepare_save():
+            return
+
+        if self.deferred_save:
+            self.pending_save = True
+            return
+
+        try:
+            part_path, length = self.stream_to_partfile()
+        except PermissionError:
+            self.log_permission_error()
+            return
+
+        self.finish_save(part_path, length)
 
 
 class Resource(BaseLink):
     """Representation of a resource."""
 
+    # The name and the object, iframe or link of the file are in the main region of the
+    # wrapper, so its navigation and blocks are not parsed.
+    PARSE_ONLY = make_strainer('div', role='main')
+
     def __init__(self, name, url, subject, downloader: Downloader, queue: Queue):
         super().__init__(name, url, subject, downloader, queue)
         self.resource_type = 'unknown'
+        self.identified_type = None
+        # Url of the html wrapper, if this resource was resolved from the wrappers cache.
+        self.wrapper_url = None
 
     def set_resource_type(self, new):
         """Sets a new resource type.
@@ -266,99 +818,279 @@ class Resource(BaseLink):
         if self.resource_type == 'html':
             self.process_request_bs4()
 
+    def prepare_request(self):
+        """Looks for a validator to make a conditional request, or for a part file to resume."""
+        self.validator = VALIDATORS.get_validator(self.url)
+        self.prepare_resume()
+
+    def body_required(self):
+        """Only HTML resources need the body to be processed, the rest are streamed to disk."""
+        entry = CONTENT_TYPES.resolve(self.content_type)
+        return entry is not None and entry.action == PARSE
+
+    def _get_ext_from_response(self):
+        """Returns the extension of the filename of the response or, if it does not have one,
+        the extension of its content type. Files already saved as 'ukn' keep that extension,
+        because the alias database maps their id to that path."""
+        ext = super()._get_ext_from_response()
+
+        if ext == 'ukn' and not self.saved_as_unknown():
+            entry = self.identified_type or CONTENT_TYPES.resolve(self.content_type)
+            if entry is not None and entry.extension:
+                return entry.extension
+
+        return ext
+
+    def saved_as_unknown(self):
+        """Returns True if the resource was saved with the 'ukn' extension, before the
+        extension was taken from the content type."""
+        try:
+            real = Alias.get_real_from_id(sha1(self.alias_url.encode()).hexdigest())
+        except IdError:
+            return False
+
+        return real.endswith('.ukn')
+
     def download(self):
         """Downloads the resource."""
         self.logger.debug('Downloading resource %s', self.name)
+
+        if self.resolve_cached_wrapper():
+            return None
+
+        self.prepare_request()
+
+        if Options.PROBE and not self.probe():
+            return None
+
         self.make_request()
 
+        if not self.claim_final_url():
+            return None
+
+        return self.process_response()
+
+    def process_response(self):
+        """Saves, parses or discards the response depending on its status and content type."""
+
+        if self.response.status_code == 304:
+            return self.handle_not_modified()
+
+        if self.response.status_code >= 400 and self.wrapper_url is not None:
+            return self.resolve_wrapper_again()
+
         if self.response.status_code == 404:
             self.logger.error('status code of 404 in url %r [%r]', self.url, self.name)
+            self.close_connection()
             return None
 
-        if 'application/pdf' in self.content_type:
-            self.set_resource_type('pdf')
-            return self.save_response_content()
+        # The asynchronous engine can not make the sniff request from here.
+        entry = self.identify_content(sniff=not self.deferred_save)
 
-        if 'officedocument.wordprocessingml.document' in self.content_type:
-            self.set_resource_type('word')
-            return self.save_response_content()
+        if entry is None and self.response.status_code % 300 < 100:
+            self.url = self.response.headers['Location']
+            self.logger.warning('Redirecting to %r', strip_token(self.url))
+            self.close_connection()
+            self.response = None
+            self.response_name = None
+            self.queue.put(self)
+            return None
 
-        if 'officedocument.spreadsheetml.sheet' in self.content_type:
-            self.set_resource_type('excel')
-            return self.save_response_content()
+        if entry is None:
+            self.logger.error('Content not identified: %r (code=%s, header=%r)',
+                              self.url, self.response.status_code, self.response.headers)
+            self.close_connection()
+            return None
 
-        if 'officedocument.presentationml.slideshow' in self.content_type:
-            self.set_resource_type('power-point')
-            return self.save_response_content()
+        if entry.action == SKIP:
+            self.logger.info('Skipped resource %r: content type %r is skipped', self.url,
+                             self.content_type)
+            self.close_connection()
+            return None
 
-        if 'presentationml.presentation' in self.content_type:
-            self.set_resource_type('power-point')
-            return self.save_response_content()
+        if entry.action == PARSE:
+            return self.parse_html()
 
-        if 'powerpoint' in self.content_type:
-            self.set_resource_type('power-point')
-            return self.save_response_content()
+        self.set_resource_type(entry.resource_type)
+        return self.save_response_content()
 
-        if 'msword' in self.content_type:
-            self.set_resource_type('word')
-            return self.save_response_content()
+    def get_response_filename(self):
+        """Returns the filename of the response, from the Content-Disposition header or the
+        url."""
+        try:
+            return Options.FILENAME_PATTERN.search(self.content_disposition).group(1)
+        except (KeyError, AttributeError):
+            return os.path.basename(urlsplit(self.request_url).path)
 
-        if 'application/zip' in self.content_type:
-            self.set_resource_type('zip')
-            return self.save_response_content()
+    def identify_content(self, sniff=False):
+        """Identifies the content of the response with the registry of content types (see
+        `vcd.content_types`).
 
-        if 'application/g-zip' in self.content_type:
-            self.set_resource_type('gzip')
-            return self.save_response_content()
+        The Content-Type header is used first. If it does not identify the content of a
+        successful response, it is guessed from the filename and then, if `sniff` is True, from
+        its first bytes.
 
-        if 'application/x-7z-compressed' in self.content_type:
-            self.set_resource_type('7zip')
-            return self.save_response_content()
+        Returns:
+            ContentType: the ContentType of the response, or None if it is not identified.
 
-        if 'x-rar-compressed' in self.content_type:
-            self.set_resource_type('rar')
-            return self.save_response_content()
+        """
 
-        if 'text/plain' in self.content_type:
-            self.set_resource_type('plain')
-            return self.save_response_content()
+        entry = CONTENT_TYPES.resolve(self.content_type)
 
-        if 'application/json' in self.content_type:
-            self.set_resource_type('json')
-            return self.save_response_content()
+        if entry is not None or self.response.status_code >= 300:
+            self.identified_type = entry
+            return entry
 
-        if 'application/octet-stream' in self.content_type:
-            self.set_resource_type('octect-stream')
-            return self.save_response_content()
+        entry = CONTENT_TYPES.resolve(None, self.get_response_filename())
 
-        if 'image/jpeg' in self.content_type:
-            self.set_resource_type('jpeg')
-            return self.save_response_content()
+        if entry is None and sniff:
+            entry = CONTENT_TYPES.resolve(None, content=self.sniff_content())
 
-        if 'image/png' in self.content_type:
-            self.set_resource_type('png')
-            return self.save_response_content()
+        self.identified_type = entry
+        return entry
 
-        if 'video/mp4' in self.content_type:
-            self.set_resource_type('mp4')
-            return self.save_response_content()
+    def sniff_content(self):
+        """Returns the first bytes of the resource, requested with a range request so the body
+        of the response is not consumed."""
+        self.logger.debug('Sniffing content type of %r', self.url)
+        response = self.downloader.get(self.request_url, timeout=Options.TIMEOUT, stream=True,
+                                       headers={'Range': f'bytes=0-{MAGIC_SIZE - 1}'})
 
-        if 'video/x-ms-wm' in self.content_type:
-            self.set_resource_type('avi')
-            return self.save_response_content()
+        try:
+            if response.status_code >= 300:
+                return b''
 
-        if 'text/html' in self.content_type:
-            self.set_resource_type('html')
-            return self.parse_html()
+            return response.raw.read(MAGIC_SIZE, decode_content=True)
+        finally:
+            response.close()
 
-        if self.response.status_code % 300 < 100:
-            self.url = self.response.headers['Location']
-            self.logger.warning('Redirecting to %r', self.url)
-            return self.download()
+    def make_probe_request(self):
+        """Makes a HEAD request for the resource. If the server does not support HEAD, a GET of
+        the first byte is made instead."""
 
-        self.logger.error('Content not identified: %r (code=%s, header=%r)',
-                          self.url, self.response.status_code, self.response.headers)
-        return None
+        self.logger.debug('Probing resource')
+        self.response = self.downloader.head(self.url, timeout=Options.TIMEOUT,
+                                             validator=self.validator)
+
+        if self.response.status_code in (405, 501):
+            self.logger.debug('HEAD not supported [%d], probing with range request',
+                              self.response.status_code)
+            self.response = self.downloader.get(self.url, timeout=Options.TIMEOUT, stream=True,
+                                                headers={'Range': 'bytes=0-0'},
+                                                validator=self.validator)
+            self.close_connection()
+
+        self.logger.debug('Probe response obtained [%d]', self.response.status_code)
+
+    def probe(self):
+        """Checks if the resource has to be downloaded without requesting its body.
+
+        Returns:
+            bool: True if the body must be downloaded, False otherwise.
+
+        """
+
+        self.make_probe_request()
+        return self.check_probe()
+
+    def check_probe(self):
+        """Compares the headers of the probe response with the file in the disk. Resources
+        whose content type is HTML are always downloaded, because they must be parsed, and the
+        ones whose content type is skipped are never downloaded.
+
+        Returns:
+            bool: True if the body must be downloaded, False otherwise.
+
+        """
+
+        if self.response.status_code == 304:
+            self.handle_not_modified()
+            return False
+
+        if self.response.status_code >= 400:
+            return True
+
+        entry = self.identify_content()
+
+        if entry is not None and entry.action == SKIP:
+            self.logger.info('Skipped resource %r (probe): content type %r is skipped',
+                             self.url, self.content_type)
+            return False
+
+        if self.content_type is None or (entry is not None and entry.action == PARSE):
+            return True
+
+        length = self.get_header_length()
+
+        if length is None:
+            return True
+
+        self.autoset_filepath()
+
+        if self.filepath in REAL_FILE_CACHE and REAL_FILE_CACHE[self.filepath] == length:
+            self.logger.debug('File found in cache (probe): Same content (%d)', length)
+            VALIDATORS.update(self.url, self.response, length, self.filepath)
+            return False
+
+        self.logger.debug('Probe: file must be downloaded (%s)', self.filepath)
+        return True
+
+    def handle_not_modified(self):
+        """Handles a 304 response to a conditional request: the file in disk is up to date."""
+        self.filepath = self.validator.filepath
+        self.logger.debug('File not modified (304), skipping: %s', self.filepath)
+        self.close_connection()
+
+    def queue_wrapped_resource(self, name, url, cached=False):
+        """Puts in the queue the resource wrapped by this HTML resource.
+
+        Args:
+            name (str): name of the wrapped resource.
+            url (str): url of the wrapped resource.
+            cached (bool): True if the wrapper was resolved in a previous execution. Otherwise
+                the resolution is saved for the next executions.
+
+        """
+
+        resource = Resource(name, url, self.subject, self.downloader, self.queue)
+
+        if cached:
+            resource.wrapper_url = self.url
+        else:
+            WRAPPERS.update(self.url, name, url)
+
+        self.logger.debug('Created resource from HTML: %r, %s', resource.name, resource.url)
+        self.subject.queue.put(resource)
+
+    def resolve_cached_wrapper(self):
+        """Puts in the queue the resource wrapped by this one, if the wrapper was resolved in a
+        previous execution, so it is not requested again.
+
+        Returns:
+            bool: True if the wrapped resource was put in the queue.
+
+        """
+
+        target = WRAPPERS.get_target(self.url)
+        if target is None:
+            return False
+
+        self.logger.debug('Wrapper resolved in a previous execution: %s -> %s', self.url,
+                          target['url'])
+        self.queue_wrapped_resource(target['name'], target['url'], cached=True)
+        return True
+
+    def resolve_wrapper_again(self):
+        """Forgets the cached resolution of the wrapper of this resource, because the resource
+        failed, and puts the wrapper in the queue to resolve it again."""
+        self.logger.warning('Resource of a cached wrapper failed [%d], resolving the wrapper '
+                            'again: %s', self.response.status_code, self.wrapper_url)
+        self.close_connection()
+        WRAPPERS.invalidate(self.wrapper_url)
+        VISITED.discard(self.wrapper_url)
+
+        wrapper = Resource(self.name, self.wrapper_url, self.subject, self.downloader, self.queue)
+        self.queue.put(wrapper)
 
     def parse_html(self):
         """Parses a HTML response."""
@@ -368,27 +1100,21 @@ class Resource(BaseLink):
         name = self.soup.find('div', {'role': 'main'}).h2.text
 
         try:
-            resource = Resource(name, resource['data'], self.subject, self.downloader, self.queue)
-            self.logger.debug('Created resource from HTML: %r, %s', resource.name, resource.url)
-            self.subject.queue.put(resource)
+            self.queue_wrapped_resource(name, resource['data'])
             return
         except TypeError:
             pass
 
         try:
             resource = self.soup.find('iframe', {'id': 'resourceobject'})
-            resource = Resource(name, resource['src'], self.subject, self.downloader, self.queue)
-            self.logger.debug('Created resource from HTML: %r, %s', resource.name, resource.url)
-            self.subject.queue.put(resource)
+            self.queue_wrapped_resource(name, resource['src'])
             return
         except TypeError:
             pass
 
         try:
             resource = self.soup.find('div', {'class': 'resourceworkaround'})
-            resource = Resource(name, resource.a['href'], self.subject, self.downloader, self.queue)
-            self.logger.debug('Created resource from HTML: %r, %s', resource.name, resource.url)
-            self.subject.queue.put(resource)
+            self.queue_wrapped_resource(name, resource.a['href'])
             return
         except TypeError:
             random_name = str(random.randint(0, 1000))
@@ -403,6 +1129,8 @@ class Resource(BaseLink):
 class Folder(BaseLink):
     """Representation of a folder."""
 
+    PARSE_ONLY = make_strainer('span', ['fp-filename-icon'])
+
     def make_folder(self):
         """Makes a subfolder to save the folder's links."""
         self.append_subfolder(self.name)
@@ -413,6 +1141,12 @@ class Folder(BaseLink):
         """Downloads the folder."""
         self.logger.debug('Downloading folder %s', self.name)
         self.make_request()
+
+        if self.page_changed():
+            self.process_response()
+
+    def process_response(self):
+        """Finds the files of the folder."""
         self.process_request_bs4()
         self.make_folder()
 
@@ -427,21 +1161,123 @@ class Folder(BaseLink):
 
                 self.logger.debug('Created resource from folder: %r, %s',
                                   resource.name, resource.url)
-                self.queue.put(resource)
+                self.queue_link(resource)
 
             except TypeError:
                 continue
 
 
 class Forum(BaseLink):
-    """Representation of a Forum link."""
+    """Representation of a Forum link.
+
+    The discussions whose marker in the listing (replies and last post) did not change since
+    they were processed are not requested again (see `FORUM_MARKERS`).
+    """
 
     BASE_DIR = 'foros'
 
+    def __init__(self, name, url, subject, downloader, queue):
+        super().__init__(name, url, subject, downloader, queue)
+        self.marker = None
+
     def download(self):
-        """Downloads the resources found in the forum hierarchy."""
+        """Downloads the resources found in the forum hierarchy. Discussions whose marker did
+        not change are not requested: only their attachments that were never saved are put in
+        the queue."""
         self.logger.debug('Downloading forum %s', self.name)
+
+        if self.skip_request():
+            return
+
         self.make_request()
+
+        if self.page_changed():
+            self.process_response()
+
+    def skip_request(self):
+        """Returns True if the marker of the discussion did not change, after putting in the
+        queue its attachments that are not saved."""
+        if self.marker is None or not FORUM_MARKERS.is_unchanged(self.url, self.marker):
+            return False
+
+        self.logger.debug('Discussion not changed since it was processed: %s', self.url)
+        self.queue_saved_attachments()
+        return True
+
+    @staticmethod
+    def get_marker(theme):
+        """Returns the marker of a discussion in the listing of the forum: its number of
+        replies and its last post, or None if the listing does not show them.
+
+        Args:
+            theme (bs4.element.Tag): cell of the discussion in the listing.
+
+        """
+
+        row = theme.find_parent('tr')
+        if row is None:
+            return None
+
+        cells = [row.find('td', {'class': cls}) for cls in ('replies', 'lastpost')]
+        texts = [' '.join(cell.text.split()) for cell in cells if cell is not None]
+        return ' | '.join(texts) or None
+
+    @staticmethod
+    def get_page(url):
+        """Returns the number of the page of a forum listing url."""
+        try:
+            return int(parse_qs(urlsplit(url).query).get('page', ['0'])[0])
+        except ValueError:
+            return 0
+
+    def queue_next_pages(self):
+        """Puts in the queue the next pages of a long forum listing."""
+        page = self.get_page(self.url)
+        urls = set()
+
+        containers = self.soup.findAll(['div', 'nav', 'ul'], {'class': ['paging', 'pagination']})
+
+        for container in containers:
+            for link in container.findAll('a', href=True):
+                url = urljoin(self.url, link['href'])
+
+                if 'view.php' in url and self.get_page(url) > page:
+                    urls.add(url)
+
+        for url in sorted(urls, key=self.get_page):
+            forum = Forum(self.name, url, self.subject, self.downloader, self.queue)
+            self.logger.debug('Created forum page from forum: %r, %s', forum.name, forum.url)
+            self.queue_link(forum)
+
+    def queue_saved_attachments(self):
+        """Puts in the queue the attachments of this unchanged discussion that were never
+        saved or are no longer in the disk, except the ones whose content type is skipped."""
+        subfolders, attachments = FORUM_MARKERS.get_attachments(self.url)
+
+        for name, attachment_url in attachments:
+            filepath = VALIDATORS.get(attachment_url, {}).get('filepath')
+
+            if filepath is not None and os.path.isfile(filepath):
+                continue
+
+            # Skipped resources are not saved, so they never get a validator.
+            filename = os.path.basename(urlsplit(attachment_url).path)
+            entry = CONTENT_TYPES.resolve(None, filename)
+
+            if entry is not None and entry.action == SKIP:
+                self.logger.debug('Skipped attachment of unchanged discussion: %s',
+                                  strip_token(attachment_url))
+                continue
+
+            resource = Resource(name, attachment_url, self.subject, self.downloader, self.queue)
+            resource.subfolders = list(subfolders)
+
+            self.logger.debug('Created resource from unchanged discussion: %r, %s',
+                              resource.name, resource.url)
+            self.queue.put(resource)
+
+    def process_response(self):
+        """Finds the themes of a forum or the attachments of a theme."""
         self.process_request_bs4()
 
         if len(self.subfolders) == 0 and Options.FORUMS_SUBFOLDERS:
@@ -455,14 +1291,18 @@ class Forum(BaseLink):
             for theme in themes:
                 forum = Forum(theme.text, theme.a['href'], self.subject, self.downloader,
                               self.queue)
+                forum.marker = self.get_marker(theme)
 
                 self.logger.debug('Created forum from forum: %r, %s', forum.name, forum.url)
-                self.queue.put(forum)
+                self.queue_link(forum)
+
+            self.queue_next_pages()
 
         elif 'discuss.php' in self.url:
             self.logger.debug('Forum is a theme discussion')
             attachments = self.soup.findAll('div', {'class': 'attachments'})
             images = self.soup.findAll('div', {'class': 'attachedimages'})
+            found = []
 
             for attachment in attachments:
                 try:
@@ -473,7 +1313,8 @@ class Forum(BaseLink):
 
                     self.logger.debug('Created resource from forum: %r, %s', resource.name,
                                       resource.url)
-                    self.queue.put(resource)
+                    self.queue_link(resource)
+                    found.append((resource.name, resource.url))
                 except TypeError:
                     pass
 
@@ -492,7 +1333,11 @@ class Forum(BaseLink):
 
                     self.logger.debug('Created resource (image) from forum: %r, %s',
                                       resource.name, resource.url)
-                    self.queue.put(resource)
+                    self.queue_link(resource)
+                    found.append((resource.name, resource.url))
+
+            if self.marker is not None:
+                FORUM_MARKERS.update(self.url, self.marker, self.subfolders, found)
 
         else:
             self.logger.critical('Unkown url for forum %r. Vars: %r', self.url, vars())
@@ -502,6 +1347,8 @@ class Forum(BaseLink):
 class Delivery(BaseLink):
     """Representation of a delivery link."""
 
+    PARSE_ONLY = make_strainer('a', target='_blank')
+
     def make_subfolder(self):
         """Makes a subfolder to save the folder's links."""
         self.append_subfolder(self.name)
@@ -512,6 +1359,12 @@ class Delivery(BaseLink):
         """Downloads the resources found in the delivery."""
         self.logger.debug('Downloading delivery %s', self.name)
         self.make_request()
+
+        if self.page_changed():
+            self.process_response()
+
+    def process_response(self):
+        """Finds the files of the delivery."""
         self.process_request_bs4()
         self.make_subfolder()
 
@@ -527,6 +1380,21 @@ class Delivery(BaseLink):
                               resource.url)
             links.append(resource)
 
+        self.rename_duplicates(links)
+
+        for link in links:
+            self.queue_link(link)
+
+    @staticmethod
+    def rename_duplicates(links):
+        """Numbers the links of a delivery that have the same name, in order: 'name_1',
+        'name_2'...
+
+        Args:
+            links (list): links of the delivery.
+
+        """
+
         names = [link.name for link in links]
         dupes = {x for x in names if names.count(x) > 1}
         dupes_counters = {x: 1 for x in dupes}
@@ -537,7 +1405,4 @@ class Delivery(BaseLink):
                     name = links[i].name
                     links[i].name += '_' + str(dupes_counters[name])
                     dupes_counters[name] += 1
-                    self.logger.debug('Changed name %r -> %r', name, links[i].name)
-
-        for link in links:
-            self.queue.put(link)
+                    links[i].logger.debug('Changed name %r -> %r', name, links[i].name)
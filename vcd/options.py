@@ -29,6 +29,30 @@ class Options:
     LOGGING_LEVEL = logging.DEBUG
 
     FORUMS_SUBFOLDERS = True
+    CHUNK_SIZE = 64 * 1024
+    PROBE = False
+    POOL_BLOCK = False
+    RETRY_BUDGET = 500
+    BACKOFF_FACTOR = 0.5
+    BACKOFF_MAX = 60
+    SEGMENTS = 4
+    SEGMENT_THRESHOLD = 32 * 1024 * 1024
+    MAX_PER_HOST = 0
+    RATE_LIMIT = 0
+    RATE_BURST = 10
+    ADAPTIVE_WORKERS = False
+    MIN_WORKERS = 5
+    MAX_WORKERS = 100
+    SHUTDOWN_TIMEOUT = 2
+    DEADLINES = {'subject': 120, 'discovery': 120, 'wrapper': 120, 'resource': 1800}
+    MAX_REQUEUES = 2
+    BANDWIDTH_LIMIT = 0
+    WORKER_BANDWIDTH_LIMIT = 0
+    CHECKPOINT_INTERVAL = 30
+    WATCH_INTERVAL = 15 * 60
+    HTML_PARSER = 'auto'
+    CONTENT_TYPES = {}
+    BACKEND = 'html'
 
     # Creators
 
@@ -74,6 +98,200 @@ class Options:
 
         Options.FORUMS_SUBFOLDERS = forums_subfolders
 
+    @staticmethod
+    def set_chunk_size(chunk_size):
+        chunk_size = int(chunk_size)
+        if chunk_size <= 0:
+            raise ValueError(f'chunk_size must be positive, not {chunk_size}')
+
+        Options.CHUNK_SIZE = chunk_size
+
+    @staticmethod
+    def set_probe(probe):
+        if not isinstance(probe, bool):
+            raise TypeError(f'probe must be bool, not {type(probe).__name__}')
+
+        Options.PROBE = probe
+
+    @staticmethod
+    def set_pool_block(pool_block):
+        if not isinstance(pool_block, bool):
+            raise TypeError(f'pool_block must be bool, not {type(pool_block).__name__}')
+
+        Options.POOL_BLOCK = pool_block
+
+    @staticmethod
+    def set_retry_budget(retry_budget):
+        retry_budget = int(retry_budget)
+        if retry_budget < 0:
+            raise ValueError(f'retry_budget must be positive or zero, not {retry_budget}')
+
+        Options.RETRY_BUDGET = retry_budget
+
+    @staticmethod
+    def set_backoff_factor(backoff_factor):
+        backoff_factor = float(backoff_factor)
+        if backoff_factor < 0:
+            raise ValueError(f'backoff_factor must be positive or zero, not {backoff_factor}')
+
+        Options.BACKOFF_FACTOR = backoff_factor
+
+    @staticmethod
+    def set_backoff_max(backoff_max):
+        backoff_max = float(backoff_max)
+        if backoff_max < 0:
+            raise ValueError(f'backoff_max must be positive or zero, not {backoff_max}')
+
+        Options.BACKOFF_MAX = backoff_max
+
+    @staticmethod
+    def set_segments(segments):
+        segments = int(segments)
+        if segments < 1:
+            raise ValueError(f'segments must be at least 1, not {segments}')
+
+        Options.SEGMENTS = segments
+
+    @staticmethod
+    def set_segment_threshold(segment_threshold):
+        segment_threshold = int(segment_threshold)
+        if segment_threshold <= 0:
+            raise ValueError(f'segment_threshold must be positive, not {segment_threshold}')
+
+        Options.SEGMENT_THRESHOLD = segment_threshold
+
+    @staticmethod
+    def set_max_per_host(max_per_host):
+        max_per_host = int(max_per_host)
+        if max_per_host < 0:
+            raise ValueError(f'max_per_host must be positive or zero, not {max_per_host}')
+
+        Options.MAX_PER_HOST = max_per_host
+
+    @staticmethod
+    def set_rate_limit(rate_limit):
+        rate_limit = float(rate_limit)
+        if rate_limit < 0:
+            raise ValueError(f'rate_limit must be positive or zero, not {rate_limit}')
+
+        Options.RATE_LIMIT = rate_limit
+
+    @staticmethod
+    def set_rate_burst(rate_burst):
+        rate_burst = int(rate_burst)
+        if rate_burst < 1:
+            raise ValueError(f'rate_burst must be at least 1, not {rate_burst}')
+
+        Options.RATE_BURST = rate_burst
+
+    @staticmethod
+    def set_adaptive_workers(adaptive_workers):
+        if not isinstance(adaptive_workers, bool):
+            raise TypeError(
+                f'adaptive_workers must be bool, not {type(adaptive_workers).__name__}')
+
+        Options.ADAPTIVE_WORKERS = adaptive_workers
+
+    @staticmethod
+    def set_workers_range(min_workers, max_workers):
+        min_workers = int(min_workers)
+        max_workers = int(max_workers)
+        if not 1 <= min_workers <= max_workers:
+            raise ValueError(f'Invalid workers range: {min_workers}-{max_workers}')
+
+        Options.MIN_WORKERS = min_workers
+        Options.MAX_WORKERS = max_workers
+
+    @staticmethod
+    def set_shutdown_timeout(shutdown_timeout):
+        shutdown_timeout = float(shutdown_timeout)
+        if shutdown_timeout < 0:
+            raise ValueError(f'shutdown_timeout must be positive or zero, not {shutdown_timeout}')
+
+        Options.SHUTDOWN_TIMEOUT = shutdown_timeout
+
+    @staticmethod
+    def set_deadline(kind, deadline):
+        if kind not in Options.DEADLINES:
+            raise ValueError(f'Invalid kind of task: {kind!r}')
+
+        deadline = float(deadline)
+        if deadline < 0:
+            raise ValueError(f'deadline must be positive or zero, not {deadline}')
+
+        Options.DEADLINES[kind] = deadline
+
+    @staticmethod
+    def set_max_requeues(max_requeues):
+        max_requeues = int(max_requeues)
+        if max_requeues < 0:
+            raise ValueError(f'max_requeues must be positive or zero, not {max_requeues}')
+
+        Options.MAX_REQUEUES = max_requeues
+
+    @staticmethod
+    def set_bandwidth_limit(bandwidth_limit):
+        bandwidth_limit = int(bandwidth_limit)
+        if bandwidth_limit < 0:
+            raise ValueError(f'bandwidth_limit must be positive or zero, not {bandwidth_limit}')
+
+        Options.BANDWIDTH_LIMIT = bandwidth_limit
+
+    @staticmethod
+    def set_worker_bandwidth_limit(worker_bandwidth_limit):
+        worker_bandwidth_limit = int(worker_bandwidth_limit)
+        if worker_bandwidth_limit < 0:
+            raise ValueError(f'worker_bandwidth_limit must be positive or zero, '
+                             f'not {worker_bandwidth_limit}')
+
+        Options.WORKER_BANDWIDTH_LIMIT = worker_bandwidth_limit
+
+    @staticmethod
+    def set_checkpoint_interval(checkpoint_interval):
+        checkpoint_interval = float(checkpoint_interval)
+        if checkpoint_interval < 0:
+            raise ValueError(
+                f'checkpoint_interval must be positive or zero, not {checkpoint_interval}')
+
+        Options.CHECKPOINT_INTERVAL = checkpoint_interval
+
+    @staticmethod
+    def set_watch_interval(watch_interval):
+        watch_interval = float(watch_interval)
+        if watch_interval <= 0:
+            raise ValueError(f'watch_interval must be positive, not {watch_interval}')
+
+        Options.WATCH_INTERVAL = watch_interval
+
+    @staticmethod
+    def set_html_parser(html_parser):
+        if html_parser not in ('auto', 'lxml', 'html.parser'):
+            raise ValueError(f'Invalid html parser: {html_parser!r}')
+
+        Options.HTML_PARSER = html_parser
+
+    @staticmethod
+    def set_backend(backend):
+        if backend not in ('html', 'webservice'):
+            raise ValueError(f'Invalid backend: {backend!r}')
+
+        Options.BACKEND = backend
+
+    @staticmethod
+    def set_content_type(content_type, value):
+        """Sets what to do with a content type: 'skip' to discard its resources, or
+        '<resource type> [extension]' to save them."""
+        parts = value.split()
+        if '/' not in content_type or not 1 <= len(parts) <= 2:
+            raise ValueError(f'Invalid content type {content_type!r}: {value!r}')
+
+        if parts == ['skip']:
+            entry = ('skipped', 'skip', None)
+        else:
+            entry = (parts[0], 'save', parts[1].lstrip('.') if len(parts) == 2 else None)
+
+        Options.CONTENT_TYPES[content_type.lower()] = entry
+
     @staticmethod
     def load_config():
         if Options._LOADED:
@@ -89,12 +307,86 @@ class Options:
             Options.set_logging_level(config.get('options', 'logging_level'))
             Options.set_forums_subfolders(config.getboolean('options', 'forums_subfolders'))
 
+            # Optional settings, added after the config file format was fixed.
+            Options.set_chunk_size(
+                config.get('options', 'chunk_size', fallback=Options.CHUNK_SIZE))
+            Options.set_probe(config.getboolean('options', 'probe', fallback=Options.PROBE))
+            Options.set_pool_block(
+                config.getboolean('options', 'pool_block', fallback=Options.POOL_BLOCK))
+            Options.set_retry_budget(
+                config.get('options', 'retry_budget', fallback=Options.RETRY_BUDGET))
+            Options.set_backoff_factor(
+                config.get('options', 'backoff_factor', fallback=Options.BACKOFF_FACTOR))
+            Options.set_backoff_max(
+                config.get('options', 'backoff_max', fallback=Options.BACKOFF_MAX))
+            Options.set_segments(config.get('options', 'segments', fallback=Options.SEGMENTS))
+            Options.set_segment_threshold(
+                config.get('options', 'segment_threshold', fallback=Options.SEGMENT_THRESHOLD))
+            Options.set_max_per_host(
+                config.get('options', 'max_per_host', fallback=Options.MAX_PER_HOST))
+            Options.set_rate_limit(
+                config.get('options', 'rate_limit', fallback=Options.RATE_LIMIT))
+            Options.set_rate_burst(
+                config.get('options', 'rate_burst', fallback=Options.RATE_BURST))
+            Options.set_adaptive_workers(config.getboolean(
+                'options', 'adaptive_workers', fallback=Options.ADAPTIVE_WORKERS))
+            Options.set_workers_range(
+                config.get('options', 'min_workers', fallback=Options.MIN_WORKERS),
+                config.get('options', 'max_workers', fallback=Options.MAX_WORKERS))
+            Options.set_shutdown_timeout(
+                config.get('options', 'shutdown_timeout', fallback=Options.SHUTDOWN_TIMEOUT))
+
+            for kind, deadline in Options.DEADLINES.items():
+                Options.set_deadline(
+                    kind, config.get('options', f'{kind}_deadline', fallback=deadline))
+
+            Options.set_max_requeues(
+                config.get('options', 'max_requeues', fallback=Options.MAX_REQUEUES))
+            Options.set_bandwidth_limit(
+                config.get('options', 'bandwidth_limit', fallback=Options.BANDWIDTH_LIMIT))
+            Options.set_worker_bandwidth_limit(config.get(
+                'options', 'worker_bandwidth_limit', fallback=Options.WORKER_BANDWIDTH_LIMIT))
+            Options.set_checkpoint_interval(config.get(
+                'options', 'checkpoint_interval', fallback=Options.CHECKPOINT_INTERVAL))
+            Options.set_watch_interval(
+                config.get('options', 'watch_interval', fallback=Options.WATCH_INTERVAL))
+            Options.set_html_parser(
+                config.get('options', 'html_parser', fallback=Options.HTML_PARSER))
+            Options.set_backend(config.get('options', 'backend', fallback=Options.BACKEND))
+
+            if config.has_section('content_types'):
+                for content_type, value in config.items('content_types'):
+                    Options.set_content_type(content_type, value)
+
         except (NoSectionError, NoOptionError):
             config['options'] = {
                 'root_folder': Options.ROOT_FOLDER,
                 'timeout': '30', 'log_folder': Options.LOGS_FOLDER,
                 'logging_level': logging.getLevelName(Options.LOGGING_LEVEL),
-                'forums_subfolders': Options.FORUMS_SUBFOLDERS
+                'forums_subfolders': Options.FORUMS_SUBFOLDERS,
+                'chunk_size': Options.CHUNK_SIZE,
+                'probe': Options.PROBE,
+                'pool_block': Options.POOL_BLOCK,
+                'retry_budget': Options.RETRY_BUDGET,
+                'backoff_factor': Options.BACKOFF_FACTOR,
+                'backoff_max': Options.BACKOFF_MAX,
+                'segments': Options.SEGMENTS,
+                'segment_threshold': Options.SEGMENT_THRESHOLD,
+                'max_per_host': Options.MAX_PER_HOST,
+                'rate_limit': Options.RATE_LIMIT,
+                'rate_burst': Options.RATE_BURST,
+                'adaptive_workers': Options.ADAPTIVE_WORKERS,
+                'min_workers': Options.MIN_WORKERS,
+                'max_workers': Options.MAX_WORKERS,
+                'shutdown_timeout': Options.SHUTDOWN_TIMEOUT,
+                **{f'{kind}_deadline': deadline for kind, deadline in Options.DEADLINES.items()},
+                'max_requeues': Options.MAX_REQUEUES,
+                'bandwidth_limit': Options.BANDWIDTH_LIMIT,
+                'worker_bandwidth_limit': Options.WORKER_BANDWIDTH_LIMIT,
+                'checkpoint_interval': Options.CHECKPOINT_INTERVAL,
+                'watch_interval': Options.WATCH_INTERVAL,
+                'html_parser': Options.HTML_PARSER,
+                'backend': Options.BACKEND
             }
             with open(Options._CONFIG_PATH, 'wt', encoding='utf-8') as fh:
                 config.write(fh)
@@ -0,0 +1,100 @@
+"""HTML parsing of the pages of the virtual campus.
+
+All the pages are parsed with BeautifulSoup, so the links work with the same tree whatever the
+parser is. lxml is used when it is installed, because it is several times faster than the
+pure python `html.parser`, which is the fallback.
+
+Pages can also be parsed partially: with a `bs4.SoupStrainer`, only the elements it matches
+(and their descendants) are added to the tree, which saves most of the CPU and memory spent
+building the tree of large pages.
+"""
+
+import logging
+import re
+from functools import lru_cache
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from .options import Options
+
+PARSERS = ('lxml', 'html.parser')
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def is_available(parser):
+    """Checks if a parser can be used.
+
+    Args:
+        parser (str): name of the parser.
+
+    Returns:
+        bool: True if its library is installed.
+
+    """
+
+    if parser == 'lxml':
+        try:
+            # noinspection PyUnresolvedReferences
+            import lxml  # pylint: disable=unused-import
+        except ImportError:
+            return False
+
+    return parser in PARSERS
+
+
+def get_parser():
+    """Returns the parser configured in `Options.HTML_PARSER`. If it is 'auto' or it is not
+    installed, the fastest parser available is returned."""
+    if Options.HTML_PARSER != 'auto':
+        if is_available(Options.HTML_PARSER):
+            return Options.HTML_PARSER
+
+        logger.warning('HTML parser %r is not installed, using the fastest available',
+                       Options.HTML_PARSER)
+
+    for parser in PARSERS:
+        if is_available(parser):
+            return parser
+
+    return 'html.parser'
+
+
+def make_strainer(names, classes=None, **attrs):
+    """Creates the filter of a partial parse.
+
+    While parsing, the strainer sees the class attribute as a single string, so the classes
+    are matched as words of it: 'topic' matches `class="topic starter"`.
+
+    Args:
+        names (str | list): names of the elements to parse.
+        classes (list): if given, the elements must have at least one of these classes.
+        **attrs: other attributes the elements must match.
+
+    Returns:
+        bs4.SoupStrainer: the filter, to be used as the `parse_only` argument of `parse_html`.
+
+    """
+
+    if classes:
+        pattern = '|'.join(re.escape(cls) for cls in classes)
+        attrs['class'] = re.compile(rf'(^|\s)({pattern})(\s|$)')
+
+    return SoupStrainer(names, attrs)
+
+
+def parse_html(markup, parser=None, parse_only=None):
+    """Parses a HTML page.
+
+    Args:
+        markup (str | bytes): content of the page.
+        parser (str): parser to use. Defaults to `get_parser()`.
+        parse_only (bs4.SoupStrainer): if given, only the elements it matches are parsed.
+
+    Returns:
+        bs4.BeautifulSoup: the tree of the page.
+
+    """
+
+    return BeautifulSoup(markup, parser or get_parser(), parse_only=parse_only)
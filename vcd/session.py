@@ -0,0 +1,208 @@
+"""Authenticated session of the virtual campus, persisted between executions."""
+
+import json
+import logging
+import os
+import time
+from threading import Lock
+from urllib.parse import urlsplit
+
+from colorama import Fore
+from requests.cookies import create_cookie
+
+from ._requests import DownloaderError
+from .credentials import Credentials
+
+
+class SessionStore:
+    """Saves the cookies of the session in a file only readable by the user."""
+    path = os.path.normpath(os.path.join(os.path.expanduser('~'), 'vcd-session.json'))
+
+    @staticmethod
+    def save(username, cookies):
+        """Saves the cookies of the user.
+
+        Args:
+            username (str): username of the user the cookies belong to.
+            cookies (requests.cookies.RequestsCookieJar): cookies to save.
+
+        """
+
+        data = {'username': username, 'cookies': [
+            {'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain,
+             'path': cookie.path, 'expires': cookie.expires, 'secure': cookie.secure}
+            for cookie in cookies]}
+
+        file_descriptor = os.open(SessionStore.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                                  0o600)
+        os.chmod(SessionStore.path, 0o600)
+
+        with open(file_descriptor, 'wt', encoding='utf-8') as file_handler:
+            json.dump(data, file_handler)
+
+    @staticmethod
+    def load(username, cookies):
+        """Loads the saved cookies of the user. Expired cookies are ignored.
+
+        Args:
+            username (str): username of the user.
+            cookies (requests.cookies.RequestsCookieJar): jar where the cookies are set.
+
+        Returns:
+            bool: True if any cookie was loaded.
+
+        """
+
+        try:
+            with open(SessionStore.path, encoding='utf-8') as file_handler:
+                data = json.load(file_handler)
+        except (OSError, ValueError):
+            return False
+
+        if not isinstance(data, dict) or data.get('username') != username:
+            return False
+
+        loaded = 0
+        for cookie in data.get('cookies', []):
+            if cookie['expires'] is not None and cookie['expires'] < time.time():
+                continue
+
+            cookies.set_cookie(create_cookie(**cookie))
+            loaded += 1
+
+        return loaded > 0
+
+    @staticmethod
+    def clear():
+        """Removes the saved session."""
+        try:
+            os.remove(SessionStore.path)
+        except FileNotFoundError:
+            pass
+
+
+class SessionManager:
+    """Logs in the virtual campus, reusing the saved session if it has not expired.
+
+    Once started, the manager is attached to the downloader, which asks it to log in again if a
+    response shows that the session expired in the middle of the execution.
+    """
+
+    BASE_URL = 'https://campusvirtual.uva.es'
+    LOGGED_TEXT = 'Vista general de cursos'
+
+    def __init__(self, downloader, base_url=None):
+        """
+        Args:
+            downloader (vcd._requests.Downloader): downloader whose session is managed.
+            base_url (str): url of the virtual campus.
+        """
+
+        self.logger = logging.getLogger(__name__)
+        self.downloader = downloader
+        self.base_url = base_url or self.BASE_URL
+        self.user = None
+        self.lock = Lock()
+        self.last_login = 0
+
+    @property
+    def login_url(self):
+        return self.base_url + '/login/index.php'
+
+    @property
+    def main_url(self):
+        return self.base_url + '/my/'
+
+    def is_logged(self, response):
+        """Checks if the response is the main page of a logged user."""
+        return self.LOGGED_TEXT in response.text
+
+    def is_expired(self, url, response):
+        """Checks if the server redirected a request to the login page.
+
+        Args:
+            url (str): url requested.
+            response (requests.Response): response of the server.
+
+        Returns:
+            bool: True if the session expired.
+
+        """
+
+        login_path = urlsplit(self.login_url).path
+        return urlsplit(url).path != login_path and urlsplit(response.url).path == login_path
+
+    def start(self):
+        """Restores the saved session or logs in if it expired.
+
+        Returns:
+            requests.Response: response of the main page of the user.
+
+        """
+
+        self.user = Credentials.get()
+        response = None
+
+        if SessionStore.load(self.user.username, self.downloader.cookies):
+            response = self.downloader.get(self.main_url, check_session=False)
+
+            if self.is_logged(response):
+                self.logger.info('Restored saved session')
+            else:
+                self.logger.info('Saved session expired')
+                self.downloader.cookies.clear()
+                response = None
+
+        if response is None:
+            response = self.login()
+
+        if response is None:
+            SessionStore.clear()
+            exit(Fore.RED + 'Login not correct' + Fore.RESET)
+
+        self.downloader.session_manager = self
+        return response
+
+    def login(self):
+        """Logs in the virtual campus and saves the session.
+
+        Returns:
+            requests.Response: response of the main page of the user, or None if the login
+                was not correct.
+
+        """
+
+        self.downloader.post(self.login_url, data={
+            'anchor': '', 'username': self.user.username, 'password': self.user.password})
+
+        response = self.downloader.get(self.main_url, check_session=False)
+        self.last_login = time.monotonic()
+
+        self.logger.debug('Returned primary response with code %d', response.status_code)
+        self.logger.debug('Login correct: %s', self.is_logged(response))
+
+        if not self.is_logged(response):
+            return None
+
+        SessionStore.save(self.user.username, self.downloader.cookies)
+        return response
+
+    def relogin(self, since):
+        """Logs in again after the session expired, unless other thread already did it.
+
+        Args:
+            since (float): monotonic time when the expired request was started.
+
+        Raises:
+            DownloaderError: if the login was not correct.
+
+        """
+
+        with self.lock:
+            if self.last_login > since:
+                return
+
+            self.logger.warning('Session expired, logging in again')
+
+            if self.login() is None:
+                raise DownloaderError('session expired and login was not correct')
@@ -7,18 +7,33 @@ from typing import List
 import flask
 import waitress
 
-from ._threading import Worker
+from ._requests import Downloader
+from ._threading import Worker, WorkerPool
 from .links import BaseLink
+from .options import Options
 from .subject import Subject
 from .time_operations import seconds_to_str
 
 logger = logging.getLogger(__name__)
 
+LOOPBACK = ('127.0.0.1', '::1')
 
-def runserver(queue: Queue, threadlist: List[Worker]):
-    t0 = time.time()
-    logger.info('STARTED STATUS SERVER')
 
+def rate_to_str(rate, limit=False):
+    """Returns a bandwidth in bytes per second readable by humans. Limits of 0 are shown as
+    unlimited."""
+    if limit and not rate:
+        return 'unlimited'
+
+    if rate >= 1024 * 1024:
+        return f'{rate / 1024 / 1024:.1f} MiB/s'
+    return f'{rate / 1024:.1f} KiB/s'
+
+
+def create_app(queue: Queue, threadlist: List[Worker], downloader: Downloader = None,
+               pool: WorkerPool = None):
+    """Creates the flask app of the status server."""
+    t0 = time.time()
     app = flask.Flask(__name__)
 
     @app.errorhandler(404)
@@ -60,6 +75,28 @@ def runserver(queue: Queue, threadlist: List[Worker]):
             # noinspection PyUnresolvedReferences
             status += f'tasks</a>: {queue.unfinished_tasks}<br>'
             status += f'Items left: {queue.qsize()}<br><br>'
+
+            if downloader is not None:
+                pool_stats = downloader.pool_stats.to_json()
+                status += f'Connections created: {pool_stats["created"]}<br>'
+                status += f'Connections reused: {pool_stats["reused"]}<br>'
+                status += f'Connections discarded: {pool_stats["discarded"]}<br>'
+
+                limiter_stats = downloader.limiter_stats.to_json()
+                status += f'Requests limited: {limiter_stats["waits"]} of ' \
+                    f'{limiter_stats["requests"]} (waited ' \
+                    f'{limiter_stats["wait_time"]:.1f} s, max {limiter_stats["max_wait"]:.1f} s)' \
+                    f'<br>'
+
+                bandwidth = downloader.bandwidth.to_json()
+                status += f'Bandwidth: {rate_to_str(bandwidth["actual"])} (<a href="/bandwidth" ' \
+                    f'target="blank" style="text-decoration:none">limit</a>: ' \
+                    f'{rate_to_str(bandwidth["rate"], limit=True)}, per worker: ' \
+                    f'{rate_to_str(bandwidth["worker_rate"], limit=True)})<br><br>'
+
+            if pool is not None:
+                status += f'Workers: {pool.size} (target {pool.target})<br><br>'
+
             thread_status = 'Threads:<br>'
 
             idle = 0
@@ -102,6 +139,37 @@ def runserver(queue: Queue, threadlist: List[Worker]):
 
         return flask.Response(feed(), mimetype='text')
 
+    @app.route('/bandwidth', methods=['GET', 'POST'])
+    def bandwidth_limits():
+        """Shows the bandwidth limits. They can be changed while running with a POST request
+        from the same machine, with the `limit` and `worker_limit` arguments, in bytes per
+        second (0 for no limit)."""
+        if downloader is None:
+            return flask.redirect(flask.url_for('index'))
+
+        if flask.request.method == 'POST':
+            if flask.request.remote_addr not in LOOPBACK:
+                logger.warning('Rejected change of the bandwidth limits from %s',
+                               flask.request.remote_addr)
+                return flask.Response('Forbidden', status=403, mimetype='text')
+
+            try:
+                if 'limit' in flask.request.values:
+                    Options.set_bandwidth_limit(flask.request.values['limit'])
+                if 'worker_limit' in flask.request.values:
+                    Options.set_worker_bandwidth_limit(flask.request.values['worker_limit'])
+            except ValueError as ex:
+                return flask.Response(str(ex), status=400, mimetype='text')
+
+        bandwidth = downloader.bandwidth
+        if (bandwidth.rate, bandwidth.worker_rate) != \
+                (Options.BANDWIDTH_LIMIT, Options.WORKER_BANDWIDTH_LIMIT):
+            logger.info('Bandwidth limits changed to %d B/s, %d B/s per worker',
+                        Options.BANDWIDTH_LIMIT, Options.WORKER_BANDWIDTH_LIMIT)
+            bandwidth.set_limits(Options.BANDWIDTH_LIMIT, Options.WORKER_BANDWIDTH_LIMIT)
+
+        return flask.jsonify(bandwidth.to_json())
+
     @app.route('/queue')
     def view_queue():
         output = f'<title>Queue content ({len(queue.queue)} remaining)</title>'
@@ -119,6 +187,14 @@ def runserver(queue: Queue, threadlist: List[Worker]):
 
         return output
 
+    return app
+
+
+def runserver(queue: Queue, threadlist: List[Worker], downloader: Downloader = None,
+              pool: WorkerPool = None):
+    logger.info('STARTED STATUS SERVER')
+    app = create_app(queue, threadlist, downloader, pool)
+
     t = threading.Thread(name='vcd-status', target=waitress.serve, daemon=True, args=(app,),
                          kwargs={'port': 80, 'host': '0.0.0.0', '_quiet': True,
                                  'clear_untrusted_proxy_headers': True})
@@ -0,0 +1,250 @@
+"""Persistent stores that keep information between executions."""
+import json
+import logging
+import os
+from threading import Lock
+
+from .filecache import REAL_FILE_CACHE
+from .frontier import normalize_url, strip_token
+from .options import Options
+
+
+class StoreError(Exception):
+    """Store error."""
+
+
+class JsonStore:
+    """Thread-safe dictionary saved as a json file in the root folder."""
+    filename = None
+
+    def __init__(self):
+        self.data = {}
+        self.lock = Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def __contains__(self, item):
+        with self.lock:
+            return item in self.data
+
+    def __getitem__(self, item):
+        with self.lock:
+            return self.data[item]
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.data[key] = value
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def path(self):
+        return os.path.join(Options.ROOT_FOLDER, self.filename)
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.data.get(key, default)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self.data.pop(key, default)
+
+    def load(self):
+        """Loads the store from its file. If the file does not exist the store will be empty."""
+
+        if not os.path.isfile(self.path):
+            with self.lock:
+                self.data = {}
+            return
+
+        try:
+            with open(self.path, encoding='utf-8') as file_handler:
+                data = json.load(file_handler) or {}
+        except (json.JSONDecodeError, UnicodeDecodeError) as ex:
+            raise StoreError(f'Invalid store file: {self.path!r}') from ex
+
+        if not isinstance(data, dict):
+            raise StoreError(f'Invalid store file ({type(data).__name__}): {self.path!r}')
+
+        with self.lock:
+            self.data = data
+
+        self.logger.debug('Loaded %d entries from %r', len(data), self.path)
+
+    def save(self):
+        """Saves the store to its file, replacing the old one atomically."""
+
+        temp_path = self.path + '.tmp'
+
+        with self.lock:
+            with open(temp_path, 'wt', encoding='utf-8') as file_handler:
+                json.dump(self.data, file_handler, indent=4, sort_keys=True, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+
+        self.logger.debug('Saved %d entries to %r', len(self.data), self.path)
+
+
+class Validator:
+    """HTTP validators of a downloaded file."""
+
+    def __init__(self, url, etag=None, last_modified=None, size=None, final_url=None,
+                 filepath=None):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = size
+        self.final_url = final_url
+        self.filepath = filepath
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(url={self.url!r}, etag={self.etag!r}, ' \
+            f'last_modified={self.last_modified!r}, size={self.size!r})'
+
+    def to_json(self):
+        """Returns self json serialized."""
+        return vars(self)
+
+    def to_headers(self):
+        """Returns the headers needed to make a conditional request."""
+        headers = {}
+
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+
+        return headers
+
+    @staticmethod
+    def from_response(url, response, size, filepath):
+        """Creates the validator of a response that has been saved.
+
+        Args:
+            url (str): url used to request the file.
+            response (requests.Response): response of the server.
+            size (int): length of the saved file.
+            filepath (str): path where the file was saved.
+
+        Returns:
+            Validator: the validator.
+
+        """
+
+        return Validator(url, etag=response.headers.get('ETag'),
+                         last_modified=response.headers.get('Last-Modified'), size=size,
+                         final_url=strip_token(response.url), filepath=filepath)
+
+
+class ValidatorStore(JsonStore):
+    """Stores the validators of the resources, keyed by url."""
+    filename = 'validators.json'
+
+    def get_validator(self, url):
+        """Returns the validator of the url if it can be used to make a conditional request.
+
+        The validator is only valid if the server sent an ETag or a Last-Modified header and the
+        file is still in the disk with the same length it had when it was downloaded.
+
+        Args:
+            url (str): url of the resource.
+
+        Returns:
+            Validator: the validator or None if it is not valid.
+
+        """
+
+        data = self.get(url)
+        if data is None:
+            return None
+
+        validator = Validator(**data)
+
+        if not validator.etag and not validator.last_modified:
+            return None
+
+        if validator.filepath not in REAL_FILE_CACHE:
+            return None
+
+        if REAL_FILE_CACHE[validator.filepath] != validator.size:
+            return None
+
+        return validator
+
+    def update(self, url, response, size, filepath):
+        """Stores the validator of a saved response."""
+        self[url] = Validator.from_response(url, response, size, filepath).to_json()
+
+
+class ForumMarkerStore(JsonStore):
+    """Stores the last post marker of the forum discussions, keyed by normalized url.
+
+    The marker is taken from the listing of the forum (replies and last post), so a discussion
+    whose marker did not change does not need to be requested again. The attachments found in
+    the discussion are stored with it, so the ones that were never saved can be retried.
+    """
+    filename = 'forum-markers.json'
+
+    def is_unchanged(self, url, marker):
+        """Checks if the marker of a discussion is the one stored when it was processed."""
+        data = self.get(normalize_url(url))
+        return data is not None and data['marker'] == marker
+
+    def get_attachments(self, url):
+        """Returns the subfolders and the attachments (name and url) of a discussion."""
+        data = self.get(normalize_url(url), {})
+        return data.get('subfolders', []), data.get('attachments', [])
+
+    def update(self, url, marker, subfolders, attachments):
+        """Stores the marker of a processed discussion.
+
+        Args:
+            url (str): url of the discussion.
+            marker (str): marker of the discussion in the listing of the forum.
+            subfolders (list): subfolders of the attachments.
+            attachments (list): name and url of each attachment.
+
+        """
+
+        self[normalize_url(url)] = {'marker': marker, 'subfolders': list(subfolders),
+                                    'attachments': [list(x) for x in attachments]}
+
+
+class WrapperStore(JsonStore):
+    """Stores the resource wrapped by each html resource, keyed by normalized url.
+
+    The resolution is not checked until the wrapped resource fails: then it is invalidated and
+    the wrapper is requested again.
+    """
+    filename = 'wrappers.json'
+
+    def get_target(self, url):
+        """Returns the name and the url of the resource wrapped by an html resource, or None if
+        the wrapper was never resolved."""
+        return self.get(normalize_url(url))
+
+    def update(self, url, name, target_url):
+        """Stores the resource wrapped by an html resource.
+
+        Args:
+            url (str): url of the html resource.
+            name (str): name of the wrapped resource.
+            target_url (str): url of the wrapped resource.
+
+        """
+
+        self[normalize_url(url)] = {'name': name, 'url': target_url}
+
+    def invalidate(self, url):
+        """Forgets the resource wrapped by an html resource.
+
+        Returns:
+            bool: True if the wrapper had been resolved.
+
+        """
+
+        return self.pop(normalize_url(url)) is not None
+
+
+VALIDATORS = ValidatorStore()
+FORUM_MARKERS = ForumMarkerStore()
+WRAPPERS = WrapperStore()
@@ -9,8 +9,10 @@ from bs4 import BeautifulSoup
 from requests import Response
 
 from .alias import Alias
+from .frontier import PAGES
 from .links import BaseLink, Resource, Delivery, Forum, Folder
 from .options import Options
+from .parsers import make_strainer, parse_html
 from .utils import secure_filename
 
 
@@ -19,6 +21,8 @@ from .utils import secure_filename
 class Subject:
     """Representation of a subject."""
 
+    PARSE_ONLY = make_strainer('div', ['activityinstance'])
+
     def __init__(self, name, url, downloader, queue):
         """
 
@@ -59,9 +63,12 @@ class Subject:
         """Makes the primary request."""
         self.logger.debug('Making subject request')
         self.response = self.downloader.get(self.url)
-        self.soup = BeautifulSoup(self.response.text, 'html.parser')
-
         self.logger.debug('Response obtained [%d]', self.response.status_code)
+
+    def process_request_bs4(self):
+        """Parses the activities of the response with the fastest HTML parser available (see
+        `vcd.parsers`)."""
+        self.soup = parse_html(self.response.text, parse_only=self.PARSE_ONLY)
         self.logger.debug('Response parsed')
 
     def create_folder(self):
@@ -89,6 +96,7 @@ class Subject:
 
         for link in self.notes_links:
             self.logger.debug('Adding link to queue: %r', link.name)
+            PAGES.add_link(self.url, link)
             self.queue.put(link)
 
     def find_links(self):
@@ -96,10 +104,28 @@ class Subject:
         self.logger.debug('Finding links of %s', self.name)
         self.make_request()
 
+        # The hash is checked on the raw body, so unchanged pages are not parsed.
+        if PAGES.update(self.url, self.response.content):
+            self.process_request_bs4()
+            self.process_response()
+        else:
+            self.logger.debug('Page of %s not changed since the last synchronization',
+                              self.name)
+            self.queue_saved_links()
+
+    def queue_saved_links(self):
+        """Puts in the queue the links found in the page the last time it was parsed, so the
+        ones that failed are retried and the ones that changed are downloaded again."""
+        for link in PAGES.get_links(self.url, self.queue):
+            self.logger.debug('Adding saved link to queue: %r', link.name)
+            self.queue.put(link)
+
+    def process_response(self):
+        """Finds the links of the primary page and sends them to the queue."""
+        self.notes_links = []
         _ = [x.extract() for x in self.soup.findAll('span', {'class': 'accesshide'})]
-        _ = [x.extract() for x in self.soup.findAll('div', {'class': 'mod-indent'})]
 
-        search = self.soup.findAll('div', {'class', 'activityinstance'})
+        search = self.soup.findAll('div', {'class': 'activityinstance'})
 
         for find in search:
             try:
@@ -0,0 +1,416 @@
+"""Backend that finds the files of the subjects with the web services of the virtual campus
+(Moodle REST API), instead of parsing its pages.
+
+A course needs one call to list its sections, activities and files, plus one call for its
+assignments, one per assignment for the files submitted, one per forum and one per
+discussion. The web service also gives the size and the modification time of the files, so
+files that did not change are not requested.
+"""
+
+import json
+import logging
+import os
+
+from colorama import Fore
+
+from .credentials import Credentials
+from .filecache import REAL_FILE_CACHE
+from .frontier import PAGES
+from .links import BaseLink, Delivery, Resource
+from .options import Options
+from .session import SessionManager
+from .subject import Subject
+
+
+class WebServiceError(Exception):
+    """The web service answered with an error."""
+
+
+def flatten_params(params, prefix=''):
+    """Returns the params in the format of the REST server of Moodle, where lists and dicts
+    are flattened: `{'courseids': [3]}` is sent as `courseids[0]=3`.
+
+    Args:
+        params (dict): params of the function.
+        prefix (str): name of the param that contains them, if they are nested.
+
+    Returns:
+        dict: the params flattened.
+
+    """
+
+    flat = {}
+
+    for key, value in params.items():
+        name = f'{prefix}[{key}]' if prefix else key
+
+        if isinstance(value, dict):
+            flat.update(flatten_params(value, name))
+        elif isinstance(value, (list, tuple)):
+            flat.update(flatten_params(dict(enumerate(value)), name))
+        else:
+            flat[name] = value
+
+    return flat
+
+
+class WebService:
+    """Client of the REST web services of the virtual campus.
+
+    Once started, the client is attached to the downloader (`Downloader.web_service`), so the
+    tasks can call it and download the files with its token.
+    """
+
+    SERVICE = 'moodle_mobile_app'
+
+    def __init__(self, downloader, base_url=None):
+        """
+        Args:
+            downloader (vcd._requests.Downloader): downloader used to make the calls.
+            base_url (str): url of the virtual campus.
+        """
+
+        self.logger = logging.getLogger(__name__)
+        self.downloader = downloader
+        self.base_url = base_url or SessionManager.BASE_URL
+        self.token = None
+        self.userid = None
+
+    @property
+    def token_url(self):
+        return self.base_url + '/login/token.php'
+
+    @property
+    def rest_url(self):
+        return self.base_url + '/webservice/rest/server.php'
+
+    def start(self):
+        """Gets a token with the credentials of the user and attaches the client to the
+        downloader.
+
+        Returns:
+            WebService: self.
+
+        """
+
+        user = Credentials.get()
+
+        try:
+            self.login(user.username, user.password)
+        except WebServiceError as ex:
+            self.logger.error('Web service login failed: %s', ex)
+            exit(Fore.RED + 'Login not correct' + Fore.RESET)
+
+        self.downloader.web_service = self
+        return self
+
+    def login(self, username, password):
+        """Gets a token of the web service and the id of the user.
+
+        Raises:
+            WebServiceError: if the credentials are not correct or the web service is not
+                enabled.
+
+        """
+
+        response = self.downloader.post(self.token_url, timeout=Options.TIMEOUT, data={
+            'username': username, 'password': password, 'service': self.SERVICE})
+        data = self.parse(response)
+
+        if 'token' not in data:
+            raise WebServiceError(data.get('error', 'token not received'))
+
+        self.token = data['token']
+        self.userid = self.call('core_webservice_get_site_info')['userid']
+        self.logger.info('Logged in the web service (userid=%s)', self.userid)
+
+    def call(self, function, **params):
+        """Calls a function of the web service.
+
+        Args:
+            function (str): name of the function, like 'core_course_get_contents'.
+            **params: params of the function.
+
+        Returns:
+            dict | list: the result of the function.
+
+        Raises:
+            WebServiceError: if the function failed.
+
+        """
+
+        self.logger.debug('Calling %s(%r)', function, params)
+        data = {'wstoken': self.token, 'wsfunction': function, 'moodlewsrestformat': 'json'}
+        data.update(flatten_params(params))
+
+        result = self.parse(self.downloader.post(self.rest_url, data=data,
+                                                 timeout=Options.TIMEOUT))
+
+        if isinstance(result, dict) and 'exception' in result:
+            raise WebServiceError(f'{function}: {result.get("message", result["exception"])}')
+
+        return result
+
+    @staticmethod
+    def parse(response):
+        try:
+            return response.json()
+        except ValueError:
+            raise WebServiceError(f'invalid response [{response.status_code}]')
+
+    def file_url(self, url):
+        """Returns the url of a file of the web service with the token needed to download it."""
+        separator = '&' if '?' in url else '?'
+        return f'{url}{separator}token={self.token}'
+
+    def find_subjects(self, queue):
+        """Finds the courses of the user.
+
+        Args:
+            queue (Queue): queue that the subjects will use.
+
+        Returns:
+            list: subjects sorted by name.
+
+        """
+
+        subjects = []
+
+        for course in self.call('core_enrol_get_users_courses', userid=self.userid):
+            name = course['fullname'].split(' (')[0]
+
+            if 'grado' in name.lower():
+                continue
+
+            self.logger.debug('Assembling subject %r (web service)', name)
+            url = f'{self.base_url}/course/view.php?id={course["id"]}'
+            subjects.append(WebServiceSubject(name, url, self.downloader, queue, course['id']))
+
+        subjects.sort(key=lambda x: x.name)
+        return subjects
+
+
+def get_html_url(url):
+    """Returns the url of a file of the web service as it is linked in the pages of the virtual
+    campus."""
+    return url.replace('/webservice/pluginfile.php/', '/pluginfile.php/', 1)
+
+
+def make_resource(file, subject, subfolders, name=None, html_url=None):
+    """Creates the resource of a file listed by the web service.
+
+    Args:
+        file (dict): the file, with its filename, fileurl, filesize and timemodified.
+        subject (Subject): subject of the file.
+        subfolders (list): subfolders where the file is saved.
+        name (str): name of the resource. Defaults to the filename without extension.
+        html_url (str): url of the file in the pages of the virtual campus. Defaults to the
+            url of the file without the web service prefix.
+
+    Returns:
+        WebServiceResource: the resource.
+
+    """
+
+    resource = WebServiceResource(
+        name or os.path.splitext(file['filename'])[0], file['fileurl'], subject,
+        subject.downloader, subject.queue, file['filename'], file.get('filesize'),
+        file.get('timemodified'), html_url)
+
+    for subfolder in subfolders:
+        resource.append_subfolder(subfolder)
+
+    return resource
+
+
+class WebServiceSubject(Subject):
+    """Subject whose links are found with the contents of its course."""
+
+    def __init__(self, name, url, downloader, queue, course_id):
+        super().__init__(name, url, downloader, queue)
+        self.course_id = course_id
+
+    def find_links(self):
+        """Finds the links of the subject with the contents of the course."""
+        self.logger.debug('Finding links of %s (web service)', self.name)
+        web_service = self.downloader.web_service
+        sections = web_service.call('core_course_get_contents', courseid=self.course_id)
+
+        if not PAGES.update(self.url, json.dumps(sections, sort_keys=True).encode()):
+            self.logger.debug('Contents of %s not changed since the last synchronization',
+                              self.name)
+            self.queue_saved_links()
+            return
+
+        self.notes_links = []
+        modules = [module for section in sections for module in section.get('modules', [])]
+        assignments = {}
+
+        if any(module['modname'] == 'assign' for module in modules):
+            result = web_service.call('mod_assign_get_assignments', courseids=[self.course_id])
+            for course in result['courses']:
+                for assignment in course['assignments']:
+                    assignments[assignment['cmid']] = assignment
+
+        for module in modules:
+            files = [content for content in module.get('contents', [])
+                     if content['type'] == 'file']
+
+            if module['modname'] == 'resource' and files:
+                # The html backend requests the activity, not the file.
+                self.add_link(make_resource(files[0], self, [], module['name'], module['url']))
+
+            elif module['modname'] == 'folder':
+                # The files are saved in the same folders as with the html backend.
+                for file in files:
+                    self.add_link(make_resource(file, self, [module['name']]))
+
+            elif module['modname'] == 'assign' and module['id'] in assignments:
+                # The same files and names as the html backend: statement, then submission.
+                assignment = assignments[module['id']]
+                files = assignment.get('introattachments', []) + \
+                    self.get_submission_files(assignment['id'])
+                links = [make_resource(file, self, [module['name']]) for file in files]
+                Delivery.rename_duplicates(links)
+
+                for link in links:
+                    self.add_link(link)
+
+            elif module['modname'] == 'forum':
+                self.add_link(WebServiceForum(module['name'], module['url'], self,
+                                              self.downloader, self.queue, module['instance']))
+
+        self.logger.debug('Downloading files for subject %r', self.name)
+        self.download_notes()
+
+    def get_submission_files(self, assignment_id):
+        """Returns the files submitted by the user (or their group) to an assignment.
+
+        Args:
+            assignment_id (int): id of the assignment.
+
+        Returns:
+            list: the files, with their filename, fileurl, filesize and timemodified.
+
+        """
+
+        web_service = self.downloader.web_service
+        result = web_service.call('mod_assign_get_submission_status', assignid=assignment_id,
+                                  userid=web_service.userid)
+        attempt = result.get('lastattempt') or {}
+        files = {}
+
+        for submission in (attempt.get('submission'), attempt.get('teamsubmission')):
+            for plugin in (submission or {}).get('plugins', []):
+                for filearea in plugin.get('fileareas', []):
+                    for file in filearea.get('files', []):
+                        files.setdefault(file['fileurl'], file)
+
+        return list(files.values())
+
+
+class WebServiceResource(Resource):
+    """Resource listed by the web service, with its filename, size and modification time.
+
+    Its file is identified in the alias database by the url of the html backend, so both
+    backends save it in the same path.
+    """
+
+    def __init__(self, name, url, subject, downloader, queue, filename, filesize=None,
+                 timemodified=None, html_url=None):
+        super().__init__(name, url, subject, downloader, queue)
+        self.response_name = filename
+        self.filesize = filesize
+        self.timemodified = timemodified
+        self.html_url = html_url or get_html_url(url)
+
+    @property
+    def alias_url(self):
+        return self.html_url
+
+    @property
+    def request_url(self):
+        return self.redirect_url or self.downloader.web_service.file_url(self.url)
+
+    def is_up_to_date(self):
+        """Checks if the file in the disk has the size given by the web service and was saved
+        after its last modification, so it does not need to be requested."""
+        if self.filesize is None:
+            return False
+
+        self.autoset_filepath()
+
+        if self.filepath not in REAL_FILE_CACHE or REAL_FILE_CACHE[self.filepath] != self.filesize:
+            return False
+
+        try:
+            return os.path.getmtime(self.filepath) >= (self.timemodified or 0)
+        except OSError:
+            return False
+
+    def download(self):
+        """Downloads the resource, unless the file in the disk is up to date. The probe is not
+        needed, because the web service already gave the size of the file."""
+        self.logger.debug('Downloading resource %s (web service)', self.name)
+
+        if self.is_up_to_date():
+            self.logger.debug('File found in cache (web service): Same content (%d)',
+                              self.filesize)
+            return None
+
+        self.prepare_request()
+        self.make_request()
+
+        if not self.claim_final_url():
+            return None
+
+        return self.process_response()
+
+
+class WebServiceForum(BaseLink):
+    """Forum whose discussions are listed by the web service."""
+
+    def __init__(self, name, url, subject, downloader, queue, forum_id):
+        super().__init__(name, url, subject, downloader, queue)
+        self.forum_id = forum_id
+
+    def download(self):
+        """Finds the discussions of the forum."""
+        self.logger.debug('Downloading forum %s (web service)', self.name)
+        result = self.downloader.web_service.call('mod_forum_get_forum_discussions',
+                                                  forumid=self.forum_id)
+
+        for discussion in result['discussions']:
+            url = f'{self.downloader.web_service.base_url}/mod/forum/discuss.php?' \
+                f'd={discussion["discussion"]}'
+            link = WebServiceDiscussion(discussion['name'], url, self.subject,
+                                        self.downloader, self.queue, discussion['discussion'])
+
+            self.logger.debug('Created discussion from forum: %r, %s', link.name, link.url)
+            self.queue.put(link)
+
+
+class WebServiceDiscussion(BaseLink):
+    """Discussion of a forum, whose attachments are listed by the web service."""
+
+    def __init__(self, name, url, subject, downloader, queue, discussion_id):
+        super().__init__(name, url, subject, downloader, queue)
+        self.discussion_id = discussion_id
+
+    def download(self):
+        """Finds the attachments of the posts of the discussion."""
+        self.logger.debug('Downloading discussion %s (web service)', self.name)
+        result = self.downloader.web_service.call('mod_forum_get_discussion_posts',
+                                                  discussionid=self.discussion_id)
+
+        # The files are saved in the same folders as with the html backend.
+        if len(self.subfolders) == 0 and Options.FORUMS_SUBFOLDERS:
+            self.append_subfolder('foros')
+        self.append_subfolder(self.name)
+
+        for post in result['posts']:
+            for file in post.get('attachments', []):
+                resource = make_resource(file, self.subject, self.subfolders)
+                self.logger.debug('Created resource from discussion: %r, %s', resource.name,
+                                  resource.url)
+                self.queue.put(resource)